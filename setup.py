@@ -74,5 +74,11 @@ setup(
         'zope.event==4.5.0',
         'zope.interface==5.4.0',
     ],
+    extras_require={
+        # Enables MessagePack encoding of compact metric responses
+        'msgpack': ['msgpack>=1.0'],
+        # Enables Arrow and Parquet formats of usage export
+        'export': ['pyarrow>=1.0'],
+    },
     zip_safe=False
 )
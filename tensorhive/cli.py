@@ -10,9 +10,23 @@ tensorhive
 ├── -v/--version
 ├── -u/--add-user
 ├── --log-level <level> (e.g. debug, info, warning, error, critical)
-└── create
-    └── user
-        └── --multiple
+├── create
+│   └── user
+│       └── --multiple
+├── export
+│   └── usage
+│       ├── -o/--output <path>
+│       ├── -f/--format <csv|arrow|parquet>
+│       ├── --start/--end <UTC datetime>
+│       ├── --host <hostname> (multiple)
+│       └── --user <username> (multiple)
+└── simulate
+    ├── -s/--scheduler <greedy|backfilling> (multiple)
+    ├── -t/--trace <path> (JSON lines, synthetic trace otherwise)
+    ├── --hosts/--gpus-per-host <number>
+    ├── --jobs/--users/--reservations <number>, --load <fraction>, --seed <number>
+    ├── --tick <seconds>
+    └── --json
 '''
 AVAILABLE_LOG_LEVELS = {
     'debug': logging.DEBUG,
@@ -123,6 +137,11 @@ def create():
     pass
 
 
+@main.group()
+def export():
+    pass
+
+
 @main.command()
 def test():
     from tensorhive.config import SSH
@@ -227,6 +246,106 @@ def user(multiple):
         creator.run_prompt()
 
 
+@export.command()
+@click.option('-o', '--output', type=click.File('wb'), default='-', help='Output file (stdout by default).')
+@click.option('-f', '--format', 'export_format', type=click.Choice(['csv', 'arrow', 'parquet']), default='csv',
+              help='Output format, arrow and parquet require pyarrow.')
+@click.option('--start', type=click.DateTime(), help='UTC, from the oldest sample by default.')
+@click.option('--end', type=click.DateTime(), help='UTC, up to now by default.')
+@click.option('--host', 'hostnames', multiple=True, help='Export only GPUs of given host (repeatable).')
+@click.option('--user', 'usernames', multiple=True, help='Export only reservations of given user (repeatable).')
+def usage(output, export_format, start, end, hostnames, usernames):
+    """Exports raw GPU usage samples gathered within reservations."""
+    from tensorhive.config import USAGE_LOGGING_SERVICE
+    from tensorhive.core.usage_export import UsageExporter
+    from tensorhive.core.usage_journal import UsageJournal
+    from tensorhive.core.utils.time import utc_timestamp
+    from tensorhive.database import ensure_db_with_current_schema
+    from tensorhive.models.User import User
+    from sqlalchemy.orm.exc import NoResultFound
+    from pathlib import PosixPath
+    setup_logging(log_level=logging.WARNING)
+    ensure_db_with_current_schema()
+
+    if export_format not in UsageExporter.available_formats():
+        raise click.UsageError('{} format requires pyarrow: pip install tensorhive[export]'.format(export_format))
+    try:
+        user_ids = [User.find_by_username(username).id for username in usernames] if usernames else None
+    except NoResultFound as e:
+        raise click.UsageError(str(e))
+
+    journal = UsageJournal(PosixPath(USAGE_LOGGING_SERVICE.LOG_DIR).expanduser())
+    UsageExporter(journal).export(
+        export_format, output,
+        start=utc_timestamp(start) if start else None, end=utc_timestamp(end) if end else None,
+        hostnames=list(hostnames) if hostnames else None, user_ids=user_ids)
+
+
+@main.command()
+@click.option('-s', '--scheduler', 'schedulers', multiple=True, type=click.Choice(['greedy', 'backfilling']),
+              default=['greedy', 'backfilling'], show_default=True, help='Scheduler to evaluate (repeatable).')
+@click.option('-t', '--trace', 'trace_file', type=click.File('r'),
+              help='Jobs and reservations to replay (JSON lines, see tensorhive.core.simulation.load_trace).')
+@click.option('--hosts', default=4, show_default=True, help='Number of simulated hosts.')
+@click.option('--gpus-per-host', default=8, show_default=True)
+@click.option('--jobs', default=1000, show_default=True, help='Synthetic trace only.')
+@click.option('--users', default=10, show_default=True, help='Synthetic trace only.')
+@click.option('--reservations', default=0, show_default=True, help='Synthetic trace only.')
+@click.option('--load', default=0.9, show_default=True, help='Synthetic trace only: GPU demand of jobs.')
+@click.option('--seed', default=0, show_default=True, help='Synthetic trace only.')
+@click.option('--tick', type=float, help='Simulated interval of scheduling service in seconds (as in config).')
+@click.option('--json', 'as_json', is_flag=True, help='Print one JSON report per line.')
+def simulate(schedulers, trace_file, hosts, gpus_per_host, jobs, users, reservations, load, seed, tick, as_json):
+    """Replays a trace of jobs against schedulers on a simulated cluster and compares the results."""
+    from tensorhive.config import JOB_SCHEDULING_SERVICE
+    from tensorhive.core.runtime_estimation import RuntimeEstimator
+    from tensorhive.core.scheduling import BackfillingScheduler, GreedyScheduler
+    from tensorhive.core.simulation import Simulation, load_trace, synthetic_cluster, synthetic_trace
+    from datetime import timedelta
+    import json
+    setup_logging(log_level=logging.WARNING)
+
+    cluster = synthetic_cluster(hosts, gpus_per_host)
+    if trace_file is not None:
+        try:
+            trace = load_trace(trace_file)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+    else:
+        trace = synthetic_trace(cluster, jobs=jobs, users=users, load=load, reservations=reservations, seed=seed)
+
+    for name in schedulers:
+        if name == 'backfilling':
+            scheduler = BackfillingScheduler(
+                fair_share_weights=JOB_SCHEDULING_SERVICE.FAIR_SHARE_WEIGHTS,
+                fair_share_window=timedelta(days=JOB_SCHEDULING_SERVICE.FAIR_SHARE_WINDOW_DAYS),
+                runtime_estimator=RuntimeEstimator(history=JOB_SCHEDULING_SERVICE.RUNTIME_ESTIMATE_HISTORY))
+        else:
+            scheduler = GreedyScheduler()
+        simulation = Simulation(scheduler, cluster, trace,
+                                tick=timedelta(seconds=tick or JOB_SCHEDULING_SERVICE.UPDATE_INTERVAL),
+                                preemption_signal=JOB_SCHEDULING_SERVICE.PREEMPTION_SIGNAL or None,
+                                preemption_grace_period=JOB_SCHEDULING_SERVICE.PREEMPTION_GRACE_PERIOD)
+        try:
+            report = simulation.run()
+        except AssertionError as e:
+            # e.g. username from trace is not valid
+            raise click.UsageError('Invalid trace: {}'.format(e))
+        if as_json:
+            click.echo(json.dumps(report.as_dict()))
+            continue
+        click.echo(green(report.scheduler))
+        click.echo('  jobs completed:   {}/{}'.format(report.completed, report.jobs))
+        click.echo('  utilisation:      {:.1%}'.format(report.utilisation))
+        click.echo('  average wait:     {}'.format(report.average_wait))
+        click.echo('  makespan:         {}'.format(report.makespan))
+        click.echo('  fairness (Jain):  {:.3f}'.format(report.fairness))
+        click.echo('  preempted runs:   {} ({:.1f} GPU-hours lost)'.format(
+            report.preempted_runs, report.lost_gpu_hours))
+        click.echo('  CPU time per run: {:.1f} ms avg, {:.1f} ms max ({} runs)'.format(
+            report.tick_cpu_avg * 1000, report.tick_cpu_max * 1000, report.ticks))
+
+
 def prompt_to_create_first_account():
     '''
     Asks whether a user wants to create an account
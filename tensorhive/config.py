@@ -1,6 +1,6 @@
 from pathlib import PosixPath
 import configparser
-from typing import Dict, Optional, Any, List
+from typing import Callable, Dict, Optional, Any, List
 from inspect import cleandoc
 import shutil
 import tensorhive
@@ -110,6 +110,31 @@ def check_env_var(name: str):
         log.warning(msg[1])
 
 
+def config_get_parsed(section: str, option: str, fallback: Any, convert: Optional[Callable[[Any], Any]] = None) -> Any:
+    '''
+    Parses value for option from string to a valid python literal (e.g. list of tuples),
+    optionally passed through `convert`.
+    Fallback value is returned when option is not present or anything goes wrong.
+
+    Example .ini file, function called with arguments: section='some_section', option='some_option', fallback=None
+    [some_section]
+    some_option = ['foo', 'bar']
+
+    Will return:
+    ['foo', 'bar']
+    '''
+    import ast
+    if not config.has_option(section, option):
+        return fallback
+    try:
+        parsed = ast.literal_eval(config.get(section, option))
+        return convert(parsed) if convert is not None else parsed
+    except (configparser.Error, ValueError, SyntaxError, TypeError):
+        log.warning('Parsing [{}] config section failed for option "{}", using fallback value: {}'.format(
+            section, option, fallback))
+        return fallback
+
+
 class SSH:
     section = 'ssh'
     HOSTS_CONFIG_FILE = config.get(section, 'hosts_config_file', fallback=CONFIG_FILES.HOSTS_CONFIG_PATH)
@@ -204,6 +229,10 @@ class MONITORING_SERVICE:
     ENABLE_GPU_MONITOR = config.getboolean(section, 'enable_gpu_monitor', fallback=True)
     UPDATE_INTERVAL = config.getfloat(section, 'update_interval', fallback=2.0)
 
+    # In-memory metrics history, [(resolution_seconds, retention_seconds), ...]
+    HISTORY_ENABLED = config.getboolean(section, 'history_enabled', fallback=True)
+    HISTORY_TIERS = config_get_parsed(section, 'history_tiers', fallback=[(2, 3600), (60, 86400), (900, 2592000)])
+
 
 class PROTECTION_SERVICE:
     section = 'protection_service'
@@ -212,6 +241,8 @@ class PROTECTION_SERVICE:
     NOTIFY_ON_PTY = config.getboolean(section, 'notify_on_pty', fallback=True)
     NOTIFY_VIA_EMAIL = config.getboolean(section, 'notify_via_email', fallback=False)
     KILL_PROCESSES = config.getint(section, 'kill_processes', fallback=0)
+    TRIGGER_ON_UPDATE = config.getboolean(section, 'trigger_on_update', fallback=True)
+    TRIGGER_DEBOUNCE = config.getfloat(section, 'trigger_debounce', fallback=0.0)
 
 
 class MAILBOT:
@@ -238,6 +269,13 @@ class MAILBOT:
     ADMIN_SUBJECT = mailbot_config.get(section, 'subject')
     ADMIN_BODY_TEMPLATE = mailbot_config.get(section, 'html_body')
 
+    section = 'template/idle_reservation'
+    IDLE_RESERVATION_SUBJECT = mailbot_config.get(section, 'subject', fallback='Your GPU reservation is idle')
+    IDLE_RESERVATION_BODY_TEMPLATE = mailbot_config.get(
+        section, 'html_body',
+        fallback='<pre>Reservation "{title}" of GPU {gpu} has been idle for {idle_minutes} minutes.\n'
+                 '{action_taken}</pre>')
+
 
 class USAGE_LOGGING_SERVICE:
     section = 'usage_logging_service'
@@ -250,6 +288,24 @@ class USAGE_LOGGING_SERVICE:
     UPDATE_INTERVAL = config.getfloat(section, 'update_interval', fallback=2.0)
     LOG_DIR = full_path(config.get(section, 'log_dir', fallback=default_path))
     LOG_CLEANUP_ACTION = config.getint(section, 'log_cleanup_action', fallback=2)
+    JOURNAL_FSYNC_INTERVAL = config.getfloat(section, 'journal_fsync_interval', fallback=10.0)
+    JOURNAL_COMPACT_AFTER_DAYS = config.getint(section, 'journal_compact_after_days', fallback=14)
+    JOURNAL_DELETE_AFTER_DAYS = config.getint(section, 'journal_delete_after_days', fallback=365)
+    JOURNAL_MAX_SIZE_MB = config.getint(section, 'journal_max_size_mb', fallback=0)
+    JOURNAL_ARCHIVE_RESOLUTION = config.getfloat(section, 'journal_archive_resolution', fallback=300.0)
+    JOURNAL_MAINTENANCE_OPERATIONS = config.getint(section, 'journal_maintenance_operations', fallback=1)
+    JOURNAL_MAINTENANCE_MB = config.getfloat(section, 'journal_maintenance_mb', fallback=4.0)
+    ROLLUP_HOUR_RETENTION_DAYS = config.getfloat(section, 'rollup_hour_retention_days', fallback=90.0)
+    ROLLUP_DAY_RETENTION_DAYS = config.getfloat(section, 'rollup_day_retention_days', fallback=0.0)
+    IDLE_THRESHOLD = config.getfloat(section, 'idle_threshold', fallback=5.0)
+    IDLE_RESERVATION_ACTION = config.getint(section, 'idle_reservation_action', fallback=0)
+    IDLE_RESERVATION_WINDOW_MINS = config.getfloat(section, 'idle_reservation_window_mins', fallback=120.0)
+    IDLE_RESERVATION_NOTIFY_VIA_EMAIL = config.getboolean(section, 'idle_reservation_notify_via_email',
+                                                          fallback=False)
+    PROCESS_ACCOUNTING = config.getboolean(section, 'process_accounting', fallback=True)
+    PROCESS_CHECKPOINT_INTERVAL = config.getfloat(section, 'process_checkpoint_interval', fallback=300.0)
+    TRIGGER_ON_UPDATE = config.getboolean(section, 'trigger_on_update', fallback=False)
+    TRIGGER_DEBOUNCE = config.getfloat(section, 'trigger_debounce', fallback=0.0)
 
 
 class JOB_SCHEDULING_SERVICE:
@@ -258,6 +314,15 @@ class JOB_SCHEDULING_SERVICE:
     UPDATE_INTERVAL = config.getfloat(section, 'update_interval', fallback=30.0)
     STOP_TERMINATION_ATTEMPTS_AFTER = config.getfloat(section, 'stop_termination_attempts_after_mins', fallback=5.0)
     SCHEDULE_QUEUED_JOBS_WHEN_FREE_MINS = config.getint(section, "schedule_queued_jobs_when_free_mins", fallback=30)
+    TRIGGER_ON_UPDATE = config.getboolean(section, 'trigger_on_update', fallback=True)
+    TRIGGER_DEBOUNCE = config.getfloat(section, 'trigger_debounce', fallback=0.0)
+    SCHEDULER = config.get(section, 'scheduler', fallback='greedy')
+    FAIR_SHARE_WINDOW_DAYS = config.getfloat(section, 'fair_share_window_days', fallback=7.0)
+    RUNTIME_ESTIMATE_HISTORY = config.getint(section, 'runtime_estimate_history', fallback=20)
+    PREEMPTION_SIGNAL = config.get(section, 'preemption_signal', fallback='USR1').strip()
+    PREEMPTION_GRACE_PERIOD = config.getfloat(section, 'preemption_grace_period_mins', fallback=5.0)
+
+    FAIR_SHARE_WEIGHTS = config_get_parsed(section, 'fair_share_weights', fallback={}, convert=dict)
 
 
 class AUTH:
@@ -0,0 +1,149 @@
+import logging
+from datetime import datetime, timedelta
+from flask import Response, stream_with_context
+from pathlib import PosixPath
+from typing import Any, Dict, List, Tuple
+from tensorhive.authorization import admin_required
+from tensorhive.config import API, USAGE_LOGGING_SERVICE
+from tensorhive.core.usage_export import UsageExporter
+from tensorhive.core.usage_journal import UsageJournal
+from tensorhive.core.utils.time import utc_timestamp
+from tensorhive.models.GPUProcessSession import GPUProcessSession
+from tensorhive.models.ReservationUsageSummary import ReservationUsageSummary
+from tensorhive.models.UsageRollup import UsageRollup
+from tensorhive.utils.DateUtils import DateUtils
+
+log = logging.getLogger(__name__)
+GENERAL = API.RESPONSES['general']
+
+# Typing aliases
+Content = Dict[str, Any]
+HttpStatusCode = int
+
+# Rollup columns which are summed up over the whole requested range
+TOTAL_FIELDS = ['samples', 'utilization_sum', 'mem_util_samples', 'mem_util_sum', 'power_samples', 'power_sum']
+
+
+def parse_time_range(start: str, end: str, default_period: timedelta) -> Tuple[datetime, datetime]:
+    end_as_datetime = DateUtils.parse_string(end) if end else datetime.utcnow()
+    start_as_datetime = DateUtils.parse_string(start) if start else end_as_datetime - default_period
+    assert start_as_datetime <= end_as_datetime, 'start must not be after end'
+    return start_as_datetime, end_as_datetime
+
+
+def as_series(rollups: List[UsageRollup]) -> Dict[str, Dict[str, List]]:
+    '''Columnar series for each key, plus its total over the whole range'''
+    result = {}  # type: Dict[str, Dict]
+    totals = {}  # type: Dict[str, Dict[str, float]]
+    for rollup in rollups:
+        series = result.get(rollup.key)
+        if series is None:
+            series = result[rollup.key] = {
+                'bucketStart': [], 'samples': [], 'utilizationAvg': [], 'utilizationMax': [],
+                'memUtilAvg': [], 'memUsedMax': [], 'powerAvg': []}
+            totals[rollup.key] = dict.fromkeys(TOTAL_FIELDS, 0)
+        series['bucketStart'].append(DateUtils.stringify_datetime(rollup.bucket_start))
+        series['samples'].append(rollup.samples)
+        series['utilizationAvg'].append(rollup.utilization_avg)
+        series['utilizationMax'].append(rollup.utilization_max)
+        series['memUtilAvg'].append(rollup.mem_util_avg)
+        series['memUsedMax'].append(rollup.mem_used_max)
+        series['powerAvg'].append(rollup.power_avg)
+
+        for field in TOTAL_FIELDS:
+            totals[rollup.key][field] += getattr(rollup, field)
+
+    for key, total in totals.items():
+        result[key]['total'] = {
+            'samples': total['samples'],
+            'utilizationAvg': UsageRollup.average(total['utilization_sum'], total['samples']),
+            'memUtilAvg': UsageRollup.average(total['mem_util_sum'], total['mem_util_samples']),
+            'powerAvg': UsageRollup.average(total['power_sum'], total['power_samples'])
+        }
+    return result
+
+
+@admin_required
+def get_usage(scope: str, granularity: str = 'day', start: str = None, end: str = None,
+              keys: List[str] = None) -> Tuple[Content, HttpStatusCode]:
+    '''
+    Serves pre-aggregated usage (see UsageRollup), by default from the last 30 days.
+    Keys are GPU UUIDs, hostnames, user ids or group ids, depending on scope.
+    '''
+    try:
+        assert scope in UsageRollup.SCOPES, 'scope must be one of: {}'.format(', '.join(UsageRollup.SCOPES))
+        assert granularity in UsageRollup.GRANULARITIES, 'granularity must be one of: {}'.format(
+            ', '.join(UsageRollup.GRANULARITIES))
+        start_as_datetime, end_as_datetime = parse_time_range(start, end, default_period=timedelta(days=30))
+        rollups = UsageRollup.find(scope, granularity, start_as_datetime, end_as_datetime, keys=keys)
+    except (ValueError, AssertionError) as reason:
+        content, status = {'msg': '{}. {}'.format(GENERAL['bad_request'], reason)}, 400
+    except Exception as e:
+        log.critical(e)
+        content, status = {'msg': GENERAL['internal_error']}, 500
+    else:
+        content, status = {'scope': scope, 'granularity': granularity, 'series': as_series(rollups)}, 200
+    finally:
+        return content, status
+
+
+@admin_required
+def get_idle_users(start: str = None, end: str = None, limit: int = 10) -> Tuple[Any, HttpStatusCode]:
+    '''Users whose finished reservations (started within given range) were idle for the longest time'''
+    try:
+        start_as_datetime, end_as_datetime = parse_time_range(start, end, default_period=timedelta(days=30))
+        result = ReservationUsageSummary.top_idle_users(start_as_datetime, end_as_datetime, limit=limit)
+    except (ValueError, AssertionError) as reason:
+        content, status = {'msg': '{}. {}'.format(GENERAL['bad_request'], reason)}, 400
+    except Exception as e:
+        log.critical(e)
+        content, status = {'msg': GENERAL['internal_error']}, 500
+    else:
+        content, status = result, 200
+    finally:
+        return content, status
+
+
+@admin_required
+def get_gpu_hours(start: str = None, end: str = None) -> Tuple[Any, HttpStatusCode]:
+    '''GPU-hours of processes (see GPUProcessSession) per owner, from the most used'''
+    try:
+        start_as_datetime, end_as_datetime = parse_time_range(start, end, default_period=timedelta(days=30))
+        hours = GPUProcessSession.gpu_hours_by_owner(start_as_datetime, end_as_datetime)
+    except (ValueError, AssertionError) as reason:
+        content, status = {'msg': '{}. {}'.format(GENERAL['bad_request'], reason)}, 400
+    except Exception as e:
+        log.critical(e)
+        content, status = {'msg': GENERAL['internal_error']}, 500
+    else:
+        content = [{'owner': owner, 'gpuHours': round(gpu_hours, 2)}
+                   for owner, gpu_hours in sorted(hours.items(), key=lambda item: item[1], reverse=True)]
+        status = 200
+    finally:
+        return content, status
+
+
+@admin_required
+def export_usage(start: str = None, end: str = None, hostnames: List[str] = None, users: List[int] = None,
+                 format: str = UsageExporter.CSV):
+    '''Streams raw usage samples (see UsageExporter), by default from the last 24 hours'''
+    try:
+        assert format in UsageExporter.available_formats(), \
+            '{} format is not available, supported: {}'.format(format, ', '.join(UsageExporter.available_formats()))
+        start_as_datetime, end_as_datetime = parse_time_range(start, end, default_period=timedelta(days=1))
+        journal = UsageJournal(PosixPath(USAGE_LOGGING_SERVICE.LOG_DIR).expanduser())
+        pieces = UsageExporter(journal).stream(
+            format, start=utc_timestamp(start_as_datetime), end=utc_timestamp(end_as_datetime),
+            hostnames=hostnames, user_ids=users)
+    except (ValueError, AssertionError) as reason:
+        content, status = {'msg': '{}. {}'.format(GENERAL['bad_request'], reason)}, 400
+    except Exception as e:
+        log.critical(e)
+        content, status = {'msg': GENERAL['internal_error']}, 500
+    else:
+        filename = 'usage-{}.{}'.format(start_as_datetime.strftime('%Y%m%d%H%M'), format)
+        content = Response(stream_with_context(pieces), mimetype=UsageExporter.MEDIA_TYPES[format],
+                           headers={'Content-Disposition': 'attachment; filename={}'.format(filename)})
+        status = 200
+    finally:
+        return content, status
@@ -1,12 +1,19 @@
 import logging
+import uuid
 from http import HTTPStatus
-from typing import Any, Dict, Tuple, Optional
+from datetime import datetime
+from typing import Any, Dict, List, Tuple, Optional
 from flask_jwt_extended import jwt_required, get_jwt_claims, get_jwt_identity
 from sqlalchemy.orm.exc import NoResultFound
-from tensorhive.config import API
-from tensorhive.models.Job import Job, JobStatus
-from tensorhive.models.Task import Task
-from tensorhive.controllers.task import business_spawn, business_terminate, synchronize
+from tensorhive.config import API, JOB_SCHEDULING_SERVICE
+from tensorhive.models.Job import Job, JobPriority, JobStatus
+from tensorhive.models.JobRun import JobRun
+from tensorhive.models.Task import Task, TaskStatus
+from tensorhive.controllers.task import business_spawn, business_terminate, choose_free_gpus, synchronize
+from tensorhive.core import task_nursery
+from tensorhive.core.placement import Placement
+from tensorhive.core.runtime_estimation import RuntimeEstimator
+from tensorhive.utils.DateUtils import DateUtils
 from tensorhive.exceptions.InvalidRequestException import InvalidRequestException
 from stringcase import snakecase
 from tensorhive.exceptions.ForbiddenException import ForbiddenException
@@ -81,6 +88,59 @@ def get_all(userId: Optional[int]) -> Tuple[Content, HttpStatusCode]:
         return content, status
 
 
+# GET /jobs/queue
+@jwt_required
+def get_queue() -> Tuple[Content, HttpStatusCode]:
+    """
+    Queued jobs in the order scheduler is expected to start them, with predicted start and estimated duration.
+    Users see only their own jobs, but positions are counted in the whole queue.
+    """
+    try:
+        predicted_starts, predicted_at = queue_predictions()
+        queued_jobs = Job.get_job_queue()
+        estimates = RuntimeEstimator(history=JOB_SCHEDULING_SERVICE.RUNTIME_ESTIMATE_HISTORY) \
+            .estimate_many(queued_jobs)
+    except Exception as e:
+        log.critical(e)
+        content, status = {'msg': GENERAL['internal_error']}, HTTPStatus.INTERNAL_SERVER_ERROR.value
+    else:
+        def expected_order(job: Job):
+            predicted_start = predicted_starts.get(job.id)
+            return (predicted_start is None, predicted_start or datetime.min, job.id)
+
+        results = []
+        for position, job in enumerate(sorted(queued_jobs, key=expected_order), start=1):
+            if not (is_admin() or get_jwt_identity() == job.user_id):
+                continue
+            predicted_start, estimate = predicted_starts.get(job.id), estimates.get(job.id)
+            results.append({
+                'job': job.as_dict(),
+                'position': position,
+                'predictedStart': DateUtils.stringify_datetime(predicted_start) if predicted_start else None,
+                'estimatedDuration': round(estimate.total_seconds() / 60) if estimate is not None else None
+            })
+        content = {
+            'msg': JOB['all']['success'],
+            'predictedAt': DateUtils.stringify_datetime(predicted_at) if predicted_at else None,
+            'queue': results
+        }
+        status = HTTPStatus.OK.value
+    finally:
+        return content, status
+
+
+def queue_predictions() -> Tuple[Dict[JobId, Optional[datetime]], Optional[datetime]]:
+    """Start times predicted by scheduler during its last run and time of that run, empty if it has not run yet"""
+    # Imported here, TensorHiveManager depends on this module through services
+    from tensorhive.core.managers.TensorHiveManager import TensorHiveManager
+    from tensorhive.core.services.JobSchedulingService import JobSchedulingService
+    service_manager = TensorHiveManager().service_manager
+    for service in service_manager.services if service_manager is not None else []:
+        if isinstance(service, JobSchedulingService) and service.scheduler is not None:
+            return service.scheduler.predicted_starts, service.scheduler.predicted_at
+    return {}, None
+
+
 # POST /jobs
 @jwt_required
 def create(job: Dict[str, Any]) -> Tuple[Content, HttpStatusCode]:
@@ -96,6 +156,9 @@ def create(job: Dict[str, Any]) -> Tuple[Content, HttpStatusCode]:
             setattr(new_job, 'start_at', job['startAt'])
         if 'stopAt' in job and job['stopAt'] is not None:
             setattr(new_job, 'stop_at', job['stopAt'])
+        if job.get('priority') is not None:
+            assert job['priority'] <= JobPriority.normal or is_admin(), 'only admin can raise job priority'
+            new_job.priority = job['priority']
         new_job.save()
     except AssertionError as e:
         if e.args[0] == 'Not an owner':
@@ -125,7 +188,7 @@ def create(job: Dict[str, Any]) -> Tuple[Content, HttpStatusCode]:
 def update(id: JobId, newValues: Dict[str, Any]) -> Tuple[Content, HttpStatusCode]:
     """Updates certain fields of a Job db record, see `allowed_fields`."""
     new_values = newValues
-    allowed_fields = {'name', 'description', 'startAt', 'stopAt'}
+    allowed_fields = {'name', 'description', 'startAt', 'stopAt', 'priority'}
     try:
         job = Job.get(id)
 
@@ -135,6 +198,8 @@ def update(id: JobId, newValues: Dict[str, Any]) -> Tuple[Content, HttpStatusCod
         assert set(new_values.keys()).issubset(allowed_fields), 'invalid field is present'
 
         assert job.status is not JobStatus.running, 'must be stopped first'
+        assert (new_values.get('priority') or 0) <= JobPriority.normal or is_admin(), \
+            'only admin can raise job priority'
 
         for field_name, new_value in new_values.items():
             field_name = snakecase(field_name)
@@ -264,26 +329,48 @@ def execute(id: JobId) -> Tuple[Content, HttpStatusCode]:
         return content, status
 
 
-def business_execute(id: JobId) -> Tuple[Content, HttpStatusCode]:
+def business_execute(id: JobId, placements: Optional[Dict[int, Placement]] = None) \
+        -> Tuple[Content, HttpStatusCode]:
     """Tries to spawn all commands stored in Tasks belonging to Job (db records - (task.command))
+    Flexible tasks are launched on GPUs from `placements` (by task id) if given (by the scheduler),
+    otherwise GPUs free right now are chosen for all of them at once, see `choose_free_gpus`.
 
     It won't allow for executing job which is currently running.
     If execute operation has succeeded then `running` status is set
 
-    If one or more tasks did not spawn correctly, job is marked as running anyway and
-    tasks which spawned correctly are running too. In that case user can stop the job and
-    try to run it again, or just continue.
+    Job with more than one task is started as a gang: every task is spawned waiting at a barrier,
+    and all of them are released only when the last one has spawned. If one or more tasks did not
+    spawn correctly, tasks spawned so far are killed (they have not started their commands yet)
+    and job goes back to its previous state, queued job stays in queue.
     """
     try:
-        not_spawned_tasks = []
+        not_spawned_tasks = []  # type: List[TaskId]
         job = Job.get(id)
         assert job.status is not JobStatus.running, 'Job is already running'
+        was_queued = bool(job.is_queued)
+        barriers = gang_barriers(job) if len(job.tasks) > 1 else {}
+        if placements is None and any(task.is_flexible for task in job.tasks):
+            placements = choose_free_gpus(job.tasks, job.user)
+
+        spawned_tasks = []  # type: List[Task]
         for task in job.tasks:
-            content, status = business_spawn(task.id)
+            if task.is_flexible and task.id not in (placements or {}):
+                # Not enough free GPUs, spawning it on its own could pick GPUs of another task of the job
+                not_spawned_tasks.append(task.id)
+                break
+            content, status = business_spawn(task.id, placement=(placements or {}).get(task.id),
+                                             barrier=barriers.get(task.id))
             if status is not HTTPStatus.OK.value:
                 not_spawned_tasks.append(task.id)
+                # Gang is incomplete anyway, no reason to spawn the rest
+                break
+            spawned_tasks.append(task)
 
+        if barriers and not not_spawned_tasks:
+            not_spawned_tasks = release_gang(job, spawned_tasks, barriers)
         job.synchronize_status()
+        if not_spawned_tasks:
+            roll_back_gang(job, spawned_tasks, was_queued)
         job.save()
 
         assert not_spawned_tasks == [], 'Could not spawn some tasks'
@@ -304,12 +391,51 @@ def business_execute(id: JobId) -> Tuple[Content, HttpStatusCode]:
         log.critical(e)
         content, status = {'msg': GENERAL['internal_error']}, HTTPStatus.INTERNAL_SERVER_ERROR.value
     else:
+        JobRun.start(job)
         log.info('Job {} is now: {}'.format(job.id, job.status.name))
         content, status = {'msg': JOB['execute']['success'], 'job': job.as_dict()}, HTTPStatus.OK.value
     finally:
         return content, status
 
 
+def gang_barriers(job: Job) -> Dict[TaskId, str]:
+    """Unique (per launch) barrier name for each task of the job"""
+    gang = '{}_{}'.format(job.id, uuid.uuid4().hex[:8])
+    return {task.id: '{}_task_{}'.format(gang, task.id) for task in job.tasks}
+
+
+def release_gang(job: Job, tasks: List[Task], barriers: Dict[TaskId, str]) -> List[TaskId]:
+    """Releases spawned tasks, one ssh command per host. Returns ids of tasks that could not be released."""
+    tasks_by_host = {}  # type: Dict[str, List[Task]]
+    for task in tasks:
+        tasks_by_host.setdefault(task.hostname, []).append(task)
+
+    not_released = []  # type: List[TaskId]
+    for hostname, host_tasks in tasks_by_host.items():
+        try:
+            exit_code = task_nursery.release(hostname, job.user.username, [barriers[task.id] for task in host_tasks])
+        except Exception as e:
+            log.warning(e)
+            exit_code = None
+        if exit_code != 0:
+            not_released += [task.id for task in host_tasks]
+    return not_released
+
+
+def roll_back_gang(job: Job, tasks: List[Task], was_queued: bool) -> None:
+    """Kills tasks of partially started job, queued job is put back into queue"""
+    for task in tasks:
+        _, status = business_terminate(task.id, gracefully=False)
+        if status == HTTPStatus.OK.value:
+            task.status = TaskStatus.not_running
+        else:
+            log.warning('Task {} of job {} could not be rolled back'.format(task.id, job.id))
+
+    job.synchronize_status()
+    if was_queued and job.status is not JobStatus.running:
+        job.enqueue()
+
+
 # PUT /jobs/{id}/enqueue
 @jwt_required
 def enqueue(id: JobId) -> Tuple[Content, HttpStatusCode]:
@@ -387,8 +513,13 @@ def business_stop(id: JobId, gracefully: Optional[bool] = True) -> Tuple[Content
     """
     try:
         job = Job.get(id)
+        # Run is cut short, its duration is not a complete sample for runtime estimates
+        JobRun.mark_interrupted(job.id)
         not_terminated_tasks = 0
         for task in job.tasks:
+            if task.status is TaskStatus.not_running:
+                # e.g. the rest of an incomplete gang is being stopped
+                continue
             content, status = business_terminate(task.id, gracefully)
             if status != HTTPStatus.OK.value:
                 not_terminated_tasks += 1
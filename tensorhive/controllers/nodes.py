@@ -1,13 +1,19 @@
 import copy
+from datetime import datetime, timedelta, timezone
 from connexion import NoContent
+from flask import after_this_request, request, Response
 from flask_jwt_extended import jwt_required, get_jwt_claims, get_jwt_identity
 from sqlalchemy.orm.exc import NoResultFound
+from typing import Any, Callable, Dict, Optional
 from tensorhive.config import API
 from tensorhive.core.managers.TensorHiveManager import TensorHiveManager
+from tensorhive.core.utils.MetricsSerializer import MetricsSerializer
 from tensorhive.models import User
 from tensorhive.models.Resource import Resource
+from tensorhive.utils.DateUtils import DateUtils
 
 NODES = API.RESPONSES['nodes']
+GENERAL = API.RESPONSES['general']
 
 
 def get_infrastructure():
@@ -50,10 +56,82 @@ def get_infrastructure():
     return infrastructure
 
 
+def metrics_response(verbose: Callable[[], Any], compact: Callable[[], Any]) -> Any:
+    '''
+    Negotiates representation with the client once per request: returns verbose content as is (serialized by
+    connexion) or compact content encoded using media type and encoding accepted by the client.
+    Either way the response is marked as varying by Accept headers, so caches don't mix representations up.
+    '''
+    @after_this_request
+    def vary_by_accept(response):
+        response.headers['Vary'] = MetricsSerializer.VARY
+        return response
+
+    media_type = MetricsSerializer.negotiate(request.headers.get('Accept'))
+    if media_type == MetricsSerializer.JSON:
+        return verbose()
+    body, headers = MetricsSerializer.encode(compact(), media_type, request.headers.get('Accept-Encoding'))
+    return Response(body, headers=headers)
+
+
+def resource_metrics_response(resource_data: Dict[str, Dict], metric_type: Optional[str]) -> Any:
+    '''Metrics of every resource of one type on a host (only `metric_type` if given), KeyError if it's unknown'''
+    def verbose():
+        if metric_type is None:
+            # Put all gathered metric data for each resource
+            return {uuid: data['metrics'] for uuid, data in resource_data.items()}
+        # Put only requested metric data for each resource
+        return {uuid: data['metrics'][metric_type] for uuid, data in resource_data.items()}
+
+    def compact():
+        result = MetricsSerializer.compact_resources(resource_data, metric_type)
+        if metric_type is not None and metric_type not in result['metrics']:
+            raise KeyError(metric_type)
+        return result
+
+    return metrics_response(verbose, compact)
+
+
 @jwt_required
 def get_all_data():
     infrastructure = get_infrastructure()
-    return infrastructure, 200
+    return metrics_response(lambda: infrastructure,
+                            lambda: MetricsSerializer.compact_infrastructure(infrastructure)), 200
+
+
+@jwt_required
+def get_history(start: str = None, end: str = None, hostnames=None, uuids=None, metrics=None,
+                resolution: float = None):
+    '''
+    Serves time series kept in memory by MetricsHistory, by default from the last hour.
+    Non-admin users can only see resources they are allowed to use.
+    '''
+    try:
+        now = datetime.utcnow()
+        end_as_datetime = DateUtils.parse_string(end) if end else now
+        start_as_datetime = DateUtils.parse_string(start) if start else end_as_datetime - timedelta(hours=1)
+        assert start_as_datetime <= end_as_datetime, 'start must not be after end'
+
+        if not is_admin():
+            infrastructure = get_infrastructure()
+            allowed_uuids = {uuid for node_data in infrastructure.values()
+                             for resources in node_data.values() if resources for uuid in resources}
+            hostnames = [hostname for hostname in (hostnames or infrastructure) if hostname in infrastructure]
+            uuids = [uuid for uuid in (uuids or allowed_uuids) if uuid in allowed_uuids]
+
+        history = TensorHiveManager().metrics_history
+        series = history.query(
+            start=start_as_datetime.replace(tzinfo=timezone.utc).timestamp(),
+            end=end_as_datetime.replace(tzinfo=timezone.utc).timestamp(),
+            hostnames=hostnames, uuids=uuids, metric_names=metrics, resolution=resolution)
+        # History is columnar already, only encoding depends on the client
+        result = metrics_response(lambda: series, lambda: series)
+    except (ValueError, AssertionError) as reason:
+        content, status = {'msg': '{}. {}'.format(GENERAL['bad_request'], reason)}, 400
+    else:
+        content, status = result, 200
+    finally:
+        return content, status
 
 
 @jwt_required
@@ -72,12 +150,7 @@ def get_cpu_metrics(hostname: str, metric_type: str = None):
         # No data about GPU
         assert resource_data
 
-        if metric_type is None:
-            # Put all gathered metric data for each GPU
-            result = {uuid: cpu_data['metrics'] for uuid, cpu_data in resource_data.items()}
-        else:
-            # Put only requested metric data for each GPU
-            result = {uuid: gpu_data['metrics'][metric_type] for uuid, gpu_data in resource_data.items()}
+        result = resource_metrics_response(resource_data, metric_type)
     except (KeyError, AssertionError):
         content, status = NoContent, 404
     else:
@@ -107,16 +180,19 @@ def get_gpu_metrics(hostname: str, metric_type: str = None):
             '<GPU0_UUID>': {'value': 31, 'unit': '%'},
             '<GPU1_UUID>': {'value': 32, 'unit': '%'},
         }
+
+        Example (compact representation requested via Accept header):
+        {
+            'units': {'fan_speed': '%', ...},
+            'uuid': ['<GPU0_UUID>', '<GPU1_UUID>'],
+            'index': [0, 1],
+            'metrics': {'fan_speed': [31, 32], ...}
+        }
         '''
         # No data about GPU
         assert resource_data
 
-        if metric_type is None:
-            # Put all gathered metric data for each GPU
-            result = {uuid: gpu_data['metrics'] for uuid, gpu_data in resource_data.items()}
-        else:
-            # Put only requested metric data for each GPU
-            result = {uuid: gpu_data['metrics'][metric_type] for uuid, gpu_data in resource_data.items()}
+        result = resource_metrics_response(resource_data, metric_type)
     except (KeyError, AssertionError):
         content, status = NoContent, 404
     else:
@@ -4,6 +4,8 @@ from flask_jwt_extended import get_jwt_claims, get_jwt_identity, jwt_required
 from sqlalchemy.orm.exc import NoResultFound
 from tensorhive.config import API
 from tensorhive.core.utils.ReservationVerifier import ReservationVerifier
+from tensorhive.core.occupancy import OccupancyMatrix
+from tensorhive.core.free_slots import find_free_windows
 from tensorhive.models.Reservation import Reservation
 from tensorhive.models.User import User
 from tensorhive.utils.DateUtils import DateUtils
@@ -68,6 +70,75 @@ def get(resources_ids: Optional[List[ResourceId]] = None, start: Optional[str] =
         return get_selected(resources_ids, start, end)
 
 
+@jwt_required
+def get_occupancy(resources_ids: List[ResourceId], start: str, end: str, bucket: int = 60) \
+        -> Tuple[Content, HttpStatusCode]:
+    '''
+    Compact occupancy/utilization matrix of given resources within <start, end>, bucket size in minutes.
+    Meant for calendar views, which do not need every reservation separately.
+    '''
+    try:
+        start_as_datetime = DateUtils.parse_string(start)
+        end_as_datetime = DateUtils.parse_string(end)
+        matrix = OccupancyMatrix(resources_ids, start_as_datetime, end_as_datetime,
+                                 bucket_size=timedelta(minutes=bucket))
+        occupancy, owners = matrix.occupancy()
+        utilization = matrix.utilization()
+    except (ValueError, AssertionError) as reason:
+        content = {'msg': '{}. {}'.format(GENERAL['bad_request'], reason)}
+        status = 400
+    except Exception as e:
+        log.critical(e)
+        content = {'msg': GENERAL['internal_error']}
+        status = 500
+    else:
+        content = {
+            'start': DateUtils.stringify_datetime(matrix.start),
+            'end': DateUtils.stringify_datetime(matrix.end),
+            'bucket': bucket,
+            'resourcesIds': matrix.uuids,
+            'occupancy': occupancy,
+            'userIds': owners,
+            'utilization': utilization
+        }
+        status = 200
+    return content, status
+
+
+@jwt_required
+def get_free_slots(count: int, duration: int, start: Optional[str] = None, end: Optional[str] = None,
+                   resources_ids: Optional[List[ResourceId]] = None, hostname: Optional[str] = None,
+                   same_host: bool = False, limit: int = 5) -> Tuple[Content, HttpStatusCode]:
+    '''
+    Earliest windows of `duration` minutes within <start, end> (default: from now, for a week)
+    when `count` GPUs are free and allowed for the current user.
+    '''
+    try:
+        start_as_datetime = DateUtils.parse_string(start) if start else datetime.utcnow()
+        end_as_datetime = DateUtils.parse_string(end) if end else start_as_datetime + timedelta(days=7)
+        assert start_as_datetime < end_as_datetime, 'Start must be before end'
+        windows = find_free_windows(count, timedelta(minutes=duration), start_as_datetime,
+                                    horizon=end_as_datetime - start_as_datetime,
+                                    user=User.get(get_jwt_identity()), resources_ids=resources_ids,
+                                    hostname=hostname, same_host=same_host, limit=limit)
+    except (ValueError, AssertionError) as reason:
+        content = {'msg': '{}. {}'.format(GENERAL['bad_request'], reason)}
+        status = 400
+    except Exception as e:
+        log.critical(e)
+        content = {'msg': GENERAL['internal_error']}
+        status = 500
+    else:
+        content = [{
+            'start': DateUtils.stringify_datetime(window.start),
+            'end': DateUtils.stringify_datetime(window.end),
+            'hostname': window.hostname,
+            'resourcesIds': window.resources_ids
+        } for window in windows]
+        status = 200
+    return content, status
+
+
 @jwt_required
 def create(reservation: Dict[str, Any]) -> Tuple[Content, HttpStatusCode]:
     try:
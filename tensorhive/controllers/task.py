@@ -1,9 +1,10 @@
-from tensorhive.models.Task import Task, TaskStatus
+from tensorhive.models.Task import Task, TaskPlacement, TaskStatus
 from tensorhive.models.CommandSegment import CommandSegment, CommandSegment2Task, SegmentType
 from tensorhive.models.User import User
 from tensorhive.models.Job import Job
 from tensorhive.core import task_nursery
 from tensorhive.core.task_nursery import SpawnError, ExitCodeError
+from tensorhive.core.placement import Placement, choose_gpus, free_gpus_for, with_visible_devices
 from pssh.exceptions import ConnectionErrorException, AuthenticationException, UnknownHostException
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt_claims
 from sqlalchemy.orm.exc import NoResultFound
@@ -269,6 +270,9 @@ def business_create(task: Dict[str, Any], job_id: JobId) -> Tuple[Content, HttpS
             hostname=task['hostname'],
             command=task['command'])
         new_task.gpu_id = parse_gpu_id_from_command(task['command'])
+        if task.get('placement') is not None:
+            new_task.placement = task['placement']
+            new_task.gpu_count = task.get('gpuCount')
         parent_job = Job.query.filter(Job.id == job_id).one()
         for segment in task['cmdsegments']['params']:
             new_segment = CommandSegment.query.filter(CommandSegment.segment_type == SegmentType.parameter,
@@ -340,6 +344,10 @@ def business_update(id: TaskId, newValues: Dict[str, Any]) -> Tuple[Content, Htt
             elif key == 'command':
                 task.gpu_id = parse_gpu_id_from_command(value)
                 setattr(task, key, value)
+            elif key == 'placement':
+                task.placement = value
+            elif key == 'gpuCount':
+                task.gpu_count = value
             elif key == 'cmdsegments':
                 # FIXME Somehow the loop doesn't get all of the elements by the first time
                 # but repeating it cleares it
@@ -404,23 +412,37 @@ def business_destroy(id: TaskId) -> Tuple[Content, HttpStatusCode]:
 
 
 @synchronize_task_record
-def business_spawn(id: TaskId) -> Tuple[Content, HttpStatusCode]:
+def business_spawn(id: TaskId, placement: Optional[Placement] = None,
+                   barrier: Optional[str] = None) -> Tuple[Content, HttpStatusCode]:
     """Spawns command stored in Task db record (task.full_command).
     It won't allow for spawning task which is currently running (sync + status check).
     If spawn operation has succeeded then `running` status is set.
+    With `barrier`, the process waits until it is released (see `task_nursery.release`).
+
+    Flexible (not pinned) task is launched on GPUs given in `placement` (chosen by scheduler),
+    or on free GPUs chosen right now. CUDA_VISIBLE_DEVICES is set accordingly and chosen GPUs are stored.
     """
     try:
         task = Task.get(id)
         parent_job = Job.get(task.job_id)
         assert task.status is not TaskStatus.running, 'task is already running'
         assert task.full_command, 'command is empty'
-        assert task.hostname, 'hostname is empty'
         assert parent_job.user, 'user does not exist'
 
-        pid = task_nursery.spawn(task.full_command,
+        command = task.full_command
+        if task.is_flexible:
+            placement = placement or choose_free_gpus([task], parent_job.user).get(task.id)
+            assert placement, 'not enough free GPUs'
+            task.hostname = placement.hostname
+            task.gpu_uuids = placement.gpu_uuids
+            command = with_visible_devices(command, placement.gpu_uuids)
+        assert task.hostname, 'hostname is empty'
+
+        pid = task_nursery.spawn(command,
                                  task.hostname,
                                  parent_job.user.username,
-                                 name_appendix=str(task.id))
+                                 name_appendix=str(task.id),
+                                 barrier=barrier)
         task.pid = pid
         task.status = TaskStatus.running
         task.save()
@@ -441,6 +463,32 @@ def business_spawn(id: TaskId) -> Tuple[Content, HttpStatusCode]:
         return content, status
 
 
+def choose_free_gpus(tasks: List[Task], user: User) -> Dict[TaskId, Placement]:
+    """Placements (by task id) of flexible tasks of one job on GPUs that are free right now.
+
+    Tasks are placed in a single pass, like the scheduler does: GPUs taken by one task (or pinned by one)
+    are not given to another. Stops at the first task that does not fit, so some tasks may be left out.
+    """
+    # Imported here, TensorHiveManager depends on this module through services
+    from tensorhive.core.managers.TensorHiveManager import TensorHiveManager
+    infrastructure_manager = TensorHiveManager().infrastructure_manager
+    job_gpus = {infrastructure_manager.get_gpu_uid(task.hostname, task.gpu_id)
+                for task in tasks if not task.is_flexible}
+    placements = {}  # type: Dict[TaskId, Placement]
+    for task in tasks:
+        if not task.is_flexible:
+            continue
+        free_gpus = {hostname: [gpu_uid for gpu_uid in gpu_uids if gpu_uid not in job_gpus]
+                     for hostname, gpu_uids in free_gpus_for(task, user, infrastructure_manager).items()}
+        placement = choose_gpus(task.gpu_count, free_gpus,
+                                index_of=lambda hostname, gpu_uid: infrastructure_manager.get_gpu_index(gpu_uid) or 0)
+        if placement is None:
+            break
+        placements[task.id] = placement
+        job_gpus.update(placement.gpu_uuids)
+    return placements
+
+
 @synchronize_task_record
 def business_terminate(id: TaskId, gracefully: Optional[bool] = True) -> Tuple[Content, HttpStatusCode]:
     """Sends SIGINT (default) or SIGKILL to process with pid that is stored in Task db record.
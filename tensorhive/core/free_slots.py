@@ -0,0 +1,151 @@
+from tensorhive.core.reservation_index import ReservationIndex
+from tensorhive.models.Reservation import Reservation
+from tensorhive.models.Resource import Resource
+from tensorhive.models.Restriction import Restriction
+from tensorhive.models.RestrictionSchedule import RestrictionSchedule
+from tensorhive.models.User import User
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import datetime
+import logging
+log = logging.getLogger(__name__)
+
+Interval = Tuple[datetime.datetime, datetime.datetime]
+DAY = datetime.timedelta(days=1)
+
+
+class FreeWindow(NamedTuple):
+    '''`count` GPUs free (and allowed) for the whole <start, end>'''
+    start: datetime.datetime
+    end: datetime.datetime
+    hostname: Optional[str]
+    resources_ids: List[str]
+
+
+def merge(intervals: List[Interval]) -> List[Interval]:
+    '''Sorted union of intervals, touching ones are joined'''
+    ret = []  # type: List[Interval]
+    for start, end in sorted(intervals):
+        if ret and start <= ret[-1][1]:
+            ret[-1] = (ret[-1][0], max(ret[-1][1], end))
+        else:
+            ret.append((start, end))
+    return ret
+
+
+def schedule_windows(schedule: RestrictionSchedule, start: datetime.datetime,
+                     end: datetime.datetime) -> List[Interval]:
+    '''
+    Windows of schedule within <start, end>. Same interpretation as in ReservationVerifier:
+    hour_end earlier than hour_start means the next day, 23:59 means midnight.
+    '''
+    ret = []
+    day = datetime.datetime.combine(start.date(), datetime.time()) - DAY
+    while day < end:
+        if str(day.weekday() + 1) in schedule.schedule_days:
+            window_start = datetime.datetime.combine(day.date(), schedule.hour_start)
+            if schedule.hour_end == datetime.time(hour=23, minute=59):
+                window_end = day + DAY
+            else:
+                window_end = datetime.datetime.combine(day.date(), schedule.hour_end)
+                if schedule.hour_end <= schedule.hour_start:
+                    window_end += DAY
+            if window_start < end and window_end > start:
+                ret.append((max(window_start, start), min(window_end, end)))
+        day += DAY
+    return ret
+
+
+def allowed_intervals(restrictions: List[Restriction], start: datetime.datetime,
+                      end: datetime.datetime) -> List[Interval]:
+    '''When, within <start, end>, at least one of given restrictions (permissions) is in force'''
+    intervals = []  # type: List[Interval]
+    for restriction in restrictions:
+        restriction_start = max(start, restriction.starts_at)
+        restriction_end = min(end, restriction.ends_at) if restriction.ends_at else end
+        if restriction_start >= restriction_end:
+            continue
+        if not restriction.schedules:
+            intervals.append((restriction_start, restriction_end))
+        for schedule in restriction.schedules:
+            intervals += schedule_windows(schedule, restriction_start, restriction_end)
+    return merge(intervals)
+
+
+def free_intervals(index: ReservationIndex, resource_id: str, allowed: List[Interval]) -> List[Interval]:
+    '''Parts of allowed intervals that are not reserved'''
+    ret = []
+    for start, end in allowed:
+        for reservation in index.overlapping(resource_id, start, end):
+            if reservation.start > start:
+                ret.append((start, reservation.start))
+            start = max(start, reservation.end)
+        if start < end:
+            ret.append((start, end))
+    return ret
+
+
+def earliest_windows(free: Dict[str, List[Interval]], hostnames: Dict[str, Optional[str]], count: int,
+                     duration: datetime.timedelta, same_host: bool = False, limit: int = 5) -> List[FreeWindow]:
+    '''
+    Sweep-line over free intervals of GPUs (by uuid). Feasibility can only begin where some free interval
+    begins, so only these moments are checked: a GPU qualifies if its current free interval lasts
+    at least `duration` from there. Returns up to `limit` earliest windows with distinct starts.
+
+    GPUs that stay free for the longest are preferred. With `same_host`, the host with the fewest
+    qualifying GPUs that are still enough is chosen (best fit, as in placement.choose_gpus).
+    '''
+    openings = sorted((start, end, uuid) for uuid, intervals in free.items()
+                      for start, end in intervals if end - start >= duration)
+    active = {}  # type: Dict[str, datetime.datetime]
+    ret = []  # type: List[FreeWindow]
+    position = 0
+    while position < len(openings) and len(ret) < limit:
+        moment = openings[position][0]
+        while position < len(openings) and openings[position][0] == moment:
+            _, end, uuid = openings[position]
+            active[uuid] = end
+            position += 1
+        qualifying = sorted((-(end - moment), uuid) for uuid, end in active.items() if end - moment >= duration)
+        groups = {}  # type: Dict[Optional[str], List[str]]
+        for _, uuid in qualifying:
+            groups.setdefault(hostnames.get(uuid) if same_host else None, []).append(uuid)
+        candidates = [(len(uuids), str(hostname), hostname) for hostname, uuids in groups.items()
+                      if len(uuids) >= count]
+        if candidates:
+            _, _, hostname = min(candidates)
+            ret.append(FreeWindow(moment, moment + duration, hostname, sorted(groups[hostname][:count])))
+    return ret
+
+
+def find_free_windows(count: int, duration: datetime.timedelta, start: datetime.datetime,
+                      horizon: datetime.timedelta, user: Optional[User] = None,
+                      resources_ids: Optional[List[str]] = None, hostname: Optional[str] = None,
+                      same_host: bool = False, limit: int = 5) -> List[FreeWindow]:
+    '''
+    Earliest windows within <start, start + horizon> when `count` GPUs are free for `duration`.
+    Only resources allowed by restrictions of `user` (with their schedules) are considered if user is given.
+    '''
+    assert count > 0, 'Number of GPUs must be positive'
+    assert duration > datetime.timedelta(0), 'Duration must be positive'
+    end = start + horizon
+
+    resources = Resource.all()
+    if resources_ids is not None:
+        resources = [resource for resource in resources if resource.id in resources_ids]
+    if hostname is not None:
+        resources = [resource for resource in resources if resource.hostname == hostname]
+
+    restrictions = user.get_restrictions(include_group=True) if user is not None else []
+    global_restrictions = [restriction for restriction in restrictions if restriction.is_global]
+    index = Reservation.index if Reservation.index.covers(start) else ReservationIndex.load(start, end)
+
+    free = {}  # type: Dict[str, List[Interval]]
+    for resource in resources:
+        if user is None:
+            allowed = [(start, end)]
+        else:
+            allowed = allowed_intervals(global_restrictions + [restriction for restriction in restrictions
+                                                               if resource in restriction.resources], start, end)
+        free[resource.id] = free_intervals(index, resource.id, allowed)
+    return earliest_windows(free, {resource.id: resource.hostname for resource in resources}, count, duration,
+                            same_host=same_host, limit=limit)
@@ -0,0 +1,110 @@
+from enum import IntEnum
+from typing import Dict, Iterable, List, Optional, Set
+from tensorhive.core.usage_journal import UsageRecord, is_missing
+from tensorhive.core.utils.mailer import Mailer, Message
+from tensorhive.config import MAILBOT, CONFIG_FILES
+from tensorhive.models.Reservation import Reservation
+import datetime
+import smtplib
+import logging
+log = logging.getLogger(__name__)
+
+
+class IdleReservationAction(IntEnum):
+    NONE = 0
+    NOTIFY = 1
+    SHORTEN = 2
+    CANCEL = 3
+
+
+class IdleReservationDetector():
+    '''
+    Follows live usage samples and remembers since when each reservation has been idle
+    (GPU utilization below threshold in every sample).
+
+    Samples without utilization value do not change the state,
+    reservation is reported (by `due`) only once, until it becomes busy again.
+    '''
+
+    def __init__(self, threshold: float, window: float) -> None:
+        self.threshold = threshold
+        # Seconds
+        self.window = window
+        self.idle_since = {}  # type: Dict[int, float]
+        self.reported = set()  # type: Set[int]
+
+    def observe(self, records: Iterable[UsageRecord]) -> None:
+        for record in records:
+            if is_missing(record.utilization):
+                continue
+            if record.utilization < self.threshold:
+                self.idle_since.setdefault(record.reservation_id, record.timestamp)
+            else:
+                self.idle_since.pop(record.reservation_id, None)
+                self.reported.discard(record.reservation_id)
+
+    def due(self, now: float) -> List[int]:
+        '''Returns ids of reservations which have been idle for the whole window and haven't been reported yet'''
+        result = [reservation_id for reservation_id, since in self.idle_since.items()
+                  if now - since >= self.window and reservation_id not in self.reported]
+        self.reported.update(result)
+        return result
+
+    def forget(self, reservation_ids: Iterable[int]) -> None:
+        for reservation_id in reservation_ids:
+            self.idle_since.pop(reservation_id, None)
+            self.reported.discard(reservation_id)
+
+
+def release_idle_reservation(reservation: Reservation, action: IdleReservationAction,
+                             now: Optional[datetime.datetime] = None) -> bool:
+    '''
+    Shortens (ends now, but respecting minimal reservation duration) or cancels reservation.
+    Returns True if reservation has been modified.
+    '''
+    now = now or datetime.datetime.utcnow()
+    if action == IdleReservationAction.SHORTEN:
+        new_end = max(now, reservation.start + Reservation.min_duration)
+        if new_end >= reservation.end:
+            return False
+        reservation.end = new_end
+    elif action == IdleReservationAction.CANCEL:
+        reservation.is_cancelled = True
+    else:
+        return False
+    reservation.save()
+    return True
+
+
+class IdleReservationNotifier():
+    '''Emails reservation owner about detected idleness (and action taken), if SMTP is configured'''
+
+    def __init__(self) -> None:
+        self.mailer = Mailer(server=MAILBOT.SMTP_SERVER, port=MAILBOT.SMTP_PORT)
+
+    def notify(self, reservation: Reservation, idle_minutes: float, action: IdleReservationAction) -> None:
+        email_address = reservation.user.email if reservation.user else None
+        if not email_address:
+            log.info('Owner of idle reservation id={} has no email assigned'.format(reservation.id))
+            return
+        if not (MAILBOT.SMTP_SERVER and MAILBOT.SMTP_LOGIN and MAILBOT.SMTP_PASSWORD):
+            log.error('Incomplete SMTP configuration, please check your config: {}'.format(
+                CONFIG_FILES.MAILBOT_CONFIG_PATH))
+            return
+
+        action_taken = {
+            IdleReservationAction.SHORTEN: 'Reservation has been shortened, it ends at {} UTC.'.format(
+                reservation.end.strftime('%Y-%m-%d %H:%M')),
+            IdleReservationAction.CANCEL: 'Reservation has been cancelled.',
+        }.get(action, 'Please consider cancelling it, so that others can use this GPU.')
+        body = MAILBOT.IDLE_RESERVATION_BODY_TEMPLATE.format(
+            title=reservation.title, gpu=reservation.resource_id, idle_minutes=int(idle_minutes),
+            action_taken=action_taken)
+        try:
+            self.mailer.connect(login=MAILBOT.SMTP_LOGIN, password=MAILBOT.SMTP_PASSWORD)
+            self.mailer.send(Message(author=MAILBOT.SMTP_LOGIN, to=email_address,
+                                     subject=MAILBOT.IDLE_RESERVATION_SUBJECT, body=body))
+            self.mailer.disconnect()
+            log.info('Owner of idle reservation id={} ({}) has been notified'.format(reservation.id, email_address))
+        except (smtplib.SMTPException, OSError) as e:
+            log.error(e)
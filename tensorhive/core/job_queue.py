@@ -0,0 +1,67 @@
+from sqlalchemy.orm import Session
+from tensorhive.database import db_session
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import threading
+import time
+import logging
+log = logging.getLogger(__name__)
+
+
+class JobQueue():
+    '''
+    Process-wide copy of the job queue (queued jobs which are not running), so that a scheduling pass
+    does not load every queued job with its tasks from the database. After the first load only jobs reported
+    through `mark_changed` (see session events in Job model) are fetched again, with `loader(session, job_ids)`.
+
+    Changes it can't follow (e.g. rows removed by ON DELETE CASCADE or made outside of the ORM) are caught
+    by a full reload (reconciliation) every `reconcile_every` seconds or after `invalidate`.
+
+    Jobs are detached snapshots with their tasks and owner loaded, meant for reading only:
+    whatever changes a job has to load it again through db_session.
+    '''
+
+    def __init__(self, loader: Callable[[Session, Optional[Set[int]]], list], reconcile_every: float = 600.0) -> None:
+        self.loader = loader
+        self.reconcile_every = reconcile_every
+        self._jobs = {}  # type: Dict[int, object]
+        self._changed = set()  # type: Set[int]
+        self._reconciled_at = None  # type: Optional[float]
+        self._lock = threading.Lock()
+
+    def mark_changed(self, job_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._changed.update(job_ids)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._reconciled_at = None
+
+    def _load(self, job_ids: Optional[Set[int]]) -> list:
+        # Shares connection (and transaction) of current thread's session, objects get detached when it's closed
+        session = Session(bind=db_session.connection(), autoflush=False, expire_on_commit=False)
+        try:
+            return self.loader(session, job_ids)
+        finally:
+            session.close()
+
+    def jobs(self) -> List:
+        '''Queued jobs in order of submission (by id), meant to be called by a single (scheduling) thread'''
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            now = time.monotonic()
+            reconcile = self._reconciled_at is None or now - self._reconciled_at >= self.reconcile_every
+            if reconcile:
+                self._reconciled_at = now
+
+        try:
+            if reconcile:
+                self._jobs = {job.id: job for job in self._load(None)}
+                log.debug('Job queue reconciled, {} queued jobs'.format(len(self._jobs)))
+            elif changed:
+                for job_id in changed:
+                    self._jobs.pop(job_id, None)
+                self._jobs.update((job.id, job) for job in self._load(changed))
+        except Exception:
+            self.invalidate()
+            raise
+        return [self._jobs[job_id] for job_id in sorted(self._jobs)]
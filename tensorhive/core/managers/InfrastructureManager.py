@@ -1,25 +1,200 @@
 from typing import Dict
 import json
 import logging
-from typing import List
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional, Tuple, NamedTuple
 log = logging.getLogger(__name__)
 
 
+class Snapshot(NamedTuple):
+    '''
+    Complete, immutable state of the infrastructure after a single monitoring tick.
+    It must not be modified by readers, make a copy instead (see `InfrastructureManager.copy_structure`).
+    '''
+    version: int
+    infrastructure: Dict
+    gpu_locations: Dict[str, Tuple[str, int]]
+    gpu_uuids_by_index: Dict[Tuple[str, int], str]
+    host_gpu_uuids: Dict[str, List[str]]
+
+
 class InfrastructureManager():
     '''
     Holds the state/representation of discovered/known infrastruture with metrics
+
+    Concurrency model: single writer (MonitoringService), many readers (other services, API).
+    Writer stages all changes made within `updating()` block and publishes them at once,
+    as a new snapshot with incremented version. Published snapshot is never modified afterwards,
+    so readers which grab `snapshot` (or `infrastructure`) once always see a complete tick.
+
+    Apart from raw data every snapshot carries lookup indexes for GPUs:
+    - uuid -> (hostname, index)
+    - (hostname, index) -> uuid
+    - hostname -> [uuid, ...] (ordered by index)
+
+    Index means the position of GPU in nvidia-smi output, which is the same as nvidia-smi's GPU index.
+
+    It also serves as a simple publish/subscribe bus for services (see `subscribe`),
+    every published snapshot is announced on SNAPSHOT_TOPIC.
     '''
+    SNAPSHOT_TOPIC = 'snapshot'
+    # Published by services which modify reservations (payload: list of reservation ids)
+    RESERVATIONS_TOPIC = 'reservations'
 
     def __init__(self, available_nodes):
-        self._infrastructure = {}  # type: Dict
+        infrastructure = {}  # type: Dict
         for node in available_nodes.keys():
-            self._infrastructure[node] = {}  # type: Dict
+            infrastructure[node] = {}  # type: Dict
+
+        self._condition = threading.Condition()
+        self._staging = None  # type: Optional[Dict]
+        # Single writer at a time: thread inside `updating()` owns the staging copy, others wait for it
+        self._writer_lock = threading.Lock()
+        self._writer = None  # type: Optional[int]
+        self._snapshot = self._build_snapshot(version=0, infrastructure=infrastructure)
+        self._subscribers = {}  # type: Dict[str, List[Callable[[Any], None]]]
+        self._subscribers_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
 
     @property
     def infrastructure(self) -> Dict:
-        return self._infrastructure
+        return self._snapshot.infrastructure
+
+    @staticmethod
+    def copy_structure(infrastructure: Dict) -> Dict:
+        '''
+        Copies nodes and resource mappings, leaves resources' data shared.
+        Result can be safely filtered (keys removed) without affecting the original.
+        '''
+        return {
+            hostname: {
+                resource_type: dict(resources) if isinstance(resources, dict) else resources
+                for resource_type, resources in node_data.items()
+            }
+            for hostname, node_data in infrastructure.items()
+        }
+
+    @staticmethod
+    def _build_snapshot(version: int, infrastructure: Dict) -> Snapshot:
+        gpu_locations = {}  # type: Dict[str, Tuple[str, int]]
+        gpu_uuids_by_index = {}  # type: Dict[Tuple[str, int], str]
+        host_gpu_uuids = {}  # type: Dict[str, List[str]]
+        for hostname, node_data in infrastructure.items():
+            uuids = list((node_data.get('GPU') or {}).keys())
+            for index, uuid in enumerate(uuids):
+                gpu_locations[uuid] = (hostname, index)
+                gpu_uuids_by_index[(hostname, index)] = uuid
+            if uuids:
+                host_gpu_uuids[hostname] = uuids
+        return Snapshot(version, infrastructure, gpu_locations, gpu_uuids_by_index, host_gpu_uuids)
+
+    @contextmanager
+    def updating(self):
+        '''
+        Groups multiple `update_node` calls into a single published snapshot.
 
-    def node_gpu_processes(self, hostname: str) -> Dict:
+        with infrastructure_manager.updating():
+            infrastructure_manager.update_node('example_host_0', 'GPU', {...})
+            infrastructure_manager.update_node('example_host_0', 'CPU', {...})
+        '''
+        if self._writer == threading.get_ident():
+            raise RuntimeError('Nested infrastructure updates are not supported')
+        snapshot = None
+        try:
+            with self._writer_lock:
+                self._writer = threading.get_ident()
+                self._staging = self.copy_structure(self.infrastructure)
+                try:
+                    yield self._staging
+                finally:
+                    staged, self._staging, self._writer = self._staging, None, None
+                    # Next writer has to start from this snapshot
+                    snapshot = self._swap_snapshot(staged)
+        finally:
+            # Subscribers are notified outside of the lock, so that they can update the infrastructure too
+            if snapshot is not None:
+                self.publish_event(self.SNAPSHOT_TOPIC, snapshot)
+
+    def _swap_snapshot(self, infrastructure: Dict) -> Snapshot:
+        with self._condition:
+            snapshot = self._build_snapshot(self._snapshot.version + 1, infrastructure)
+            self._snapshot = snapshot
+            self._condition.notify_all()
+        return snapshot
+
+    def subscribe(self, callback: Callable[[Any], None], topic: str = SNAPSHOT_TOPIC) -> None:
+        '''
+        Registers callback called with event's payload whenever something is published on given topic.
+        Callbacks are executed by the publishing thread, so they should only hand the work over (e.g. set an Event).
+        '''
+        with self._subscribers_lock:
+            self._subscribers.setdefault(topic, []).append(callback)
+
+    def unsubscribe(self, callback: Callable[[Any], None], topic: str = SNAPSHOT_TOPIC) -> None:
+        with self._subscribers_lock:
+            if callback in self._subscribers.get(topic, []):
+                self._subscribers[topic].remove(callback)
+
+    def publish_event(self, topic: str, payload: Any = None) -> None:
+        with self._subscribers_lock:
+            callbacks = list(self._subscribers.get(topic, []))
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception as e:
+                log.warning('Subscriber {} of "{}" topic failed: {}'.format(callback, topic, e))
+
+    def update_node(self, hostname: str, resource_type: str, data: Optional[Dict]) -> None:
+        '''
+        Replaces node's data about given resource type ('GPU', 'CPU').
+        Outside of `updating()` block of the calling thread the change is published immediately
+        (after other thread's update, if there is one in progress).
+        '''
+        if self._writer != threading.get_ident():
+            with self.updating():
+                self.update_node(hostname, resource_type, data)
+            return
+        self._staging.setdefault(hostname, {})[resource_type] = data
+
+    def wait_for_snapshot(self, after_version: int, timeout: Optional[float] = None) -> Snapshot:
+        '''
+        Blocks until snapshot newer than after_version gets published (or timeout passes).
+        Returns the most recent snapshot, caller should check its version to tell both cases apart.
+        '''
+        with self._condition:
+            self._condition.wait_for(lambda: self._snapshot.version > after_version, timeout=timeout)
+            return self._snapshot
+
+    def find_gpu(self, uuid: str) -> Optional[Tuple[str, int]]:
+        '''Returns (hostname, index) of GPU with given UUID or None if such GPU is not known'''
+        return self._snapshot.gpu_locations.get(uuid)
+
+    def find_hostname(self, uuid: str) -> Optional[str]:
+        location = self.find_gpu(uuid)
+        return location[0] if location else None
+
+    def host_gpu_uuids(self, hostname: str) -> List[str]:
+        '''Returns UUIDs of all GPUs installed on given node, ordered by index'''
+        return self._snapshot.host_gpu_uuids.get(hostname, [])
+
+    def gpu_data(self, uuid: str) -> Optional[Dict]:
+        '''Returns whole data (name, index, metrics, processes) of GPU with given UUID'''
+        snapshot = self._snapshot
+        location = snapshot.gpu_locations.get(uuid)
+        if location is None:
+            return None
+        gpus = snapshot.infrastructure.get(location[0], {}).get('GPU') or {}
+        return gpus.get(uuid)
+
+    def node_gpu_processes(self, hostname: str, infrastructure: Optional[Dict] = None) -> Dict:
         '''
 
         Example result:
@@ -40,18 +215,21 @@ class InfrastructureManager():
             "GPU-abcdefg6-8240-2e11-efe9-abcdefgb8273": None
         }
         '''
+        if infrastructure is None:
+            infrastructure = self.infrastructure
 
         # Make sure we can fetch GPU data first.
         # Example reasons: node is unreachable, nvidia-smi failed
-        if self.infrastructure.get(hostname, {}).get('GPU') is None:
+        gpus = infrastructure.get(hostname, {}).get('GPU')
+        if gpus is None:
             log.debug('There is no GPU data for host: {}'.format(hostname))
             return {}
 
         # Loop through each GPU on node
         node_processes = {}
-        for uuid, gpu_data in self.infrastructure[hostname]['GPU'].items():
-            if 'processes' in self.infrastructure[hostname]['GPU'][uuid]:
-                single_gpu_processes = self.infrastructure[hostname]['GPU'][uuid]['processes']
+        for uuid, gpu_data in gpus.items():
+            if 'processes' in gpu_data:
+                single_gpu_processes = gpu_data['processes']
                 if single_gpu_processes is not None:
                     node_processes[uuid] = [process for process in single_gpu_processes if process['command']
                                             not in self.ignored_processes]
@@ -60,11 +238,18 @@ class InfrastructureManager():
         return node_processes
 
     def all_nodes_with_gpu_processes(self) -> Dict[str, Dict]:
-        return {node: self.node_gpu_processes(node) for node in self.infrastructure}
+        infrastructure = self.infrastructure
+        return {node: self.node_gpu_processes(node, infrastructure) for node in infrastructure}
 
     # TODO: this should become obsolete when gpu_uid becomes stored in Task model
-    def get_gpu_uid(self, hostname, gpu_id) -> str:
-        return list(self.infrastructure[hostname]['GPU'].keys())[gpu_id]
+    def get_gpu_uid(self, hostname: str, gpu_id: Optional[int]) -> Optional[str]:
+        if gpu_id is None:
+            return None
+        return self._snapshot.gpu_uuids_by_index.get((hostname, gpu_id))
+
+    def get_gpu_index(self, gpu_uid: str) -> Optional[int]:
+        location = self._snapshot.gpu_locations.get(gpu_uid)
+        return location[1] if location is not None else None
 
     @property
     def ignored_processes(self):
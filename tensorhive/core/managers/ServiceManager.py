@@ -19,6 +19,7 @@ class ServiceManager():
         for service in self.services:
             service.inject(self.infrastructure_manager)
             service.inject(self.connection_manager)
+            service.subscribe_triggers(self.infrastructure_manager)
 
     def start_all_services(self):
         for service in self.services:
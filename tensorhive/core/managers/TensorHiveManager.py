@@ -23,9 +23,12 @@ from tensorhive.core.violation_handlers.MessageSendingBehaviour import MessageSe
 from tensorhive.core.violation_handlers.EmailSendingBehaviour import EmailSendingBehaviour
 from tensorhive.core.violation_handlers.UserProcessKillingBehaviour import UserProcessKillingBehaviour
 from tensorhive.core.violation_handlers.SudoProcessKillingBehaviour import SudoProcessKillingBehaviour
-from tensorhive.core.scheduling import GreedyScheduler
+from tensorhive.core.runtime_estimation import RuntimeEstimator
+from tensorhive.core.scheduling import BackfillingScheduler, GreedyScheduler
+from tensorhive.core.metrics_history import MetricsHistory, Tier
 from tensorhive.core import ssh
 from pathlib import PosixPath
+from datetime import timedelta
 import logging
 log = logging.getLogger(__name__)
 
@@ -36,6 +39,9 @@ class TensorHiveManager(metaclass=Singleton):
     def __init__(self):
         super().__init__()
         self.infrastructure_manager = InfrastructureManager(SSH.AVAILABLE_NODES)
+        self.metrics_history = MetricsHistory(tiers=[Tier(*tier) for tier in MONITORING_SERVICE.HISTORY_TIERS])
+        if MONITORING_SERVICE.HISTORY_ENABLED:
+            self.infrastructure_manager.subscribe(self.metrics_history.record_snapshot)
 
         self.dedicated_ssh_key = ssh.init_ssh_key(PosixPath(SSH.KEY_FILE).expanduser())
 
@@ -82,9 +88,21 @@ class TensorHiveManager(metaclass=Singleton):
         if JOB_SCHEDULING_SERVICE.ENABLED:
             job_scheduling_service = JobSchedulingService(
                 interval=JOB_SCHEDULING_SERVICE.UPDATE_INTERVAL,
-                stop_attempts_after=JOB_SCHEDULING_SERVICE.STOP_TERMINATION_ATTEMPTS_AFTER)
-            # TODO: scheduler configuration when more schedulers are available
-            job_scheduling_service.inject(GreedyScheduler())
+                stop_attempts_after=JOB_SCHEDULING_SERVICE.STOP_TERMINATION_ATTEMPTS_AFTER,
+                trigger_on_update=JOB_SCHEDULING_SERVICE.TRIGGER_ON_UPDATE,
+                debounce=JOB_SCHEDULING_SERVICE.TRIGGER_DEBOUNCE,
+                preemption_signal=JOB_SCHEDULING_SERVICE.PREEMPTION_SIGNAL or None,
+                preemption_grace_period=JOB_SCHEDULING_SERVICE.PREEMPTION_GRACE_PERIOD)
+            if JOB_SCHEDULING_SERVICE.SCHEDULER == 'backfilling':
+                scheduler = BackfillingScheduler(
+                    fair_share_weights=JOB_SCHEDULING_SERVICE.FAIR_SHARE_WEIGHTS,
+                    fair_share_window=timedelta(days=JOB_SCHEDULING_SERVICE.FAIR_SHARE_WINDOW_DAYS),
+                    runtime_estimator=RuntimeEstimator(history=JOB_SCHEDULING_SERVICE.RUNTIME_ESTIMATE_HISTORY))
+            else:
+                if JOB_SCHEDULING_SERVICE.SCHEDULER != 'greedy':
+                    log.warning('Unknown scheduler "{}", using greedy'.format(JOB_SCHEDULING_SERVICE.SCHEDULER))
+                scheduler = GreedyScheduler()
+            job_scheduling_service.inject(scheduler)
             services.append(job_scheduling_service)
         if PROTECTION_SERVICE.LEVEL:
             violation_handlers = []
@@ -102,10 +120,15 @@ class TensorHiveManager(metaclass=Singleton):
                 violation_handlers.append(process_killing_handler)
             protection_service = ProtectionService(
                 handlers=violation_handlers, interval=PROTECTION_SERVICE.UPDATE_INTERVAL,
-                strict_reservations=PROTECTION_SERVICE.LEVEL > 1)
+                strict_reservations=PROTECTION_SERVICE.LEVEL > 1,
+                trigger_on_update=PROTECTION_SERVICE.TRIGGER_ON_UPDATE,
+                debounce=PROTECTION_SERVICE.TRIGGER_DEBOUNCE)
             services.append(protection_service)
         if USAGE_LOGGING_SERVICE.ENABLED:
-            usage_logging_service = UsageLoggingService(interval=USAGE_LOGGING_SERVICE.UPDATE_INTERVAL)
+            usage_logging_service = UsageLoggingService(
+                interval=USAGE_LOGGING_SERVICE.UPDATE_INTERVAL,
+                trigger_on_update=USAGE_LOGGING_SERVICE.TRIGGER_ON_UPDATE,
+                debounce=USAGE_LOGGING_SERVICE.TRIGGER_DEBOUNCE)
             services.append(usage_logging_service)
         return services
 
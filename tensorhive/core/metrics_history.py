@@ -0,0 +1,175 @@
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import threading
+import time
+import logging
+log = logging.getLogger(__name__)
+
+
+class Tier(NamedTuple):
+    '''Single level of history: one aggregated sample per `resolution` seconds, kept for `retention` seconds'''
+    resolution: float
+    retention: float
+
+    @property
+    def capacity(self) -> int:
+        return max(int(self.retention // self.resolution), 1)
+
+
+# 2s for 1 hour, 1 min for 1 day, 15 min for 30 days
+DEFAULT_TIERS = [Tier(2, 60 * 60), Tier(60, 24 * 60 * 60), Tier(15 * 60, 30 * 24 * 60 * 60)]
+DEFAULT_METRICS = {
+    'GPU': ['utilization', 'mem_util', 'mem_used', 'power', 'temp'],
+    'CPU': ['utilization', 'mem_used'],
+}
+
+
+class RingBuffer():
+    '''
+    Fixed-memory circular storage of samples aggregated into buckets (count, sum, min, max).
+
+    Bucket is identified by `int(timestamp // resolution)` and lives in slot `bucket % capacity`,
+    so writing a sample to a slot owned by an older bucket simply takes it over.
+    Values are kept in typed arrays instead of Python objects (28 bytes per slot),
+    min/max are single precision, which is more than enough for metrics reported by nvidia-smi.
+    '''
+    __slots__ = ['resolution', 'capacity', 'buckets', 'counts', 'sums', 'mins', 'maxs']
+
+    def __init__(self, resolution: float, capacity: int) -> None:
+        self.resolution = resolution
+        self.capacity = capacity
+        self.buckets = array('q', [-1]) * capacity
+        self.counts = array('I', [0]) * capacity
+        self.sums = array('d', [0.0]) * capacity
+        self.mins = array('f', [0.0]) * capacity
+        self.maxs = array('f', [0.0]) * capacity
+
+    def add(self, timestamp: float, value: float) -> None:
+        bucket = int(timestamp // self.resolution)
+        slot = bucket % self.capacity
+        if self.buckets[slot] != bucket:
+            self.buckets[slot] = bucket
+            self.counts[slot] = 1
+            self.sums[slot] = value
+            self.mins[slot] = value
+            self.maxs[slot] = value
+        else:
+            self.counts[slot] += 1
+            self.sums[slot] += value
+            if value < self.mins[slot]:
+                self.mins[slot] = value
+            if value > self.maxs[slot]:
+                self.maxs[slot] = value
+
+    def query(self, start: float, end: float) -> Iterable[Tuple[float, float, float, float]]:
+        '''Yields (bucket start timestamp, avg, min, max) for buckets within given range, oldest first'''
+        last = int(end // self.resolution)
+        first = max(int(start // self.resolution), last - self.capacity + 1)
+        for bucket in range(first, last + 1):
+            slot = bucket % self.capacity
+            if self.buckets[slot] == bucket:
+                count = self.counts[slot]
+                yield bucket * self.resolution, self.sums[slot] / count, self.mins[slot], self.maxs[slot]
+
+
+class MetricsHistory():
+    '''
+    Keeps recent history of numeric metrics for every GPU/CPU, fed with published infrastructure snapshots.
+
+    Each series (hostname, resource type, uuid, metric) has one RingBuffer per tier,
+    so memory usage is fixed and known upfront, regardless of uptime.
+    '''
+
+    def __init__(self, tiers: Optional[List[Tier]] = None, metrics: Optional[Dict[str, List[str]]] = None) -> None:
+        self.tiers = sorted(tiers or DEFAULT_TIERS, key=lambda tier: tier.resolution)
+        self.metrics = metrics if metrics is not None else DEFAULT_METRICS
+        self._series = {}  # type: Dict[Tuple[str, str, str, str], List[RingBuffer]]
+        self._lock = threading.Lock()
+
+    def _buffers(self, key: Tuple[str, str, str, str]) -> List[RingBuffer]:
+        buffers = self._series.get(key)
+        if buffers is None:
+            buffers = [RingBuffer(tier.resolution, tier.capacity) for tier in self.tiers]
+            self._series[key] = buffers
+        return buffers
+
+    def record(self, infrastructure: Dict, timestamp: Optional[float] = None) -> None:
+        '''Adds current value of every tracked metric, missing values (None) are skipped'''
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            for hostname, node_data in infrastructure.items():
+                for resource_type, tracked_metrics in self.metrics.items():
+                    for uuid, resource_data in (node_data.get(resource_type) or {}).items():
+                        metrics = resource_data.get('metrics') or {}
+                        for metric_name in tracked_metrics:
+                            metric = metrics.get(metric_name)
+                            value = metric.get('value') if isinstance(metric, dict) else metric
+                            if isinstance(value, (int, float)):
+                                key = (hostname, resource_type, uuid, metric_name)
+                                for buffer in self._buffers(key):
+                                    buffer.add(timestamp, float(value))
+
+    def record_snapshot(self, snapshot) -> None:
+        '''Callback for InfrastructureManager's snapshot topic'''
+        self.record(snapshot.infrastructure)
+
+    def choose_tier(self, start: float, end: float, resolution: Optional[float] = None) -> int:
+        '''
+        Picks the finest tier which still holds data from `start` (and is not finer than requested resolution).
+        Falls back to the coarsest tier when range exceeds all retentions.
+        '''
+        now = time.time()
+        for position, tier in enumerate(self.tiers):
+            if resolution is not None and tier.resolution < resolution:
+                continue
+            if now - start <= tier.retention:
+                return position
+        return len(self.tiers) - 1
+
+    def query(self, start: float, end: float, hostnames: Optional[List[str]] = None,
+              uuids: Optional[List[str]] = None, metric_names: Optional[List[str]] = None,
+              resolution: Optional[float] = None) -> Dict:
+        '''
+        Example result:
+        {
+            'resolution': 60,
+            'nodes': {
+                'example_host_0': {
+                    '<GPU0_UUID>': {
+                        'type': 'GPU',
+                        'metrics': {
+                            'utilization': {
+                                'timestamp': [1577836800, 1577836860, ...],
+                                'avg': [10.5, 12.0, ...],
+                                'min': [0.0, 5.0, ...],
+                                'max': [21.0, 19.0, ...]
+                            }
+                        }
+                    }
+                }
+            }
+        }
+        '''
+        # Buckets past now don't exist yet, a later end would only shift the window away from recorded data
+        end = min(end, time.time())
+        position = self.choose_tier(start, end, resolution)
+        nodes = {}  # type: Dict[str, Dict]
+        with self._lock:
+            for (hostname, resource_type, uuid, metric_name), buffers in self._series.items():
+                if hostnames is not None and hostname not in hostnames:
+                    continue
+                if uuids is not None and uuid not in uuids:
+                    continue
+                if metric_names is not None and metric_name not in metric_names:
+                    continue
+
+                series = {'timestamp': [], 'avg': [], 'min': [], 'max': []}  # type: Dict[str, List]
+                for timestamp, avg, minimum, maximum in buffers[position].query(start, end):
+                    series['timestamp'].append(int(timestamp))
+                    series['avg'].append(round(avg, 2))
+                    series['min'].append(round(minimum, 2))
+                    series['max'].append(round(maximum, 2))
+
+                resource = nodes.setdefault(hostname, {}).setdefault(uuid, {'type': resource_type, 'metrics': {}})
+                resource['metrics'][metric_name] = series
+        return {'resolution': self.tiers[position].resolution, 'nodes': nodes}
@@ -34,4 +34,4 @@ class CPUMonitor(Monitor):
                 elif host_output.exception:
                     log.error('cpu query raised {} on {}'.format(host_output.exception.__class__.__name__, host_output.host))
                 metrics = None
-            infrastructure_manager.infrastructure[host_output.host]['CPU'] = metrics
+            infrastructure_manager.update_node(host_output.host, 'CPU', metrics)
@@ -12,9 +12,12 @@ class GPUMonitor(Monitor):
 
     @override
     def update(self, group_connection, infrastructure_manager):
-        self._update_gpu_metrics(group_connection, infrastructure_manager)
+        # Data is assembled locally and handed over complete, readers never see partially merged processes
+        gpus = self._gpu_metrics(group_connection)  # type: Dict
         processes = self._current_processes(group_connection, infrastructure_manager)  # type: Dict
-        self._update_processes(infrastructure_manager, processes)
+        self._merge_processes(gpus, processes)
+        for hostname, node_gpus in gpus.items():
+            infrastructure_manager.update_node(hostname, 'GPU', node_gpus)
 
     @property
     def composed_query_command(self) -> str:
@@ -47,7 +50,7 @@ class GPUMonitor(Monitor):
             format_options=format_options)
         return command
 
-    def _update_gpu_metrics(self, group_connection, infrastructure_manager):
+    def _gpu_metrics(self, group_connection) -> Dict[str, Dict]:
         '''
         Executes a query on each node within group_connection, then
         it returns gathered information as a dictionary.
@@ -55,21 +58,19 @@ class GPUMonitor(Monitor):
         Example result:
         {
             'example_host_0': {
-                'GPU': {
-                    '<GPU0 UUID>': {
-                        'name': 'GeForce GTX 660',
-                        'index': 0,
-                        'metrics': { "fan_speed": 10, ... }
-                    }
-                    '<GPU1 UUID>': {
-                        'name': 'GeForce GTX 1060'
-                        'index': 1,
-                        'metrics': { "fan_speed": 22, ... },
-                    },
-                    ...
+                '<GPU0 UUID>': {
+                    'name': 'GeForce GTX 660',
+                    'index': 0,
+                    'metrics': { "fan_speed": 10, ... }
                 }
+                '<GPU1 UUID>': {
+                    'name': 'GeForce GTX 1060'
+                    'index': 1,
+                    'metrics': { "fan_speed": 22, ... },
+                },
+                ...
             },
-            ...
+            'unreachable_host': None
         }
         '''
         # stop_on_errors=False means that single host failure does not raise an exception,
@@ -77,6 +78,7 @@ class GPUMonitor(Monitor):
         output = group_connection.run_command(self.composed_query_command, stop_on_errors=False)
         group_connection.join(output)
 
+        result = {}
         #for host, host_out in output.items():
         for host_output in output:
             if host_output.exit_code == 0:
@@ -90,7 +92,8 @@ class GPUMonitor(Monitor):
                     log.error('nvidia-smi raised {} on {}'.format(host_output.exception.__class__.__name__, host_output.host))
                 metrics = None
 
-            infrastructure_manager.infrastructure[host_output.host]['GPU'] = metrics
+            result[host_output.host] = metrics
+        return result
 
     def _get_process_owner(self, pid: int, hostname: str, connection) -> str:
         '''Use single-host connection to acquire process owner using `ps`'''
@@ -127,19 +130,19 @@ class GPUMonitor(Monitor):
         Explanation for this is that GPUs' indexes are not fixed in time,
         hence UUID parameter.
 
-        When executed, gives output, like:
+        When executed, gives output, like (fb column - process memory in MiB):
             UUID=GPU-c6d01ed6-8240-2e11-efe9-1111111111111
-            # gpu        pid  type    sm   mem   enc   dec   command
-            # Idx          #   C/G     %     %     %     %   name
-                0       1979     G     0     3     0     0   X
-                1       1234     G     0    90     0     0   python
-                1       4567     G     0    89     0     0   python
+            # gpu        pid  type    sm   mem   enc   dec    fb   command
+            # Idx          #   C/G     %     %     %     %    MB   name
+                0       1979     G     0     3     0     0    10   X
+                1       1234     G     0    90     0     0  5120   python
+                1       4567     G     0    89     0     0  4096   python
             UUID=GPU-c6d01ed6-8240-2e11-efe9-2222222222222
-            # gpu        pid  type    sm   mem   enc   dec   command
-            # Idx          #   C/G     %     %     %     %   name
-                0       1979     G     0     3     0     0   X
-                1       1234     G     0    90     0     0   python
-                1       4567     G     0    89     0     0   python
+            # gpu        pid  type    sm   mem   enc   dec    fb   command
+            # Idx          #   C/G     %     %     %     %    MB   name
+                0       1979     G     0     3     0     0    10   X
+                1       1234     G     0    90     0     0  5120   python
+                1       4567     G     0    89     0     0  4096   python
             UUID=GPU-7fcc76c8-ac23-0ead-83ce-3f6f3d831d8a
             [PMON NOT SUPPORTED]
         '''
@@ -155,7 +158,7 @@ class GPUMonitor(Monitor):
                     echo "UUID=$line"
 
                     # Fetch a list of processes on this GPU
-                    PROCESSES=$(nvidia-smi pmon --count 1 --id "$line")
+                    PROCESSES=$(nvidia-smi pmon --count 1 --select um --id "$line")
 
                     if [ $? -eq 0 ]; then
                         echo "$PROCESSES"
@@ -180,6 +183,7 @@ class GPUMonitor(Monitor):
                     "uuid": "GPU-c6d01ed6-8240-2e11-efe9-aa32794b8273",
                     "pid": 1979,
                     "command": "X",
+                    "mem_used": 10,
                     "owner": "root"
                 }
             ],
@@ -204,51 +208,45 @@ class GPUMonitor(Monitor):
             result[host_output.host] = processes
         return result
 
-    def _update_processes(self, infrastructure_manager, processes: Dict):
+    def _merge_processes(self, gpus: Dict[str, Dict], processes: Dict):
         '''
-        Updates processes for the appropriate GPU records in infrastructure manager
+        Assigns processes to the appropriate freshly fetched GPU records (see `_gpu_metrics`)
 
         Example result:
         {
             "example_host_0": {
-                "GPU": {
-                    "GPU-c6d01ed6-8240-2e11-efe9-aa32794b8273": {
-                        "name": "GeForce GTX 1060 6GB",
-                        "index": 0,
-                        "metrics": {
-                            "fan_speed": {
-                                "value": 25,
-                                "unit": "%"
-                            },
-                            "temp": 40,
-                            ...
-                        },
-                        "processes": [
-                            {
-                                "pid": 1979,
-                                "command": "X",
-                                "owner": "root"
-                            }
-                        ]
-                    }
+                "GPU-c6d01ed6-8240-2e11-efe9-aa32794b8273": {
+                    "name": "GeForce GTX 1060",
+                    "index": 0,
+                    "metrics": {...},
+                    "processes": [
+                        {
+                            "pid": 1979,
+                            "command": "X",
+                            "owner": "root"
+                        }
+                    ]
                 }
             },
         }
         '''
-        for hostname, gpu_processes_on_node in processes.items():
-            if infrastructure_manager.infrastructure[hostname].get('GPU') is None:
+        for hostname, node_gpus in gpus.items():
+            if node_gpus is None:
                 # Can't access any GPU right now, e.g. could not connect to host or nvidia-smi failure
                 continue
 
             # Introduce new key - 'processes' with default value
-            for uuid, _ in infrastructure_manager.infrastructure[hostname]['GPU'].items():
-                infrastructure_manager.infrastructure[hostname]['GPU'][uuid]['processes'] = None
+            for gpu_data in node_gpus.values():
+                gpu_data['processes'] = None
 
             # Unpack every known process and move to the corresponding GPU
-            for process in gpu_processes_on_node:
+            for process in processes.get(hostname) or []:
                 uuid = process.pop('uuid')
+                if uuid not in node_gpus:
+                    # GPU appeared between both queries
+                    continue
 
                 # Replace default value with an empty list, because we have a new process to append
-                if infrastructure_manager.infrastructure[hostname]['GPU'][uuid]['processes'] is None:
-                    infrastructure_manager.infrastructure[hostname]['GPU'][uuid]['processes'] = []
-                infrastructure_manager.infrastructure[hostname]['GPU'][uuid]['processes'].append(process)
+                if node_gpus[uuid]['processes'] is None:
+                    node_gpus[uuid]['processes'] = []
+                node_gpus[uuid]['processes'].append(process)
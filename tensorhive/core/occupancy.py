@@ -0,0 +1,108 @@
+from tensorhive.core.utils.time import utc_timestamp
+from tensorhive.models.Reservation import Reservation
+from tensorhive.models.UsageRollup import UsageRollup
+from typing import Dict, List, Optional, Tuple
+import datetime
+import math
+import logging
+log = logging.getLogger(__name__)
+
+Interval = Tuple[float, float]
+
+
+def occupied_per_bucket(intervals: List[Interval], num_buckets: int, bucket_size: float) -> List[float]:
+    '''
+    Sweep-line over (start, end) offsets (in seconds from the beginning of the first bucket) of one resource.
+    Returns fraction of every bucket covered by at least one interval, overlapping intervals are counted once.
+    '''
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    covered = [0.0] * num_buckets
+    active = 0
+    previous = 0.0
+    for time, change in events:
+        if active > 0 and time > previous:
+            first = max(int(previous // bucket_size), 0)
+            last = min(int(math.ceil(time / bucket_size)), num_buckets)
+            for index in range(first, last):
+                bucket_start = index * bucket_size
+                covered[index] += min(time, bucket_start + bucket_size) - max(previous, bucket_start)
+        active += change
+        previous = time
+    return [round(seconds / bucket_size, 3) for seconds in covered]
+
+
+class OccupancyMatrix():
+    '''
+    Reservations and utilization of selected GPUs, aggregated into equal time buckets
+    (rows follow `uuids`, columns follow buckets), so that calendar views do not need every reservation.
+
+    Utilization is taken from usage rollups: hourly ones for buckets shorter than a day, daily otherwise.
+    Buckets shorter than a rollup get average of the whole rollup.
+    '''
+    # Upper limit of uuids x buckets
+    max_cells = 100000
+
+    def __init__(self, uuids: List[str], start: datetime.datetime, end: datetime.datetime,
+                 bucket_size: datetime.timedelta) -> None:
+        assert uuids, 'At least one resource must be given'
+        assert start < end, 'start must be before end'
+        assert bucket_size.total_seconds() > 0, 'bucket size must be positive'
+        self.uuids = uuids
+        self.start = start
+        self.bucket_size = bucket_size.total_seconds()
+        self.num_buckets = int(math.ceil((end - start).total_seconds() / self.bucket_size))
+        assert len(uuids) * self.num_buckets <= self.max_cells, \
+            'Too many buckets requested, use a larger bucket size (max {} cells)'.format(self.max_cells)
+        self.end = start + datetime.timedelta(seconds=self.num_buckets * self.bucket_size)
+
+    def offset(self, moment: datetime.datetime) -> float:
+        return (moment - self.start).total_seconds()
+
+    def occupancy(self) -> Tuple[List[List[float]], List[List[Optional[int]]]]:
+        '''
+        Fraction of each bucket covered by reservations, and owner (user id) of the reservation
+        holding the longest part of each bucket (None when it is free)
+        '''
+        intervals = {uuid: [] for uuid in self.uuids}  # type: Dict[str, List[Tuple[float, float, int]]]
+        for _, uuid, user_id, start, end in Reservation.intervals(self.uuids, self.start, self.end):
+            intervals[uuid].append((self.offset(start), self.offset(end), user_id))
+
+        occupancy, owners = [], []
+        for uuid in self.uuids:
+            occupancy.append(occupied_per_bucket([(start, end) for start, end, _ in intervals[uuid]],
+                                                 self.num_buckets, self.bucket_size))
+            row_owners = [None] * self.num_buckets  # type: List[Optional[int]]
+            longest = [0.0] * self.num_buckets
+            for start, end, user_id in intervals[uuid]:
+                first = max(int(start // self.bucket_size), 0)
+                last = min(int(math.ceil(end / self.bucket_size)), self.num_buckets)
+                for index in range(first, last):
+                    bucket_start = index * self.bucket_size
+                    overlap = min(end, bucket_start + self.bucket_size) - max(start, bucket_start)
+                    if overlap > longest[index]:
+                        longest[index], row_owners[index] = overlap, user_id
+            owners.append(row_owners)
+        return occupancy, owners
+
+    def utilization(self) -> List[List[Optional[float]]]:
+        '''Average GPU utilization (%) within each bucket, None when there are no samples'''
+        granularity = 'day' if self.bucket_size >= UsageRollup.GRANULARITIES['day'] else 'hour'
+        length = UsageRollup.GRANULARITIES[granularity]
+        row_of = {uuid: row for row, uuid in enumerate(self.uuids)}
+        sums = [[0.0] * self.num_buckets for _ in self.uuids]
+        counts = [[0] * self.num_buckets for _ in self.uuids]
+
+        # Rollup which began before start still overlaps the first bucket
+        range_start = UsageRollup.bucket_of(granularity, utc_timestamp(self.start))
+        for rollup in UsageRollup.find('gpu', granularity, range_start, self.end, keys=self.uuids):
+            if not rollup.samples:
+                continue
+            rollup_start = self.offset(rollup.bucket_start)
+            first = max(int(rollup_start // self.bucket_size), 0)
+            last = min(int(math.ceil((rollup_start + length) / self.bucket_size)), self.num_buckets)
+            row = row_of[rollup.key]
+            for index in range(first, last):
+                sums[row][index] += rollup.utilization_sum
+                counts[row][index] += rollup.samples
+        return [[UsageRollup.average(total, count) for total, count in zip(row_sums, row_counts)]
+                for row_sums, row_counts in zip(sums, counts)]
@@ -0,0 +1,69 @@
+from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
+from tensorhive.models.Reservation import Reservation
+from tensorhive.models.Task import Task, TaskPlacement
+from tensorhive.models.User import User
+from typing import Callable, Dict, List, NamedTuple, Optional
+import re
+import logging
+log = logging.getLogger(__name__)
+
+VISIBLE_DEVICES_PATTERN = re.compile(r'(^|\s)CUDA_VISIBLE_DEVICES=\S*')
+
+
+class Placement(NamedTuple):
+    '''Concrete GPUs chosen for a flexible task on launch'''
+    hostname: str
+    gpu_uuids: List[str]
+
+
+def choose_gpus(count: int, free_gpus: Dict[str, List[str]],
+                index_of: Callable[[str, str], int]) -> Optional[Placement]:
+    '''
+    Picks `count` GPUs from a single host, None if no host has enough of them.
+
+    Best fit: the host with the fewest free GPUs that is still enough, so that larger hosts stay
+    available for larger jobs. Within a host, GPUs with the closest indexes are taken (neighbouring
+    GPUs usually share PCIe switch or NVLink), with lower indexes preferred.
+    '''
+    candidates = [(len(gpus), hostname) for hostname, gpus in free_gpus.items() if len(gpus) >= count]
+    if count <= 0 or not candidates:
+        return None
+    _, hostname = min(candidates)
+
+    gpus = sorted(free_gpus[hostname], key=lambda uuid: index_of(hostname, uuid))
+    indexes = [index_of(hostname, uuid) for uuid in gpus]
+    spans = [(indexes[i + count - 1] - indexes[i], i) for i in range(len(gpus) - count + 1)]
+    _, first = min(spans)
+    return Placement(hostname=hostname, gpu_uuids=gpus[first:first + count])
+
+
+def with_visible_devices(command: str, gpu_uuids: List[str]) -> str:
+    '''
+    Replaces any CUDA_VISIBLE_DEVICES assignment in command with chosen GPUs.
+    UUIDs are used instead of indexes, because CUDA may enumerate GPUs in different order than nvidia-smi.
+    '''
+    command = VISIBLE_DEVICES_PATTERN.sub('', command).strip()
+    return 'CUDA_VISIBLE_DEVICES={} {}'.format(','.join(gpu_uuids), command)
+
+
+def free_gpus_for(task: Task, user: User, infrastructure_manager: InfrastructureManager) -> Dict[str, List[str]]:
+    '''
+    GPUs a flexible task of given user may be launched on right now (outside of the scheduler):
+    allowed by user's restrictions, without any (known) processes and not reserved by someone else.
+    '''
+    infrastructure = user.filter_infrastructure_by_user_restrictions(
+        InfrastructureManager.copy_structure(infrastructure_manager.infrastructure))
+    reserved = {reservation.resource_id for reservation in Reservation.current_events()
+                if reservation.user_id != user.id}
+    hostnames = [task.hostname] if task.placement is TaskPlacement.host else list(infrastructure)
+
+    ret = {}  # type: Dict[str, List[str]]
+    for hostname in hostnames:
+        ret[hostname] = []
+        for gpu_uid, gpu_data in ((infrastructure.get(hostname) or {}).get('GPU') or {}).items():
+            processes = gpu_data.get('processes')
+            if processes is None or gpu_uid in reserved:
+                continue
+            if all(process['command'] in infrastructure_manager.ignored_processes for process in processes):
+                ret[hostname].append(gpu_uid)
+    return ret
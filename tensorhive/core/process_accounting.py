@@ -0,0 +1,129 @@
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from tensorhive.database import db_session
+from tensorhive.models.GPUProcessSession import GPUProcessSession
+from typing import Dict, List, Optional, Set, Tuple
+import datetime
+import time
+import logging
+log = logging.getLogger(__name__)
+
+# (hostname, GPU UUID, pid, command) - pid may be reused by another program
+ProcessKey = Tuple[str, str, int, Optional[str]]
+
+
+class OpenSession():
+    '''In-memory state of a process which is still running, persisted as GPUProcessSession with given id'''
+    __slots__ = ['id', 'last_seen', 'samples', 'mem_used_sum', 'mem_used_samples', 'mem_used_max', 'dirty']
+
+    def __init__(self, session_id: int, timestamp: float) -> None:
+        self.id = session_id
+        self.last_seen = timestamp
+        self.samples = 1
+        self.mem_used_sum = 0.0
+        self.mem_used_samples = 0
+        self.mem_used_max = None  # type: Optional[float]
+        self.dirty = False
+
+    def add(self, timestamp: float, mem_used: Optional[float]) -> None:
+        self.last_seen = timestamp
+        self.samples += 1
+        if mem_used is not None:
+            self.mem_used_sum += mem_used
+            self.mem_used_samples += 1
+            self.mem_used_max = mem_used if self.mem_used_max is None else max(self.mem_used_max, mem_used)
+        self.dirty = True
+
+    def values(self) -> Dict:
+        return {
+            'last_seen': datetime.datetime.utcfromtimestamp(self.last_seen),
+            'samples': self.samples,
+            'mem_used_avg': self.mem_used_sum / self.mem_used_samples if self.mem_used_samples else None,
+            'mem_used_max': self.mem_used_max,
+        }
+
+
+class ProcessAccountant():
+    '''
+    Builds process sessions (who used which GPU, from when until when) out of consecutive snapshots,
+    for all GPUs, reserved or not.
+
+    A row is inserted when a process appears and updated when it disappears. While it is running,
+    only in-memory state changes; it is written at most once per `checkpoint_interval`,
+    so the cost does not grow with the number of samples.
+    GPUs without process information (e.g. host unreachable) keep their sessions open until the data is back,
+    but for no longer than `missing_checkpoints` checkpoint intervals since the process was last seen
+    (GPU or host could have been removed), then sessions are finished as of their last sample.
+    '''
+
+    def __init__(self, checkpoint_interval: float = 300.0, missing_checkpoints: int = 3) -> None:
+        self.checkpoint_interval = checkpoint_interval
+        self.missing_checkpoints = missing_checkpoints
+        self.open = {}  # type: Dict[ProcessKey, OpenSession]
+        self._last_checkpoint = time.time()
+
+    @staticmethod
+    def observed_processes(infrastructure: Dict) -> Tuple[Dict[ProcessKey, Dict], Set[Tuple[str, str]]]:
+        '''Returns processes found in infrastructure and (hostname, uuid) of GPUs with known process list'''
+        processes = {}  # type: Dict[ProcessKey, Dict]
+        known_gpus = set()  # type: Set[Tuple[str, str]]
+        for hostname, node_data in infrastructure.items():
+            for uuid, gpu_data in (node_data.get('GPU') or {}).items():
+                if 'processes' not in gpu_data:
+                    continue
+                known_gpus.add((hostname, uuid))
+                for process in gpu_data['processes'] or []:
+                    processes[(hostname, uuid, process['pid'], process.get('command'))] = process
+        return processes, known_gpus
+
+    def update(self, infrastructure: Dict, timestamp: Optional[float] = None) -> None:
+        timestamp = time.time() if timestamp is None else timestamp
+        processes, known_gpus = self.observed_processes(infrastructure)
+        checkpoint = timestamp - self._last_checkpoint >= self.checkpoint_interval
+
+        try:
+            started = []  # type: List[Tuple[ProcessKey, GPUProcessSession]]
+            for key, process in processes.items():
+                session = self.open.get(key)
+                if session is None:
+                    hostname, uuid, pid, command = key
+                    row = GPUProcessSession(
+                        hostname=hostname, gpu_uuid=uuid, pid=pid, owner=process.get('owner'),
+                        command=command[:100] if command else None,
+                        first_seen=datetime.datetime.utcfromtimestamp(timestamp),
+                        last_seen=datetime.datetime.utcfromtimestamp(timestamp), samples=1,
+                        mem_used_avg=process.get('mem_used'), mem_used_max=process.get('mem_used'))
+                    db_session.add(row)
+                    started.append((key, row))
+                else:
+                    session.add(timestamp, process.get('mem_used'))
+
+            missing_since = timestamp - self.missing_checkpoints * self.checkpoint_interval
+            # Gone from a GPU with known process list, or nothing known about it for too long
+            finished = [key for key, session in self.open.items() if key not in processes and (
+                key[:2] in known_gpus or session.last_seen < missing_since)]
+            to_write = finished + ([key for key, session in self.open.items()
+                                    if session.dirty and key not in finished] if checkpoint else [])
+            for key in to_write:
+                session = self.open[key]
+                db_session.execute(update(GPUProcessSession).where(GPUProcessSession.id == session.id)
+                                   .values(**session.values()))
+                session.dirty = False
+            if started:
+                db_session.flush()
+            if started or to_write:
+                db_session.commit()
+        except SQLAlchemyError as e:
+            db_session.rollback()
+            log.error('Unable to store process sessions: {}'.format(e))
+            return
+
+        for key, row in started:
+            session = self.open[key] = OpenSession(row.id, timestamp)
+            if row.mem_used_max is not None:
+                session.mem_used_sum, session.mem_used_samples = row.mem_used_max, 1
+                session.mem_used_max = row.mem_used_max
+        for key in finished:
+            del self.open[key]
+        if checkpoint:
+            self._last_checkpoint = timestamp
@@ -0,0 +1,159 @@
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from bisect import bisect_left, bisect_right
+import datetime
+import threading
+import logging
+log = logging.getLogger(__name__)
+
+# (resource_id, start, end)
+Candidate = Tuple[str, datetime.datetime, datetime.datetime]
+
+
+class ReservedInterval(NamedTuple):
+    '''Lightweight view of an active (not cancelled) reservation'''
+    id: int
+    resource_id: str
+    user_id: int
+    start: datetime.datetime
+    end: datetime.datetime
+
+
+class ReservationIndex():
+    '''
+    Active reservations kept in per-resource arrays sorted by start, so that questions like
+    "what is reserved on GPU X around now" are answered with a binary search instead of a query.
+
+    Active reservations of one resource never overlap (see Reservation.would_interfere),
+    hence their ends are sorted too and every lookup stops at the first interval which ends too early.
+    '''
+
+    def __init__(self, intervals: Iterable[tuple] = ()) -> None:
+        self._starts = {}  # type: Dict[str, List[datetime.datetime]]
+        self._intervals = {}  # type: Dict[str, List[ReservedInterval]]
+        self._resource_of = {}  # type: Dict[int, str]
+        for row in intervals:
+            self.add(ReservedInterval(*row))
+
+    @classmethod
+    def load(cls, start: datetime.datetime, end: datetime.datetime) -> 'ReservationIndex':
+        '''Index of all reservations overlapping with <start, end>, fetched with a single query'''
+        # Imported here, Reservation model uses this module
+        from tensorhive.models.Reservation import Reservation
+        return cls(Reservation.intervals(None, start, end))
+
+    def add(self, interval: ReservedInterval) -> None:
+        self.remove(interval.id)
+        starts = self._starts.setdefault(interval.resource_id, [])
+        position = bisect_right(starts, interval.start)
+        starts.insert(position, interval.start)
+        self._intervals.setdefault(interval.resource_id, []).insert(position, interval)
+        self._resource_of[interval.id] = interval.resource_id
+
+    def remove(self, reservation_id: int) -> None:
+        resource_id = self._resource_of.pop(reservation_id, None)
+        if resource_id is None:
+            return
+        intervals = self._intervals[resource_id]
+        position = next(i for i, interval in enumerate(intervals) if interval.id == reservation_id)
+        del intervals[position]
+        del self._starts[resource_id][position]
+
+    def __len__(self) -> int:
+        return len(self._resource_of)
+
+    def overlapping(self, resource_id: str, start: datetime.datetime, end: datetime.datetime,
+                    exclude_id: Optional[int] = None) -> List[ReservedInterval]:
+        '''Reservations of resource which overlap with (start, end), ordered by start'''
+        starts = self._starts.get(resource_id)
+        if not starts:
+            return []
+        intervals = self._intervals[resource_id]
+        ret = []
+        # Last reservation that starts before `end`, going back until one ends before `start`
+        for position in range(bisect_right(starts, end) - 1, -1, -1):
+            interval = intervals[position]
+            if interval.end <= start:
+                break
+            if interval.start < end and interval.id != exclude_id:
+                ret.append(interval)
+        ret.reverse()
+        return ret
+
+    def conflicts(self, candidates: Iterable[Candidate], exclude_id: Optional[int] = None) -> List[bool]:
+        '''For each (resource_id, start, end) tells whether it overlaps with any reservation'''
+        return [bool(self.overlapping(resource_id, start, end, exclude_id=exclude_id))
+                for resource_id, start, end in candidates]
+
+    def next_after(self, resource_id: str, moment: datetime.datetime) -> Optional[ReservedInterval]:
+        '''First reservation of resource which starts at or after `moment`'''
+        starts = self._starts.get(resource_id) or []
+        position = bisect_left(starts, moment)
+        return self._intervals[resource_id][position] if position < len(starts) else None
+
+    def upcoming(self, resource_id: str, now: datetime.datetime,
+                 period_after: datetime.timedelta) -> List[ReservedInterval]:
+        '''
+        Same as Reservation.upcoming_events_for_resource: reservations in progress
+        and those starting within `period_after` from now, ordered by start.
+        '''
+        horizon = now + period_after
+        return [interval for interval in self.overlapping(resource_id, now, horizon + datetime.timedelta.resolution)
+                if interval.start < now < interval.end or now <= interval.start <= horizon]
+
+
+class LiveReservationIndex(ReservationIndex):
+    '''
+    Process-wide index of active reservations which end after `since` (load time minus `lookback`),
+    loaded lazily with `loader(since)` and kept in sync with committed changes through `apply`.
+    Anything about time before `since` is not covered (see `covers`) and should be asked to the database.
+
+    API and services share one process, so all changes made through the ORM pass through `apply`.
+    Changes it can't follow (e.g. rows removed by ON DELETE CASCADE) should call `invalidate`.
+    '''
+
+    def __init__(self, loader: Callable[[datetime.datetime], Iterable[tuple]],
+                 lookback: datetime.timedelta = datetime.timedelta(days=1)) -> None:
+        super().__init__()
+        self.loader = loader
+        self.lookback = lookback
+        self.since = None  # type: Optional[datetime.datetime]
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self) -> None:
+        if self.since is not None:
+            return
+        since = datetime.datetime.utcnow() - self.lookback
+        ReservationIndex.__init__(self, self.loader(since))
+        self.since = since
+        log.debug('Reservation index loaded, {} reservations'.format(len(self)))
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.since = None
+
+    def apply(self, changes: Dict[int, Optional[ReservedInterval]]) -> None:
+        '''Applies committed changes: reservation id -> its current interval, None if deleted or cancelled'''
+        with self._lock:
+            if self.since is None:
+                return
+            for reservation_id, interval in changes.items():
+                if interval is None or interval.end <= self.since:
+                    self.remove(reservation_id)
+                else:
+                    self.add(interval)
+
+    def covers(self, start: datetime.datetime) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            return self.since is not None and start >= self.since
+
+    def overlapping(self, resource_id: str, start: datetime.datetime, end: datetime.datetime,
+                    exclude_id: Optional[int] = None) -> List[ReservedInterval]:
+        with self._lock:
+            self._ensure_loaded()
+            return super().overlapping(resource_id, start, end, exclude_id=exclude_id)
+
+    def next_after(self, resource_id: str, moment: datetime.datetime) -> Optional[ReservedInterval]:
+        with self._lock:
+            self._ensure_loaded()
+            return super().next_after(resource_id, moment)
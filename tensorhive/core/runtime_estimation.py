@@ -0,0 +1,60 @@
+from tensorhive.models.Job import Job
+from tensorhive.models.JobRun import JobRun
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from statistics import median
+import logging
+log = logging.getLogger(__name__)
+
+
+class RuntimeEstimator():
+    '''
+    Learns how long jobs run from their history (JobRun). Jobs are matched by their commands without
+    parameters and env variables (command key), so a training script re-run with different batch size counts too.
+
+    Estimate is the median of the most recent complete runs: owner's own ones if there are
+    at least `min_own_runs` of them, otherwise anyone's. Interrupted runs are ignored, they only tell a lower bound.
+    '''
+
+    def __init__(self, history: int = 20, min_own_runs: int = 3) -> None:
+        self.history = history
+        self.min_own_runs = min_own_runs
+
+    def estimate_many(self, jobs: List[Job]) -> Dict[int, Optional[timedelta]]:
+        '''Expected duration of the whole run of each job (by id), None if there is no history'''
+        keys = {job.id: JobRun.command_key_of(task.command for task in job.tasks) for job in jobs}
+        own_runs = {}  # type: Dict[Tuple[int, str], List[float]]
+        all_runs = {}  # type: Dict[str, List[float]]
+        for run in JobRun.finished_runs(set(keys.values())):
+            seconds = run.duration.total_seconds()
+            if len(all_runs.setdefault(run.command_key, [])) < self.history:
+                all_runs[run.command_key].append(seconds)
+            if len(own_runs.setdefault((run.user_id, run.command_key), [])) < self.history:
+                own_runs[(run.user_id, run.command_key)].append(seconds)
+
+        ret = {}  # type: Dict[int, Optional[timedelta]]
+        for job in jobs:
+            samples = own_runs.get((job.user_id, keys[job.id])) or []
+            if len(samples) < self.min_own_runs:
+                samples = all_runs.get(keys[job.id]) or []
+            ret[job.id] = timedelta(seconds=median(samples)) if samples else None
+        return ret
+
+    def estimate(self, job: Job) -> Optional[timedelta]:
+        return self.estimate_many([job])[job.id]
+
+    def expected_ends(self, running_jobs: List[Job], now: datetime) -> Dict[int, Optional[datetime]]:
+        '''
+        When running jobs (by id) are expected to finish: scheduled stop if there is one,
+        otherwise start of current run plus estimate. Jobs running longer than expected are assumed to end now.
+        '''
+        estimates = self.estimate_many([job for job in running_jobs if job.stop_at is None])
+        ret = {}  # type: Dict[int, Optional[datetime]]
+        for job in running_jobs:
+            if job.stop_at is not None:
+                ret[job.id] = max(job.stop_at, now)
+                continue
+            run = JobRun.open_run(job.id)
+            estimate = estimates.get(job.id)
+            ret[job.id] = max(run.started_at + estimate, now) if run is not None and estimate is not None else None
+        return ret
@@ -1,45 +1,304 @@
 from abc import ABC, abstractmethod
-from tensorhive.models.Job import Job
-from tensorhive.models.Task import Task
-from typing import List, Dict
+from tensorhive.models.GPUProcessSession import GPUProcessSession
+from tensorhive.models.Job import Job, JobPriority, JobStatus
+from tensorhive.models.Task import Task, TaskPlacement, TaskStatus
+from tensorhive.models.Reservation import Reservation
+from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
+from tensorhive.core.placement import Placement, choose_gpus
+from tensorhive.core.runtime_estimation import RuntimeEstimator
+from typing import Callable, List, Dict, NamedTuple, Optional, Set, Tuple
+from datetime import datetime, timedelta
 from tensorhive.config import JOB_SCHEDULING_SERVICE as CONFIG
 
 
 class Scheduler(ABC):
+    # Injected by JobSchedulingService, provides precomputed (hostname, index) -> GPU UUID lookup
+    infrastructure_manager = None  # type: Optional[InfrastructureManager]
+
+    def __init__(self) -> None:
+        # GPUs chosen for flexible tasks of jobs returned by the last `schedule_jobs` call, by task id
+        self.placements = {}  # type: Dict[int, Placement]
+        # Expected start of queued jobs (by id) seen by the last `schedule_jobs` call, None if unknown
+        self.predicted_starts = {}  # type: Dict[int, Optional[datetime]]
+        self.predicted_at = None  # type: Optional[datetime]
+
     @abstractmethod
     def schedule_jobs(self, jobs_to_eligible_resources, hardware_to_slots) -> List[Job]:
         ''' Assign given jobs to be executed on specific hardware
         Given jobs to eligible resource UIDs and resource UIDs to free time slots,
         return a list of Jobs that should be executed.
+        Flexible tasks of returned jobs must have their GPUs chosen in `placements`.
         '''
         pass
 
-    @staticmethod
     # TODO: remove this dirty function when gpu_uid becomes stored in Task
-    def get_assigned_gpu_uid(task: Task, hardware_map: Dict[str, Dict]) -> str:
-        gpu_ids = list(hardware_map[task.hostname].keys())
+    def get_assigned_gpu_uid(self, task: Task, hardware_map: Dict[str, Dict]) -> Optional[str]:
+        if task.gpu_id is None or task.hostname not in hardware_map:
+            return None
+
+        if self.infrastructure_manager is not None:
+            gpu_uid = self.infrastructure_manager.get_gpu_uid(task.hostname, task.gpu_id)
+            # Index might be already out of sync with given map, e.g. node went down in the meantime
+            return gpu_uid if gpu_uid in hardware_map[task.hostname] else None
 
-        if task.gpu_id is None or task.gpu_id >= len(gpu_ids):
+        gpu_ids = list(hardware_map[task.hostname].keys())
+        if task.gpu_id >= len(gpu_ids):
             return None
         return gpu_ids[task.gpu_id]
 
+    def get_assigned_gpu_uids(self, task: Task, hardware_map: Dict[str, Dict]) -> List[str]:
+        '''
+        GPUs used by the task: pinned one, or those chosen on launch of a running flexible task.
+        Flexible task which is not running has no GPUs yet.
+        '''
+        if task.is_flexible:
+            if task.status is not TaskStatus.running:
+                return []
+            return [gpu_uid for gpu_uid in task.gpu_uuids if gpu_uid in hardware_map.get(task.hostname, {})]
+        gpu_uid = self.get_assigned_gpu_uid(task, hardware_map)
+        return [gpu_uid] if gpu_uid else []
+
+    def index_getter(self, hardware_map: Dict[str, Dict]) -> Callable[[str, str], int]:
+        '''Returns function giving nvidia-smi index of GPU, used to keep flexible tasks on neighbouring GPUs'''
+        def index_of(hostname: str, gpu_uid: str) -> int:
+            index = None
+            if self.infrastructure_manager is not None:
+                index = self.infrastructure_manager.get_gpu_index(gpu_uid)
+            return index if index is not None else list(hardware_map[hostname]).index(gpu_uid)
+        return index_of
+
+    @staticmethod
+    def candidate_gpus(task: Task, eligible_hardware: Dict[str, List[str]], hardware_map: Dict[str, Dict],
+                       is_usable: Callable[[str, str], bool]) -> Dict[str, List[str]]:
+        '''{hostname: [GPU UUID, ...]} which flexible task may use'''
+        hostnames = [task.hostname] if task.placement is TaskPlacement.host else list(eligible_hardware)
+        return {hostname: [gpu_uid for gpu_uid in eligible_hardware.get(hostname, [])
+                           if gpu_uid in hardware_map.get(hostname, {}) and is_usable(hostname, gpu_uid)]
+                for hostname in hostnames}
+
 
 class GreedyScheduler(Scheduler):
     def schedule_jobs(self, jobs_to_hardware, hardware_to_slots) -> List[Job]:
+        self.placements = {}
+        self.predicted_at = datetime.utcnow()
+        self.predicted_starts = dict.fromkeys([job.id for job in jobs_to_hardware])
+        index_of = self.index_getter(hardware_to_slots)
+        taken = set()  # type: Set[str]
+
+        def is_free(hostname: str, gpu_uid: str) -> bool:
+            slot = hardware_to_slots[hostname][gpu_uid]
+            return gpu_uid not in taken and (slot is None or slot >= CONFIG.SCHEDULE_QUEUED_JOBS_WHEN_FREE_MINS)
+
         scheduled_jobs = []
         for job in jobs_to_hardware:
-            scheduled_tasks = 0
+            job_gpus = set()  # type: Set[str]
+            job_placements = {}  # type: Dict[int, Placement]
 
             for task in job.tasks:
+                if task.is_flexible:
+                    candidates = self.candidate_gpus(
+                        task, jobs_to_hardware[job], hardware_to_slots,
+                        is_usable=lambda hostname, gpu_uid: is_free(hostname, gpu_uid) and gpu_uid not in job_gpus)
+                    placement = choose_gpus(task.gpu_count, candidates, index_of)
+                    if placement is None:
+                        break
+                    job_placements[task.id] = placement
+                    job_gpus.update(placement.gpu_uuids)
+                    continue
+
                 # TODO: use stored gpu_uid when it becomes stored in Task
-                gpu_uid = Scheduler.get_assigned_gpu_uid(task, hardware_to_slots)
-                if not gpu_uid:
+                gpu_uid = self.get_assigned_gpu_uid(task, hardware_to_slots)
+                if not gpu_uid or not is_free(task.hostname, gpu_uid):
                     break
-                slot = hardware_to_slots[task.hostname][gpu_uid]
-                if slot is None or slot >= CONFIG.SCHEDULE_QUEUED_JOBS_WHEN_FREE_MINS:
-                    scheduled_tasks += 1
-
-            if scheduled_tasks == len(job.tasks):
+                job_gpus.add(gpu_uid)
+            else:
                 scheduled_jobs.append(job)
+                taken.update(job_gpus)
+                self.placements.update(job_placements)
+                self.predicted_starts[job.id] = self.predicted_at
+
+        return scheduled_jobs
+
+
+class Hold(NamedTuple):
+    '''GPUs kept for a job which could not start, it won't start before `start` (nor end before `end`, if known)'''
+    priority: int
+    gpus: Set[str]
+    start: datetime
+    is_head: bool
+    end: Optional[datetime] = None
+
+
+class BackfillingScheduler(Scheduler):
+    '''
+    Orders queued jobs by priority class, then by fair share (GPU-hours used recently by the owner,
+    divided by owner's weight), then by submission.
+
+    EASY-style backfilling: when a job can't start, the GPUs it needs are held for it. Jobs further in the queue
+    may take held GPUs only if they are known to finish before the held job could start. The first job which
+    can't start holds its GPUs against everyone, others only against jobs of lower priority classes.
+    Jobs with known duration (see `estimate_duration`) also fill gaps before upcoming reservations.
+
+    Moments at which held jobs could start are recorded as their predicted start (see `predicted_starts`).
+    '''
+
+    def __init__(self, fair_share_weights: Optional[Dict[str, float]] = None,
+                 fair_share_window: timedelta = timedelta(days=7),
+                 runtime_estimator: Optional[RuntimeEstimator] = None) -> None:
+        super().__init__()
+        self.fair_share_weights = fair_share_weights or {}
+        self.fair_share_window = fair_share_window
+        self.runtime_estimator = runtime_estimator
+        # Learned durations of jobs being scheduled, by id
+        self._estimates = {}  # type: Dict[int, Optional[timedelta]]
+
+    def estimate_duration(self, job: Job, now: datetime) -> Optional[timedelta]:
+        '''Time the job needs to finish, None if unknown: until its scheduled stop, otherwise learned from history'''
+        if job.stop_at is not None and job.stop_at > now:
+            return job.stop_at - now
+        return self._estimates.get(job.id)
+
+    def usage_by_user(self, now: datetime) -> Dict[str, float]:
+        return GPUProcessSession.gpu_hours_by_owner(now - self.fair_share_window, now)
+
+    def order(self, jobs: List[Job], now: datetime) -> List[Job]:
+        usage = self.usage_by_user(now)
+
+        def key(job: Job):
+            username = job.user.username if job.user is not None else None
+            share = usage.get(username, 0.0) / self.fair_share_weights.get(username, 1.0)
+            priority = job.priority if job.priority is not None else JobPriority.normal
+            return -priority, share, job.id
+
+        return sorted(jobs, key=key)
+
+    def release_times(self, hardware_to_slots, now: datetime) -> Dict[str, datetime]:
+        '''When GPUs used by running jobs with known (or estimated) end will be free'''
+        if self.runtime_estimator is None:
+            jobs = Job.query.filter(Job._status == JobStatus.running, Job._stop_at.isnot(None)).all()
+            ends = {job.id: job.stop_at for job in jobs}  # type: Dict[int, Optional[datetime]]
+        else:
+            jobs = Job.query.filter(Job._status == JobStatus.running).all()
+            ends = self.runtime_estimator.expected_ends(jobs, now)
+
+        ret = {}  # type: Dict[str, datetime]
+        for job in jobs:
+            end = ends.get(job.id)
+            if end is None:
+                continue
+            for task in job.tasks:
+                for gpu_uid in self.get_assigned_gpu_uids(task, hardware_to_slots):
+                    ret[gpu_uid] = max(ret.get(gpu_uid, end), end)
+        return ret
+
+    @staticmethod
+    def reserved_until(gpu_uid: str, moment: datetime) -> datetime:
+        '''End of reservations of GPU following one another from `moment` on, `moment` itself if not reserved'''
+        while True:
+            current = Reservation.index.overlapping(gpu_uid, moment, moment + timedelta.resolution)
+            if not current:
+                return moment
+            moment = current[-1].end
+
+    @staticmethod
+    def earliest_gpus(count: int, candidates: Dict[str, List[str]],
+                      free_from: Callable[[str], datetime]) -> Optional[Tuple[str, List[str], datetime]]:
+        '''Host and GPUs which will be free first, with moment when all of them are expected to be free'''
+        best = None  # type: Optional[Tuple[str, List[str], datetime]]
+        for hostname, gpu_uids in candidates.items():
+            if len(gpu_uids) < count:
+                continue
+            earliest = sorted(gpu_uids, key=free_from)[:count]
+            start = max(free_from(gpu_uid) for gpu_uid in earliest)
+            if best is None or start < best[2]:
+                best = hostname, earliest, start
+        return best
+
+    def schedule_jobs(self, jobs_to_hardware, hardware_to_slots) -> List[Job]:
+        self.placements = {}
+        now = self.predicted_at = datetime.utcnow()
+        jobs = self.order(list(jobs_to_hardware), now)
+        self._estimates = self.runtime_estimator.estimate_many(jobs) if self.runtime_estimator is not None else {}
+        self.predicted_starts = dict.fromkeys([job.id for job in jobs])
+        index_of = self.index_getter(hardware_to_slots)
+        release_times = None  # type: Optional[Dict[str, datetime]]
+        # GPUs taken in this pass, with expected end of the job (None if unknown)
+        taken = {}  # type: Dict[str, Optional[datetime]]
+        holds = []  # type: List[Hold]
+        scheduled_jobs = []
+
+        for job in jobs:
+            priority = job.priority if job.priority is not None else JobPriority.normal
+            duration = self.estimate_duration(job, now)
+            needed_mins = max(CONFIG.SCHEDULE_QUEUED_JOBS_WHEN_FREE_MINS,
+                              duration.total_seconds() / 60 if duration is not None else 0)
+
+            def free_from(hostname: str, gpu_uid: str) -> Tuple[bool, datetime]:
+                '''Whether GPU can be used by this job right now, and the earliest moment it may be otherwise'''
+                nonlocal release_times
+                slot = hardware_to_slots[hostname][gpu_uid]
+                if gpu_uid in taken:
+                    return False, taken[gpu_uid] or now
+                if slot == 0:
+                    if release_times is None:
+                        release_times = self.release_times(hardware_to_slots, now)
+                    return False, self.reserved_until(gpu_uid, release_times.get(gpu_uid, now))
+                if slot is not None and slot < needed_mins:
+                    # Too close to a reservation, won't be free before it ends
+                    return False, self.reserved_until(gpu_uid, now + timedelta(minutes=slot))
+                for hold in holds:
+                    if (hold.is_head or hold.priority > priority) and gpu_uid in hold.gpus:
+                        if duration is None or now + duration > hold.start:
+                            return False, hold.end or hold.start
+                return True, now
+
+            eligible = jobs_to_hardware[job]
+            ready = True
+            job_gpus = {}  # type: Dict[str, datetime]
+            job_placements = {}  # type: Dict[int, Placement]
+            for task in job.tasks:
+                if task.is_flexible:
+                    count = task.gpu_count
+                    candidates = self.candidate_gpus(task, eligible, hardware_to_slots,
+                                                     is_usable=lambda hostname, gpu_uid: gpu_uid not in job_gpus)
+                else:
+                    count = 1
+                    gpu_uid = self.get_assigned_gpu_uid(task, hardware_to_slots)
+                    if not gpu_uid or gpu_uid not in eligible.get(task.hostname, []) or gpu_uid in job_gpus:
+                        break
+                    candidates = {task.hostname: [gpu_uid]}
+                availability = {gpu_uid: free_from(hostname, gpu_uid)
+                                for hostname, gpu_uids in candidates.items() for gpu_uid in gpu_uids}
+
+                usable = {hostname: [gpu_uid for gpu_uid in gpu_uids if availability[gpu_uid][0]]
+                          for hostname, gpu_uids in candidates.items()}
+                placement = choose_gpus(count, usable, index_of)
+                if placement is not None:
+                    job_gpus.update(dict.fromkeys(placement.gpu_uuids, now))
+                    if task.is_flexible:
+                        job_placements[task.id] = placement
+                    continue
+
+                # Not enough GPUs now, GPUs which free up first are held
+                ready = False
+                earliest = self.earliest_gpus(count, candidates, lambda gpu_uid: availability[gpu_uid][1])
+                if earliest is None:
+                    break
+                _, gpu_uids, start = earliest
+                job_gpus.update(dict.fromkeys(gpu_uids, start))
+            else:
+                if ready:
+                    scheduled_jobs.append(job)
+                    self.placements.update(job_placements)
+                    self.predicted_starts[job.id] = now
+                    for gpu_uid in job_gpus:
+                        taken[gpu_uid] = now + duration if duration is not None else None
+                else:
+                    start = max(job_gpus.values())
+                    self.predicted_starts[job.id] = start
+                    end = job.stop_at
+                    if end is None and duration is not None:
+                        end = start + duration
+                    holds.append(Hold(priority=priority, gpus=set(job_gpus), start=start, is_head=not holds, end=end))
 
         return scheduled_jobs
@@ -1,25 +1,35 @@
 from tensorhive.core.services.Service import Service
 from tensorhive.core.utils.decorators import override
-from tensorhive.models.Job import Job
+from tensorhive.models.Job import Job, JobStatus
+from tensorhive.models.JobRun import JobRun
 from tensorhive.models.Task import TaskStatus
 from tensorhive.models.User import User
-from tensorhive.models.Reservation import Reservation
 from sqlalchemy import or_, and_
+from sqlalchemy.orm.exc import NoResultFound
 from tensorhive.controllers.job import business_execute, business_stop, JobId
 from tensorhive.config import JOB_SCHEDULING_SERVICE as CONFIG
 from tensorhive.core.scheduling import Scheduler
+from tensorhive.core.reservation_index import ReservationIndex
 from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
 from tensorhive.core.managers.SSHConnectionManager import SSHConnectionManager
 from tensorhive.core import task_nursery
-from typing import List, Dict, Set
+from typing import List, Dict, NamedTuple, Optional, Set
 from datetime import datetime, timedelta
 from http import HTTPStatus
 from tensorhive.database import db_session  # pylint: disable=unused-import
-import gevent
 import logging
 log = logging.getLogger(__name__)
 
 
+class Preemption(NamedTuple):
+    '''Queued job which has to give its GPUs back by `deadline`'''
+    started_at: datetime
+    # None when it's no longer needed, job got the signal already though, so it's re-queued once it's gone
+    deadline: Optional[datetime]
+    # Grace period is over and SIGINT has been sent, SIGKILL follows
+    interrupted: bool = False
+
+
 class JobSchedulingService(Service):
     """Responsible for automatic spawn and termination of processes on remote hosts via ssh.
 
@@ -29,21 +39,35 @@ class JobSchedulingService(Service):
     _connection_manager = None  # type: SSHConnectionManager
     _scheduler = None  # type: Scheduler
 
-    def __init__(self, interval: float, stop_attempts_after: float):
-        super().__init__()
+    def __init__(self, interval: float, stop_attempts_after: float, trigger_on_update: bool = False,
+                 debounce: float = 0.0, preemption_signal: Optional[str] = None,
+                 preemption_grace_period: float = 5.0):
+        # Released reservations free GPUs for queued jobs, so they are always worth an immediate run
+        trigger_topics = [InfrastructureManager.RESERVATIONS_TOPIC]
+        if trigger_on_update:
+            trigger_topics.append(InfrastructureManager.SNAPSHOT_TOPIC)
+        super().__init__(trigger_topics=trigger_topics, debounce=debounce)
         self.interval = interval
         self.stop_attempts_after = timedelta(minutes=stop_attempts_after)
         self.stubborn_job_ids = set()  # type: Set[int]
+        # Signal asking job to save a checkpoint before it is preempted, e.g. USR1 (None: stopped right away)
+        self.preemption_signal = preemption_signal
+        self.preemption_grace_period = timedelta(minutes=preemption_grace_period)
+        self.preemptions = {}  # type: Dict[int, Preemption]
         self.considered_future_period = timedelta(minutes=CONFIG.SCHEDULE_QUEUED_JOBS_WHEN_FREE_MINS)
+        self._reservations = None  # type: Optional[ReservationIndex]
 
     @override
     def inject(self, injected_object):
         if isinstance(injected_object, InfrastructureManager):
             self._infrastructure_manager = injected_object
+            if self._scheduler is not None:
+                self._scheduler.infrastructure_manager = injected_object
         if isinstance(injected_object, SSHConnectionManager):
             self._connection_manager = injected_object
         if isinstance(injected_object, Scheduler):
             self._scheduler = injected_object
+            self._scheduler.infrastructure_manager = self._infrastructure_manager
 
     def _log_msg(self, now: datetime, action: str, id: JobId, scheduled: datetime = None) -> str:
         scheduled_msg = 'scheduled for ' + scheduled.strftime("%H:%M:%S") if scheduled else 'not scheduled'
@@ -60,11 +84,30 @@ class JobSchedulingService(Service):
         # All requirements must be satisfied (AND operator)
         return Job.query.filter(is_scheduled, before_terminate, can_execute_now).all()
 
-    def try_execute(self, job):
+    def load_reservations(self) -> ReservationIndex:
+        '''
+        Loads all reservations relevant for this run with a single query,
+        all decisions made until the next run are answered from that index.
+        '''
+        now = datetime.utcnow()
+        horizon = self.considered_future_period + timedelta(seconds=self.interval)
+        self._reservations = ReservationIndex.load(now, now + horizon)
+        return self._reservations
+
+    @property
+    def reservations(self) -> ReservationIndex:
+        return self._reservations if self._reservations is not None else self.load_reservations()
+
+    @property
+    def scheduler(self) -> Scheduler:
+        return self._scheduler
+
+    def try_execute(self, job, from_queue: bool = False):
         """
         return value: True if succeeded
         """
-        content, status = business_execute(job.id)
+        # Flexible tasks of queued jobs go to GPUs chosen by scheduler
+        content, status = business_execute(job.id, placements=self._scheduler.placements if from_queue else None)
 
         if status == 200:
             log.debug(content['job']['status'])
@@ -89,12 +132,12 @@ class JobSchedulingService(Service):
                 if hosts_with_gpu_occupation[host][gpu_id]:
                     ret[host][gpu_id] = 0
                 else:
-                    near_reservations = Reservation.upcoming_events_for_resource(gpu_id, self.considered_future_period)
+                    now = datetime.utcnow()
+                    near_reservations = self.reservations.upcoming(gpu_id, now, self.considered_future_period)
                     if len(near_reservations):
                         nearest_reservation = near_reservations[0]
-                        if nearest_reservation.start > datetime.utcnow():  # type: ignore
-                            ret[host][gpu_id] = \
-                                (nearest_reservation.start - datetime.utcnow()).total_seconds() / 60  # type: ignore
+                        if nearest_reservation.start > now:
+                            ret[host][gpu_id] = (nearest_reservation.start - now).total_seconds() / 60
                         else:
                             ret[host][gpu_id] = 0
                     else:
@@ -104,6 +147,9 @@ class JobSchedulingService(Service):
     @staticmethod
     def check_if_resources_available_for_job(job: Job, current_device_occupation: Dict[str, Dict[str, bool]]) -> bool:
         for task in job.tasks:
+            if task.is_flexible:
+                # GPUs are chosen on launch
+                continue
             if not task.hostname:
                 return False
             if not task.gpu_id:
@@ -112,20 +158,30 @@ class JobSchedulingService(Service):
                 return False
         return True
 
-    @staticmethod
-    def interferes_with_reservations(job: Job, available_hosts_with_gpu_occupation: Dict[str, Dict],
+    def earliest_reservation_start(self, job: Job, available_hosts_with_gpu_occupation: Dict[str, Dict],
+                                   considered_future_period: timedelta) -> Optional[datetime]:
+        '''Start of the first reservation (of anyone) of job's GPUs in progress or starting within the period'''
+        now = datetime.utcnow()
+        starts = [reservation.start
+                  for task in job.tasks
+                  for gpu_id in self._scheduler.get_assigned_gpu_uids(task, available_hosts_with_gpu_occupation)
+                  for reservation in self.reservations.upcoming(gpu_id, now, considered_future_period)]
+        return min(starts, default=None)
+
+    def interferes_with_reservations(self, job: Job, available_hosts_with_gpu_occupation: Dict[str, Dict],
                                      considered_future_period: timedelta = timedelta(0),
                                      allow_own: bool = True) -> bool:
         for task in job.tasks:
-            gpu_id = Scheduler.get_assigned_gpu_uid(task, available_hosts_with_gpu_occupation)
-            upcoming_reservations = Reservation.upcoming_events_for_resource(gpu_id, considered_future_period)
+            for gpu_id in self._scheduler.get_assigned_gpu_uids(task, available_hosts_with_gpu_occupation):
+                upcoming_reservations = self.reservations.upcoming(gpu_id, datetime.utcnow(),
+                                                                   considered_future_period)
 
-            if allow_own:
-                for reservation in upcoming_reservations:
-                    if reservation.user is not job.user:
-                        return True
-            elif len(upcoming_reservations):
-                return True
+                if allow_own:
+                    for reservation in upcoming_reservations:
+                        if reservation.user_id != job.user_id:
+                            return True
+                elif len(upcoming_reservations):
+                    return True
 
         return False
 
@@ -154,32 +210,39 @@ class JobSchedulingService(Service):
 
         return successfully_executed
 
-    # TODO: cache for user?
     def get_hosts_with_gpus_eligible_for_jobs(self, jobs: List[Job]) -> Dict[Job, Dict]:
         '''
+        Restrictions are resolved once per owner, jobs of the same owner share the result.
         :param jobs: list of jobs
         :return: {job: {hostname: {GPU_id: ...}}}
         '''
         ret = {}
+        eligible_by_owner = {}  # type: Dict[int, Dict[str, List[str]]]
 
         current_infrastructure = self._infrastructure_manager.infrastructure
 
         for job in jobs:
-            owner = job.user  # type: User
-            user_filtered_infrastructure = owner.filter_infrastructure_by_user_restrictions(current_infrastructure)
-            user_filtered_hostname_gpus = {}
-            for hostname in user_filtered_infrastructure:
-                eligible_gpus_for_host = []
-                if 'GPU' in user_filtered_infrastructure[hostname]:
-                    for gpu in user_filtered_infrastructure[hostname]['GPU']:
-                        eligible_gpus_for_host.append(gpu)
-                user_filtered_hostname_gpus[hostname] = eligible_gpus_for_host
-            ret[job] = user_filtered_hostname_gpus
+            if job.user_id not in eligible_by_owner:
+                # Jobs may be detached snapshots (Job.queue), restrictions are loaded through db_session
+                owner = User.get(job.user_id)  # type: User
+                # Filtering removes keys, published snapshot must stay intact
+                user_filtered_infrastructure = owner.filter_infrastructure_by_user_restrictions(
+                    InfrastructureManager.copy_structure(current_infrastructure))
+                user_filtered_hostname_gpus = {}
+                for hostname in user_filtered_infrastructure:
+                    eligible_gpus_for_host = []
+                    if 'GPU' in user_filtered_infrastructure[hostname]:
+                        for gpu in user_filtered_infrastructure[hostname]['GPU']:
+                            eligible_gpus_for_host.append(gpu)
+                    user_filtered_hostname_gpus[hostname] = eligible_gpus_for_host
+                eligible_by_owner[job.user_id] = user_filtered_hostname_gpus
+            ret[job] = eligible_by_owner[job.user_id]
 
         return ret
 
     def execute_queued(self, available_hosts_with_gpu_occupation: Dict[str, Dict[str, bool]]):
-        queued_jobs = Job.get_job_queue()
+        # Only jobs changed since the last run are fetched from the database
+        queued_jobs = Job.queue.jobs()
 
         queued_jobs_to_eligible_gpus = self.get_hosts_with_gpus_eligible_for_jobs(queued_jobs)
 
@@ -189,7 +252,7 @@ class JobSchedulingService(Service):
 
         for scheduled_job in scheduled_jobs:
             log.info(self._log_msg(now=datetime.utcnow(), action='Executing queued', id=scheduled_job.id))
-            self.try_execute(scheduled_job)
+            self.try_execute(scheduled_job, from_queue=True)
 
     def stop_with_grace(self, job_id: int):
         if job_id in self.stubborn_job_ids:
@@ -198,9 +261,73 @@ class JobSchedulingService(Service):
             return business_stop(job_id, gracefully=False)
         else:
             log.info(self._log_msg(now=datetime.utcnow(), action='Stopping gracefully', id=job_id))
-            _, status = business_stop(job_id, gracefully=True)
+            content, status = business_stop(job_id, gracefully=True)
             if status != HTTPStatus.OK.value:
                 self.stubborn_job_ids.add(job_id)
+            return content, status
+
+    def send_checkpoint_signal(self, job: Job):
+        for task in job.tasks:
+            if task.status is not TaskStatus.running:
+                continue
+            try:
+                exit_code = task_nursery.signal(task.pid, task.hostname, job.user.username, self.preemption_signal)
+                if exit_code != 0:
+                    log.warning('Checkpoint signal to task {} failed, exit code: {}'.format(task.id, exit_code))
+            except Exception as e:
+                log.warning('Unable to send checkpoint signal to task {}, reason: {}'.format(task.id, e))
+
+    def preempt(self, job: Job, deadline: datetime):
+        """Makes job started from queue give its GPUs back by `deadline`, called on every run until it is gone.
+
+        Job gets `preemption_signal` first, so it can save a checkpoint and exit by itself within the grace period
+        (cut short by the deadline). If it is still running after that, it gets SIGINT and then, on the next run,
+        SIGKILL. Preempted jobs go back to the queue (see `requeue_preempted`).
+        """
+        now = datetime.utcnow()
+        preemption = self.preemptions.get(job.id)
+        if preemption is None:
+            # Run is cut short, its duration is not a complete sample for runtime estimates
+            JobRun.mark_interrupted(job.id)
+            deadline = min(deadline, now + self.preemption_grace_period)
+            if self.preemption_signal and deadline > now:
+                log.info(self._log_msg(now=now, action='Sending checkpoint signal to', id=job.id, scheduled=deadline))
+                self.send_checkpoint_signal(job)
+            else:
+                deadline = now
+            preemption = Preemption(started_at=now, deadline=deadline)
+        elif preemption.deadline is None:
+            # Needed again, checkpoint signal has been sent already, so there's only a new grace period
+            preemption = preemption._replace(deadline=min(deadline, now + self.preemption_grace_period))
+        preemption = self.preemptions[job.id] = preemption._replace(deadline=min(preemption.deadline, deadline))
+
+        if now < preemption.deadline:
+            return
+        if not preemption.interrupted:
+            log.info(self._log_msg(now=now, action='Preempting (interrupt)', id=job.id))
+            business_stop(job.id, gracefully=True)
+            self.preemptions[job.id] = preemption._replace(interrupted=True)
+        else:
+            log.info(self._log_msg(now=now, action='Preempting (kill)', id=job.id))
+            business_stop(job.id, gracefully=False)
+
+    def requeue_preempted(self):
+        """Puts preempted jobs which are no longer running back into the queue.
+
+        Queue is ordered by job id (within priority class and fair share), so they keep their place.
+        """
+        for job_id in list(self.preemptions):
+            try:
+                job = Job.get(job_id)
+            except NoResultFound:
+                del self.preemptions[job_id]
+                continue
+            if job.status in [JobStatus.running, JobStatus.unsynchronized]:
+                continue
+            del self.preemptions[job_id]
+            if job.status is not JobStatus.pending:
+                log.info(self._log_msg(now=datetime.utcnow(), action='Re-queueing preempted', id=job_id))
+                job.enqueue()
 
     def stop_scheduled(self):
         """Triggers `stop` on database records that should not be running.
@@ -235,47 +362,70 @@ class JobSchedulingService(Service):
                 log.warning(content['msg'])
 
     def sync_running_from_queue(self, available_hosts_with_gpu_occupation: Dict[str, Dict[str, List]]):
+        """Preempts jobs started from queue which should give their GPUs back (see `preempt`).
+
+        Processes of job's owner are treated as job's own: pids seen by nvidia-smi are pids of the actual
+        programs (not screen sessions) and tasks of one distributed job often touch each other's GPUs.
+        Job whose tasks are started as a gang is stopped as a whole when some of its tasks are gone,
+        remaining ones usually can't make any progress without them.
+        """
         jobs_running_from_queue = Job.get_jobs_running_from_queue()
 
         for job in jobs_running_from_queue:
-            job_should_be_stopped = False
+            # Moment by which job should give its GPUs back
+            deadline = None  # type: Optional[datetime]
+            tasks_gone = 0
             for task in job.tasks:
-                gpu_uid = Scheduler.get_assigned_gpu_uid(task, available_hosts_with_gpu_occupation)
+                gpu_uids = self._scheduler.get_assigned_gpu_uids(task, available_hosts_with_gpu_occupation)
 
-                if not gpu_uid or task.pid not in task_nursery.running(task.hostname, job.user.username):
+                if not gpu_uids or task.pid not in task_nursery.running(task.hostname, job.user.username):
                     task.status = TaskStatus.not_running
+                    tasks_gone += 1
                     continue
 
-                current_processes_on_gpu = available_hosts_with_gpu_occupation[task.hostname][gpu_uid]
-                if current_processes_on_gpu is None:
-                    other_process_pids = []
-                else:
-                    other_process_pids = [process['pid'] for process in current_processes_on_gpu
-                                          if process['pid'] is not task.pid]
-
-                considered_future_period = timedelta(minutes=CONFIG.SCHEDULE_QUEUED_JOBS_WHEN_FREE_MINS)
-                interferes = self.interferes_with_reservations(job, available_hosts_with_gpu_occupation,
-                                                               considered_future_period=considered_future_period,
-                                                               # Queued jobs should run only between reservations
-                                                               allow_own=False)
-
-                if len(other_process_pids) or interferes:
-                    job_should_be_stopped = True
-
-            if job_should_be_stopped:
-                log.info(self._log_msg(now=datetime.utcnow(), action='Stopping queued job', id=job.id))
+                other_process_pids = []
+                for gpu_uid in gpu_uids:
+                    current_processes_on_gpu = available_hosts_with_gpu_occupation[task.hostname][gpu_uid]
+                    if current_processes_on_gpu is not None:
+                        foreign_processes = [process for process in current_processes_on_gpu
+                                             if process.get('owner') != job.user.username]
+                        other_process_pids += [process['pid'] for process in foreign_processes
+                                               if process['pid'] != task.pid]
+
+                if len(other_process_pids):
+                    deadline = datetime.utcnow() + self.preemption_grace_period
+
+            # Queued jobs should run only between reservations
+            reservation_start = self.earliest_reservation_start(job, available_hosts_with_gpu_occupation,
+                                                                self.considered_future_period)
+            if reservation_start is not None:
+                deadline = min(deadline, reservation_start) if deadline is not None else reservation_start
+
+            if tasks_gone == len(job.tasks):
+                continue
+            if 0 < tasks_gone:
+                log.info(self._log_msg(now=datetime.utcnow(), action='Stopping incomplete gang of', id=job.id))
                 self.stop_with_grace(job.id)
+            elif deadline is not None:
+                self.preempt(job, deadline)
+            elif job.id in self.preemptions and self.preemptions[job.id].deadline is not None:
+                # Job may be exiting after the signal already, so it stays tracked until it's gone
+                log.info(self._log_msg(now=datetime.utcnow(), action='Preemption no longer needed for', id=job.id))
+                self.preemptions[job.id] = self.preemptions[job.id]._replace(deadline=None)
+
+        self.requeue_preempted()
 
     @override
     def do_run(self):
-        gevent.sleep(self.interval / 2)
+        # Fresh snapshot (e.g. GPU has just been freed) or released reservation wakes the service up earlier
+        self.wait_for_trigger(self.interval)
         available_hosts_with_gpu_occupation = self._infrastructure_manager.all_nodes_with_gpu_processes()
+        self.load_reservations()
 
         # If some jobs scheduled by the user were executed in this run, wait with executing
         # queued jobs until the next round to make sure which devices will be free
         if not self.execute_scheduled(available_hosts_with_gpu_occupation):
             self.execute_queued(available_hosts_with_gpu_occupation)
 
-        gevent.sleep(self.interval / 2)
         self.stop_scheduled()
         self.sync_running_from_queue(available_hosts_with_gpu_occupation)
@@ -38,11 +38,13 @@ class MonitoringService(Service):
         time_func = time.perf_counter
         start_time = time_func()
 
-        for monitor in self.monitors:
-            try:
-                monitor.update(self.connection_manager.connections, self.infrastructure_manager)
-            except Exception as e:
-                log.warning('Exception in monitor {}: {}'.format(monitor, e))
+        # All monitors' results are published together as a single snapshot
+        with self.infrastructure_manager.updating():
+            for monitor in self.monitors:
+                try:
+                    monitor.update(self.connection_manager.connections, self.infrastructure_manager)
+                except Exception as e:
+                    log.warning('Exception in monitor {}: {}'.format(monitor, e))
 
         end_time = time_func()
         execution_time = end_time - start_time
@@ -8,7 +8,6 @@ from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
 from tensorhive.core.managers.SSHConnectionManager import SSHConnectionManager
 from typing import Set, List, Optional, Dict
 import time
-import gevent
 import json
 import logging
 log = logging.getLogger(__name__)
@@ -23,8 +22,9 @@ class ProtectionService(Service):
     connection_manager = None
     violation_handlers = None
 
-    def __init__(self, handlers, interval=0.0, strict_reservations=False):
-        super().__init__()
+    def __init__(self, handlers, interval=0.0, strict_reservations=False, trigger_on_update=False, debounce=0.0):
+        super().__init__(trigger_topics=[InfrastructureManager.SNAPSHOT_TOPIC] if trigger_on_update else None,
+                         debounce=debounce)
         self.interval = interval
         self.violation_handlers = handlers
         self.strict_reservations = strict_reservations
@@ -38,12 +38,10 @@ class ProtectionService(Service):
 
     def find_hostname(self, uuid: str) -> Optional[str]:
         '''Seeks the hostname of node which has GPU with given UUID'''
-        infrastructure = self.infrastructure_manager.infrastructure
-        for hostname, node_data in infrastructure.items():
-            if node_data.get('GPU', {}).get(uuid):
-                return hostname
-        log.warning('GPU with UUID="{}" was not found'.format(uuid))
-        return None
+        hostname = self.infrastructure_manager.find_hostname(uuid)
+        if hostname is None:
+            log.warning('GPU with UUID="{}" was not found'.format(uuid))
+        return hostname
 
     def gpu_attr(self, hostname: str, uuid: str, attribute='name') -> str:
         '''Fetches the value of 'name' or 'index' attributes for GPU with specific UUID'''
@@ -122,9 +120,8 @@ class ProtectionService(Service):
         end_time = time_func()
         execution_time = end_time - start_time
 
-        # Hold on until next interval
-        if execution_time < self.interval:
-            gevent.sleep(self.interval - execution_time)
+        # Hold on until next interval or fresh data
+        self.wait_for_trigger(self.interval - execution_time)
         waiting_time = time_func() - end_time
         total_time = execution_time + waiting_time
         log.debug('ProtectionService loop took: {:.2f}s (waiting {:.2f}) = {:.2f}'.format(
@@ -1,15 +1,54 @@
 from tensorhive.core.utils.StoppableThread import StoppableThread
+from tensorhive.core.utils.decorators import override
 from abc import abstractmethod
+from typing import List, Optional
+import threading
+import time
 
 
 class Service(StoppableThread):
     '''
     Base class for all services
+
+    Service can be woken up before its interval passes by events published on
+    InfrastructureManager's bus, for topics listed in trigger_topics (e.g. 'snapshot').
+    Then interval becomes only a fallback, when nothing is published.
     '''
 
-    def __init__(self):
+    def __init__(self, trigger_topics: Optional[List[str]] = None, debounce: float = 0.0):
         super().__init__()
+        self.trigger_topics = trigger_topics or []  # type: List[str]
+        # Minimal time (in seconds) between consecutive triggered runs,
+        # events arriving in the meantime are coalesced into a single run
+        self.debounce = debounce
+        self._wakeup = threading.Event()
+        self._last_wakeup = 0.0
 
     @abstractmethod
     def inject(self, injected_object):
         pass
+
+    def subscribe_triggers(self, infrastructure_manager) -> None:
+        for topic in self.trigger_topics:
+            infrastructure_manager.subscribe(self.trigger, topic=topic)
+
+    def trigger(self, payload=None) -> None:
+        '''Wakes the service up, it's cheap and safe to call from any thread'''
+        self._wakeup.set()
+
+    def wait_for_trigger(self, timeout: float) -> bool:
+        '''Sleeps until triggered or timeout passes, returns True if it has been triggered'''
+        triggered = self._wakeup.wait(timeout=max(timeout, 0.0))
+        if triggered and not self.stop:
+            remaining = self._last_wakeup + self.debounce - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+        self._wakeup.clear()
+        self._last_wakeup = time.monotonic()
+        return triggered
+
+    @override
+    def shutdown(self):
+        super().shutdown()
+        # Don't make thread sleep until the end of its interval
+        self._wakeup.set()
@@ -1,15 +1,22 @@
 from sqlalchemy.orm.exc import NoResultFound
-from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
+from tensorhive.core.managers.InfrastructureManager import InfrastructureManager, Snapshot
 from tensorhive.core.utils.decorators import override
 from tensorhive.core.services.Service import Service
+from tensorhive.database import db_session
 from tensorhive.models.Reservation import Reservation
-from typing import Dict, List, Optional, Union
+from tensorhive.models.ReservationUsageSummary import ReservationUsageSummary
+from tensorhive.core.usage_journal import RetentionPolicy, UsageJournal, UsageRecord
+from tensorhive.core.usage_stats import ReservationUsage
+from tensorhive.core.usage_rollups import UsageRollupWriter
+from tensorhive.core.process_accounting import ProcessAccountant
+from tensorhive.core.idle_reservations import IdleReservationAction, IdleReservationDetector, \
+    IdleReservationNotifier, release_idle_reservation
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 from tensorhive.config import USAGE_LOGGING_SERVICE
 from pathlib import PosixPath
 from enum import IntEnum
 import datetime
 import time
-import gevent
 import json
 import logging
 log = logging.getLogger(__name__)
@@ -25,7 +32,7 @@ class LogFileCleanupAction(IntEnum):
 def avg(data: List[Union[int, float]]) -> float:
     '''Calculates average from a list of values'''
     try:
-        return sum(data) // len(data)
+        return sum(data) / len(data)
     except ZeroDivisionError:
         return float(-1)
 
@@ -42,7 +49,10 @@ def object_serializer(obj):
 
 
 class JSONLogFile:
-    '''Encapsulates JSON file operations.'''
+    '''
+    Encapsulates JSON file operations.
+    Used only for log files created by older versions, new samples are stored in UsageJournal.
+    '''
 
     def __init__(self, path: PosixPath) -> None:
         self.path = path
@@ -59,72 +69,17 @@ class JSONLogFile:
                 raise
 
 
-class Log:
-    '''Represents ordinary JSON log file'''
-    # Template structure for .json log files
-    empty_log_file_format = {
-        'name': str(),
-        'index': int(),
-        'messages': [],
-        'timestamps': [],
-        'metrics': {
-            'utilization': {
-                'values': [],
-                'unit': '%'
-            },
-            'mem_util': {
-                'values': [],
-                'unit': '%'
-            },
-        }
-    }
-
-    def __init__(self, data: Dict) -> None:
-        self.data = data
-
-    def updated_log(self, log_file: JSONLogFile) -> Dict:
-        '''Reads a log file, returns its content updated/extended by new data'''
-        log = log_file.read()
-
-        log['name'] = self.data['name']
-        log['index'] = self.data['index']
-
-        mem_util = self.data['metrics']['mem_util']['value']
-        gpu_util = self.data['metrics']['utilization']['value']
-
-        if gpu_util is not None and mem_util is not None:
-            log['timestamps'].append(datetime.datetime.utcnow())
-            log['metrics']['utilization']['values'].append(gpu_util)
-            log['metrics']['mem_util']['values'].append(mem_util)
-            # TODO Add more metrics here
-        else:
-            err_msg = '`mem_util` or `utilization` is not supported by this GPU'
-            # Append message only once
-            if err_msg not in log['messages']:
-                log['messages'].append(err_msg)
-        return log
-
-    def save(self, out_path: PosixPath) -> None:
-        log_file = JSONLogFile(out_path)
-
-        # If file is empty, initialize it with template
-        if not log_file.path.exists():
-            log_file.write(self.empty_log_file_format)
-
-        # Overwrite log file with updated content
-        updated_log_content = self.updated_log(log_file)
-        log_file.write(updated_log_content, default=object_serializer)
-
-        log.debug('Log file has been updated {}'.format(out_path))
-
-
 class UsageLoggingService(Service):
     '''
     Responsible for:
     1. Gathering infrastracture data within active reservation time
-    2. Storing data as files in suitable format and location
+    2. Storing data in append-only usage journal (see UsageJournal)
+       and in hourly/daily rollups used by analytics (see UsageRollup), GPU and host rollups cover all GPUs
     3. Preparing short summary when reservation time ends
-    3. Handling log files when they become useless
+    4. Detecting idle reservations, notifying their owners and releasing them (see IdleReservationAction)
+    5. Compacting and removing old journal segments (see RetentionPolicy) and expired rollups
+    6. Tracking processes running on all GPUs (see GPUProcessSession)
+    7. Handling legacy JSON log files when they become useless
     '''
     # What to do when log file is expired
     log_cleanup_action = USAGE_LOGGING_SERVICE.LOG_CLEANUP_ACTION
@@ -132,10 +87,45 @@ class UsageLoggingService(Service):
     # Default location for all log files
     log_dir = PosixPath(USAGE_LOGGING_SERVICE.LOG_DIR).expanduser()
 
-    def __init__(self, interval=0.0):
-        super().__init__()
+    # GPU utilization (%) below which a sample counts as idle
+    idle_threshold = USAGE_LOGGING_SERVICE.IDLE_THRESHOLD
+
+    # Retention of usage journal segments
+    retention_policy = RetentionPolicy(
+        compact_after_days=USAGE_LOGGING_SERVICE.JOURNAL_COMPACT_AFTER_DAYS,
+        delete_after_days=USAGE_LOGGING_SERVICE.JOURNAL_DELETE_AFTER_DAYS,
+        max_bytes=USAGE_LOGGING_SERVICE.JOURNAL_MAX_SIZE_MB * 1024 * 1024,
+        archive_resolution=USAGE_LOGGING_SERVICE.JOURNAL_ARCHIVE_RESOLUTION).validated()
+
+    # Days after which rollups are removed, by granularity
+    rollup_retention_days = {'hour': USAGE_LOGGING_SERVICE.ROLLUP_HOUR_RETENTION_DAYS,
+                             'day': USAGE_LOGGING_SERVICE.ROLLUP_DAY_RETENTION_DAYS}
+    # Expired rollups are looked for once per this many seconds
+    rollup_removal_interval = 60 * 60
+
+    # What to do with reservations idle for the whole idle window
+    idle_reservation_action = USAGE_LOGGING_SERVICE.IDLE_RESERVATION_ACTION
+
+    def __init__(self, interval=0.0, trigger_on_update=False, debounce=0.0):
+        super().__init__(trigger_topics=[InfrastructureManager.SNAPSHOT_TOPIC] if trigger_on_update else None,
+                         debounce=debounce)
         self.interval = interval
         self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.journal = UsageJournal(self.log_dir, fsync_interval=USAGE_LOGGING_SERVICE.JOURNAL_FSYNC_INTERVAL)
+        # Running aggregates of reservations which have samples in journal, but no summary yet.
+        # Rebuilt from the journal on first use, so restart does not lose anything.
+        self.usage = None  # type: Optional[Dict[int, ReservationUsage]]
+        # JSON log files created by older versions, found once on first use
+        self.legacy_log_files = None  # type: Optional[List[PosixPath]]
+        self.rollups = UsageRollupWriter()
+        self.rollups_removed_at = None  # type: Optional[float]
+        self.idle_detector = IdleReservationDetector(
+            threshold=self.idle_threshold, window=USAGE_LOGGING_SERVICE.IDLE_RESERVATION_WINDOW_MINS * 60)
+        self.idle_notifier = IdleReservationNotifier() \
+            if USAGE_LOGGING_SERVICE.IDLE_RESERVATION_NOTIFY_VIA_EMAIL else None
+        self.process_accountant = ProcessAccountant(
+            checkpoint_interval=USAGE_LOGGING_SERVICE.PROCESS_CHECKPOINT_INTERVAL) \
+            if USAGE_LOGGING_SERVICE.PROCESS_ACCOUNTING else None
 
     @override
     def inject(self, injected_object):
@@ -147,29 +137,195 @@ class UsageLoggingService(Service):
         start_time = time.perf_counter()
 
         self.log_current_usage()
+        self.handle_idle_reservations()
         self.handle_expired_logs()
+        self.maintain_journal()
+        self.remove_expired_rollups()
 
         end_time = time.perf_counter()
         execution_time = end_time - start_time
 
-        # Hold on until next interval
-        if execution_time < self.interval:
-            gevent.sleep(self.interval - execution_time)
+        # Hold on until next interval or fresh data
+        self.wait_for_trigger(self.interval - execution_time)
+
+    @override
+    def after_execution(self):
+        self.journal.close()
+        super().after_execution()
+
+    @staticmethod
+    def usage_record(timestamp: float, uuid: str, gpu_data: Dict,
+                     reservation: Optional[Reservation] = None) -> UsageRecord:
+        '''Sample of a GPU, without reservation and user if the GPU is not reserved (used for rollups only)'''
+        metrics = gpu_data.get('metrics') or {}
+
+        def value(metric_name: str) -> Optional[float]:
+            return (metrics.get(metric_name) or {}).get('value')
+
+        return UsageRecord(timestamp=timestamp, uuid=uuid,
+                           reservation_id=reservation.id if reservation is not None else None,
+                           user_id=reservation.user_id if reservation is not None else None,
+                           utilization=value('utilization'), mem_util=value('mem_util'), mem_used=value('mem_used'),
+                           power=value('power'))
 
     def log_current_usage(self):
-        '''Updates log files related to current reservations'''
-        current_reservations = Reservation.current_events()
-        infrastructure = self.infrastructure_manager.infrastructure
-        for reservation in current_reservations:
-            filename = '{id}.json'.format(id=reservation.id)
-            log_file_path = self.log_dir / filename
+        '''Samples current reservations, errors are logged, so that one bad tick doesn't stop the service'''
+        try:
+            self.sample_current_usage()
+        except Exception as e:
+            log.error('Unable to log current usage: {}'.format(e))
+            db_session.rollback()
+
+    def sample_current_usage(self):
+        '''
+        Samples all current reservations in one pass, so that cost of a tick stays flat:
+        one query for reservations, a single (immutable) snapshot with GPUs looked up by index,
+        one journal write and one rollup transaction, no matter how many reservations are active.
+        GPUs which are not reserved go to GPU and host rollups only.
+        Processes from the same snapshot are handed over to process accounting.
+        '''
+        snapshot = self.infrastructure_manager.snapshot
+        timestamp = time.time()
+        samples = []  # type: List[Tuple[UsageRecord, str]]
+        missing = []  # type: List[str]
+        for reservation in Reservation.current_events():
             try:
-                gpu_data = self.extract_specific_gpu_data(
-                    uuid=reservation.resource_id, infrastructure=infrastructure)
-                Log(data=gpu_data).save(out_path=log_file_path)
+                hostname, gpu_data = self.extract_specific_gpu_data(uuid=reservation.resource_id, snapshot=snapshot)
+            except KeyError:
+                missing.append(reservation.resource_id)
+            else:
+                record = self.usage_record(timestamp, reservation.resource_id, gpu_data, reservation)
+                samples.append((record, hostname))
+        if missing:
+            log.debug('No data of reserved GPUs (snapshot v{}): {}'.format(snapshot.version, ', '.join(missing)))
+
+        records = [record for record, _ in samples]
+        # Aggregates are rebuilt from journal (if needed) before these records get there, and updated only
+        # after they have been written, so that they never contain anything the journal doesn't
+        self.accumulate([])
+        self.journal.append(records)
+        self.accumulate(records)
+        self.idle_detector.observe(records)
+        reserved = {record.uuid for record in records}
+        self.rollups.add(samples + [(self.usage_record(timestamp, uuid, gpu_data), hostname)
+                                    for hostname, node_data in snapshot.infrastructure.items()
+                                    for uuid, gpu_data in (node_data.get('GPU') or {}).items()
+                                    if uuid not in reserved])
+        self.rollups.flush()
+        if self.process_accountant is not None:
+            self.process_accountant.update(snapshot.infrastructure, timestamp)
+
+    def accumulate(self, records: Iterable[UsageRecord]) -> None:
+        if self.usage is None:
+            log.debug('Rebuilding usage aggregates of unsummarized reservations from journal...')
+            self.usage = {}
+            # Reservations last a few days at most, older (archived) samples have been summarized already
+            rebuild_since = time.time() - self.retention_policy.compact_after_days * 24 * 60 * 60
+            self.accumulate(self.journal.read(start=rebuild_since))
+
+        for record in records:
+            usage = self.usage.get(record.reservation_id)
+            if usage is None:
+                usage = self.usage[record.reservation_id] = ReservationUsage(record.reservation_id)
+            usage.add(record)
+
+    @staticmethod
+    def apply_summary(reservation: Reservation, usage: ReservationUsage) -> None:
+        def rounded(average: Optional[float]) -> int:
+            return int(round(average)) if average is not None else int(avg([]))
+
+        reservation.gpu_util_avg = rounded(usage.utilization.average)
+        reservation.mem_util_avg = rounded(usage.mem_util.average)
+
+    @staticmethod
+    def summarize(reservation: Reservation, usage: ReservationUsage,
+                  idle_threshold: float) -> ReservationUsageSummary:
+        '''Detailed statistics of finished reservation, stored separately from reservation itself'''
+        idle_fraction = usage.utilization.fraction_below(idle_threshold)
+        duration_hours = (reservation.end - reservation.start).total_seconds() / 3600
+        return ReservationUsageSummary(
+            reservation_id=reservation.id,
+            user_id=reservation.user_id,
+            resource_id=reservation.resource_id,
+            start=reservation.start,
+            end=reservation.end,
+            samples=usage.utilization.count,
+            gpu_util_avg=usage.utilization.average,
+            gpu_util_p50=usage.utilization.percentile(50),
+            gpu_util_p95=usage.utilization.percentile(95),
+            mem_util_avg=usage.mem_util.average,
+            idle_fraction=idle_fraction,
+            idle_hours=duration_hours * idle_fraction if idle_fraction is not None else None,
+            mem_used_peak=usage.mem_used.maximum,
+            power_avg=usage.power.average,
+            energy_wh=usage.energy_wh if usage.power.count else None)
+
+    def handle_idle_reservations(self, now: Optional[float] = None) -> None:
+        '''
+        Takes configured action on reservations idle for the whole window.
+        Released reservations are announced on InfrastructureManager's bus,
+        so that job scheduler can use freed GPUs without waiting for its interval.
+        '''
+        action = IdleReservationAction(self.idle_reservation_action)
+        if action == IdleReservationAction.NONE:
+            return
+        now = time.time() if now is None else now
+        due = self.idle_detector.due(now)
+        if not due:
+            return
+
+        released = []
+        utc_now = datetime.datetime.utcnow()
+        for reservation in self.find_reservations(due):
+            if reservation.end <= utc_now or reservation.is_cancelled:
+                # Over already, its state will be dropped along with its usage (see handle_expired_logs)
+                continue
+            idle_minutes = (now - self.idle_detector.idle_since[reservation.id]) / 60
+            try:
+                if release_idle_reservation(reservation, action):
+                    released.append(reservation.id)
+                    log.info('Reservation id={} has been idle for {:.0f} min, action taken: {}'.format(
+                        reservation.id, idle_minutes, action.name))
+                    taken_action = action
+                else:
+                    log.info('Reservation id={} has been idle for {:.0f} min'.format(reservation.id, idle_minutes))
+                    taken_action = IdleReservationAction.NOTIFY
+                if self.idle_notifier is not None:
+                    self.idle_notifier.notify(reservation, idle_minutes, taken_action)
             except Exception as e:
                 log.error(e)
 
+        if released:
+            self.idle_detector.forget(released)
+            self.infrastructure_manager.publish_event(InfrastructureManager.RESERVATIONS_TOPIC, released)
+
+    def maintain_journal(self) -> None:
+        '''Compacts or removes a few old journal segments per tick, see RetentionPolicy'''
+        try:
+            self.journal.maintain(self.retention_policy,
+                                  max_operations=USAGE_LOGGING_SERVICE.JOURNAL_MAINTENANCE_OPERATIONS,
+                                  max_compacted_bytes=int(USAGE_LOGGING_SERVICE.JOURNAL_MAINTENANCE_MB * 1024 * 1024))
+        except OSError as e:
+            log.error('Usage journal maintenance failed: {}'.format(e))
+
+    def remove_expired_rollups(self, now: Optional[float] = None) -> None:
+        '''Removes rollups past their retention, at most once per `rollup_removal_interval`'''
+        now = time.time() if now is None else now
+        if self.rollups_removed_at is not None and now - self.rollups_removed_at < self.rollup_removal_interval:
+            return
+        self.rollups_removed_at = now
+        removed = self.rollups.remove_expired(self.rollup_retention_days)
+        if removed:
+            log.info('Removed {} expired usage rollups'.format(removed))
+
+    def find_reservations(self, ids: List[int], chunk_size: int = 500) -> List[Reservation]:
+        '''Fetches many reservations with as few queries as possible (SQLite limits number of parameters)'''
+        result = []  # type: List[Reservation]
+        for offset in range(0, len(ids), chunk_size):
+            chunk = ids[offset:offset + chunk_size]
+            result.extend(Reservation.query.filter(Reservation.id.in_(chunk)).all())
+        return result
+
     def _clean_up_old_log_file(self, file: PosixPath):
         '''
         Triggers an action on expired log file
@@ -195,15 +351,58 @@ class UsageLoggingService(Service):
 
     def handle_expired_logs(self):
         '''
-        Seeks for ordinary JSON log files related to expired reservations.
-        It creates very simple summary (avg) and fills in existing reservation database record.
+        Creates summary for expired reservations: averages are filled in existing reservation database record,
+        detailed statistics (percentiles, idle time, memory peak, energy) are stored as ReservationUsageSummary.
         '''
         time_now = datetime.datetime.utcnow()
+        self.accumulate([])
+
+        try:
+            reservations = self.find_reservations(list(self.usage.keys()))
+        except Exception as e:
+            log.debug(e)
+            return
+
+        existing_ids = {reservation.id for reservation in reservations}
+        deleted_ids = set(self.usage.keys()) - existing_ids
+        for reservation_id in deleted_ids:
+            log.debug('Usage of inexisting reservation id={} has been found, dropping it...'.format(reservation_id))
+            del self.usage[reservation_id]
+        self.idle_detector.forget(deleted_ids)
+
+        for reservation in reservations:
+            if reservation.end >= time_now:
+                continue
+            self.idle_detector.forget([reservation.id])
+            try:
+                # Summary could have been saved already, before restart
+                if ReservationUsageSummary.get_by_reservation_id(reservation.id) is None:
+                    log.debug('Reservation id={} has ended, saving summary...'.format(reservation.id))
+                    usage = self.usage[reservation.id]
+                    self.apply_summary(reservation, usage)
+                    # Averages and detailed summary are committed in one transaction
+                    db_session.add(self.summarize(reservation, usage, self.idle_threshold))
+                    reservation.save()
+                del self.usage[reservation.id]
+            except Exception as e:
+                log.debug(e)
+
+        self.handle_expired_json_logs(time_now)
 
-        # Get all files within given directory
+    def handle_expired_json_logs(self, time_now: datetime.datetime):
+        '''
+        Seeks for ordinary JSON log files (created by older versions) related to expired reservations.
+        It creates very simple summary (avg) and fills in existing reservation database record.
+        '''
+        # Get all files within given directory, only once - new ones are not created anymore
         # Accept only files like: 10.json
-        for item in self.log_dir.glob('[0-9]*.json'):
-            if item.is_file():
+        if self.legacy_log_files is None:
+            self.legacy_log_files = [item for item in self.log_dir.glob('[0-9]*.json') if item.is_file()]
+
+        for item in list(self.legacy_log_files):
+            if not item.is_file():
+                self.legacy_log_files.remove(item)
+            else:
                 try:
                     log.debug('Processing file: {}'.format(item))
                     id_from_filename = int(item.stem)
@@ -215,26 +414,31 @@ class UsageLoggingService(Service):
 
                         # Generate and persist summary
                         log_contents = JSONLogFile(path=item).read()
-                        reservation.gpu_util_avg = avg(log_contents['metrics']['utilization']['values'])
-                        reservation.mem_util_avg = avg(log_contents['metrics']['mem_util']['values'])
+                        reservation.gpu_util_avg = round(avg(log_contents['metrics']['utilization']['values']))
+                        reservation.mem_util_avg = round(avg(log_contents['metrics']['mem_util']['values']))
                         log.debug('Saving summary...')
                         reservation.save()
 
                         # Clean up log immidiately
                         self._clean_up_old_log_file(file=item)
+                        self.legacy_log_files.remove(item)
                 except NoResultFound:
                     log.debug('Log file for inexisting reservation has been found, cleaning up the file...')
                     self._clean_up_old_log_file(file=item)
+                    self.legacy_log_files.remove(item)
                 except Exception as e:
                     log.debug(e)
 
-    def extract_specific_gpu_data(self, uuid: str, infrastructure: Dict) -> Dict:
-        '''Returns whole right-hand side value (dictionary) for given key (uuid)'''
-        assert isinstance(infrastructure, dict)
-        assert isinstance(uuid, str) and len(uuid) == 40
-
-        for hostname in infrastructure.keys():
-            gpu_data = infrastructure[hostname].get('GPU').get(uuid)
+    @staticmethod
+    def extract_specific_gpu_data(uuid: str, snapshot: Snapshot) -> Tuple[str, Dict]:
+        '''
+        Returns hostname and whole right-hand side value (dictionary) for given key (uuid),
+        found through snapshot's GPU index instead of scanning the infrastructure
+        '''
+        location = snapshot.gpu_locations.get(uuid)
+        if location is not None:
+            hostname, _ = location
+            gpu_data = (snapshot.infrastructure.get(hostname, {}).get('GPU') or {}).get(uuid)
             if gpu_data:
-                return gpu_data
+                return hostname, gpu_data
         raise KeyError(uuid + ' has not been found!')
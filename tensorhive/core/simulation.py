@@ -0,0 +1,538 @@
+'''
+Offline simulation of job scheduling, for measuring quality and speed of schedulers without any hosts.
+
+JobSchedulingService runs with a given Scheduler on a synthetic cluster (SimulatedCluster stands in for
+task_nursery and MonitoringService), against a fresh in-memory database. Jobs and reservations are replayed
+from a trace (see `load_trace`, `synthetic_trace`). Time is simulated (SimulatedClock): every tick advances it
+by the service interval and nothing really waits, so days of traffic take seconds or minutes.
+'''
+from tensorhive import database
+from tensorhive.core import task_nursery
+from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
+from tensorhive.core.scheduling import Scheduler
+from tensorhive.core.services.JobSchedulingService import JobSchedulingService
+from tensorhive.database import Base, db_session
+from tensorhive.models.GPUProcessSession import GPUProcessSession
+from tensorhive.models.Job import Job, JobPriority, JobStatus
+from tensorhive.models.Reservation import Reservation
+from tensorhive.models.Restriction import Restriction
+from tensorhive.models.Role import Role
+from tensorhive.models.Task import Task, TaskPlacement
+from tensorhive.models.User import User
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+import datetime
+import importlib
+import json
+import logging
+import random
+import time
+import types
+log = logging.getLogger(__name__)
+
+# Modules which ask for current time while scheduling, they see simulated time instead
+TIME_DEPENDENT_MODULES = [
+    'tensorhive.core.scheduling',
+    'tensorhive.core.services.JobSchedulingService',
+    'tensorhive.core.reservation_index',
+    'tensorhive.controllers.job',
+    'tensorhive.controllers.task',
+    'tensorhive.models.Job',
+    'tensorhive.models.JobRun',
+    'tensorhive.models.Reservation',
+    'tensorhive.models.Restriction',
+]
+# Bounded slowdown: shorter jobs are treated as if they took that long
+SLOWDOWN_THRESHOLD = datetime.timedelta(seconds=10)
+
+
+class TraceJob(NamedTuple):
+    '''Job submitted to the queue `submit` after simulation start, it needs `duration` of work to finish'''
+    submit: datetime.timedelta
+    user: str
+    duration: datetime.timedelta
+    # Number of GPUs of each task, tasks go to any host and start together (as a gang)
+    gpus: List[int]
+    priority: JobPriority = JobPriority.normal
+    command: str = 'python train.py'
+
+
+class TraceReservation(NamedTuple):
+    '''GPU reserved for <start, end>, known to the system since `created` (offsets from simulation start)'''
+    user: str
+    hostname: str
+    gpu_index: int
+    start: datetime.timedelta
+    end: datetime.timedelta
+    created: datetime.timedelta = datetime.timedelta(0)
+
+
+class Trace(NamedTuple):
+    jobs: List[TraceJob]
+    reservations: List[TraceReservation]
+
+
+class Report(NamedTuple):
+    scheduler: str
+    jobs: int
+    completed: int
+    ticks: int
+    # GPU time used by jobs (including lost work) divided by GPU time available within makespan
+    utilisation: float
+    # From submission until the first start, over completed jobs
+    average_wait: datetime.timedelta
+    # From the first submission until the last completion
+    makespan: datetime.timedelta
+    # Jain's index of mean bounded slowdown of users, 1.0 means all users are slowed down equally
+    fairness: float
+    # Runs which ended before the job finished (checkpointed, interrupted or killed)
+    preempted_runs: int
+    lost_gpu_hours: float
+    # CPU time of a single run of the service, in seconds
+    tick_cpu_avg: float
+    tick_cpu_max: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        ret = self._asdict()
+        for field in ['average_wait', 'makespan']:
+            ret[field] = ret[field].total_seconds() / 60
+        return ret
+
+
+def minutes(value: float) -> datetime.timedelta:
+    return datetime.timedelta(minutes=value)
+
+
+def load_trace(lines: Iterable[str]) -> Trace:
+    '''
+    Reads trace from JSON lines, times are given in minutes since simulation start, e.g.
+    {"type": "job", "submit": 0, "user": "alice", "duration": 90, "gpus": [8, 8], "priority": "high"}
+    {"type": "reservation", "user": "bob", "host": "node-000", "gpu": 3, "start": 60, "end": 180}
+    Optional fields: job's "priority" (low, normal, high) and "command", reservation's "created".
+    '''
+    jobs, reservations = [], []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            if entry['type'] == 'job':
+                gpus = entry['gpus']
+                jobs.append(TraceJob(submit=minutes(entry['submit']), user=entry['user'],
+                                     duration=minutes(entry['duration']),
+                                     gpus=[int(count) for count in gpus] if isinstance(gpus, list) else [int(gpus)],
+                                     priority=JobPriority[entry.get('priority', 'normal')],
+                                     command=entry.get('command', 'python train.py')))
+            elif entry['type'] == 'reservation':
+                reservations.append(TraceReservation(user=entry['user'], hostname=entry['host'],
+                                                     gpu_index=int(entry['gpu']), start=minutes(entry['start']),
+                                                     end=minutes(entry['end']),
+                                                     created=minutes(entry.get('created', 0))))
+            else:
+                raise ValueError('unknown entry type: {}'.format(entry['type']))
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError('Invalid trace entry in line {}: {}'.format(number, e))
+    return Trace(jobs, reservations)
+
+
+def synthetic_cluster(hosts: int, gpus_per_host: int) -> Dict[str, int]:
+    return {'node-{:03d}'.format(host): gpus_per_host for host in range(hosts)}
+
+
+def synthetic_trace(cluster: Dict[str, int], jobs: int = 1000, users: int = 10, load: float = 0.9,
+                    reservations: int = 0, seed: int = 0) -> Trace:
+    '''
+    Random but reproducible traffic: Poisson arrivals sized so that jobs alone would keep `load` of GPUs busy,
+    log-normal durations (median 1h), mostly small jobs and occasional multi-host gangs.
+    Some users submit much more than others, each user re-runs a few commands (so runtimes can be learned).
+    Reservations of single GPUs (1 to 4 hours) are spread over the same period, without overlaps.
+    '''
+    rng = random.Random(seed)
+    gpus_per_host = max(cluster.values())
+    sizes = [[1], [1], [1], [2], [4], [gpus_per_host], [gpus_per_host, gpus_per_host]]
+    sizes = [[min(count, gpus_per_host) for count in size] for size in sizes if len(size) <= len(cluster)]
+    usernames = ['user{:02d}'.format(number) for number in range(users)]
+    user_weights = [1.0 / (rank + 1) for rank in range(users)]
+
+    durations = [minutes(min(24 * 60, max(1.0, rng.lognormvariate(4.1, 1.0)))) for _ in range(jobs)]
+    shapes = [rng.choice(sizes) for _ in range(jobs)]
+    work = sum(duration.total_seconds() * sum(shape) for duration, shape in zip(durations, shapes))
+    mean_interarrival = work / jobs / (sum(cluster.values()) * load) if jobs else 0.0
+
+    trace_jobs = []
+    submit = 0.0
+    for duration, shape in zip(durations, shapes):
+        user = rng.choices(usernames, weights=user_weights)[0]
+        trace_jobs.append(TraceJob(submit=datetime.timedelta(seconds=submit), user=user, duration=duration,
+                                   gpus=shape, command='python {}_model_{}.py'.format(user, rng.randrange(3)),
+                                   priority=rng.choices(list(JobPriority), weights=[1, 8, 1])[0]))
+        submit += rng.expovariate(1.0 / mean_interarrival) if mean_interarrival else 0.0
+
+    trace_reservations = []  # type: List[TraceReservation]
+    taken = {}  # type: Dict[tuple, List[tuple]]
+    for _ in range(reservations * 3):
+        if len(trace_reservations) == reservations:
+            break
+        hostname = rng.choice(list(cluster))
+        gpu = (hostname, rng.randrange(cluster[hostname]))
+        start = minutes(rng.randrange(max(1, int(submit / 60))))
+        end = start + minutes(rng.choice([60, 120, 240]))
+        if any(start < other_end and other_start < end for other_start, other_end in taken.get(gpu, [])):
+            continue
+        taken.setdefault(gpu, []).append((start, end))
+        trace_reservations.append(TraceReservation(user=rng.choice(usernames), hostname=hostname, gpu_index=gpu[1],
+                                                   start=start, end=end, created=max(minutes(0), start - minutes(60))))
+    return Trace(trace_jobs, trace_reservations)
+
+
+class _SimulatedDatetimeMeta(type):
+    def __instancecheck__(cls, instance):
+        return isinstance(instance, datetime.datetime)
+
+
+class SimulatedClock():
+    '''Current time of simulation, moves only when told to'''
+
+    def __init__(self, start: datetime.datetime) -> None:
+        self.now = start
+
+    def advance(self, delta: datetime.timedelta) -> None:
+        self.now += delta
+
+    @contextmanager
+    def patch(self, module_names: List[str]) -> Iterator['SimulatedClock']:
+        '''Within the block, datetime.utcnow() called in given modules returns simulated time'''
+        clock = self
+
+        class SimulatedDatetime(datetime.datetime, metaclass=_SimulatedDatetimeMeta):
+            @classmethod
+            def utcnow(cls):
+                return clock.now
+
+        datetime_module = types.ModuleType('datetime')
+        datetime_module.__dict__.update(vars(datetime))
+        datetime_module.datetime = SimulatedDatetime  # type: ignore
+
+        originals = []
+        for module_name in module_names:
+            module = importlib.import_module(module_name)
+            original = getattr(module, 'datetime', None)
+            if original is datetime.datetime:
+                setattr(module, 'datetime', SimulatedDatetime)
+            elif original is datetime:
+                setattr(module, 'datetime', datetime_module)
+            else:
+                continue
+            originals.append((module, original))
+        try:
+            yield self
+        finally:
+            for module, original in originals:
+                setattr(module, 'datetime', original)
+
+
+@contextmanager
+def in_memory_database() -> Iterator[None]:
+    '''Within the block, all models live in a fresh SQLite database in memory'''
+    database._import_models()
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    db_session.remove()
+    db_session.configure(bind=engine)
+    Base.metadata.create_all(engine)
+    try:
+        yield
+    finally:
+        db_session.remove()
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+        db_session.configure(bind=database.engine)
+
+
+def simulated_gpu_uuid(host_number: int, index: int) -> str:
+    '''Looks like a real one (40 characters), so that reservations accept it'''
+    return 'GPU-{:08x}-0000-0000-0000-{:012x}'.format(host_number, index)
+
+
+class SimulatedProcess():
+    __slots__ = ['pid', 'hostname', 'owner', 'job_id', 'gpu_uuids', 'started_at', 'ends_at', 'checkpoint_at']
+
+    def __init__(self, pid: int, hostname: str, owner: str, job_id: int, gpu_uuids: List[str],
+                 started_at: datetime.datetime, ends_at: datetime.datetime) -> None:
+        self.pid = pid
+        self.hostname = hostname
+        self.owner = owner
+        self.job_id = job_id
+        self.gpu_uuids = gpu_uuids
+        self.started_at = started_at
+        self.ends_at = ends_at
+        # Set by checkpoint signal: when the program has saved its progress and exits
+        self.checkpoint_at = None  # type: Optional[datetime.datetime]
+
+
+class SimulatedCluster():
+    '''
+    Hosts with GPUs, published through InfrastructureManager (like MonitoringService does), and programs
+    run on them. Within `patch()` it stands in for task_nursery, so tasks are spawned, signalled and
+    terminated here instead of over ssh.
+
+    A job is done after `work_left[job_id]` of running. Checkpoint signal makes its programs save progress
+    and exit after `checkpoint_time`, interrupted or killed programs lose the progress of their run.
+    '''
+
+    def __init__(self, clock: SimulatedClock, gpus_per_host: Dict[str, int],
+                 checkpoint_time: datetime.timedelta = datetime.timedelta(minutes=1)) -> None:
+        self.clock = clock
+        self.checkpoint_time = checkpoint_time
+        self.gpu_uuids = {hostname: [simulated_gpu_uuid(host_number, index) for index in range(count)]
+                          for host_number, (hostname, count) in enumerate(sorted(gpus_per_host.items()))}
+        self.infrastructure_manager = InfrastructureManager(dict.fromkeys(self.gpu_uuids))
+        self.processes = {}  # type: Dict[int, SimulatedProcess]
+        self.work_left = {}  # type: Dict[int, datetime.timedelta]
+        self.first_start = {}  # type: Dict[int, datetime.datetime]
+        self.completed = {}  # type: Dict[int, datetime.datetime]
+        self.busy_gpu_seconds = 0.0
+        self.preempted_runs = 0
+        self._next_pid = 1000
+        self._published = {}  # type: Dict[str, Any]
+        self.publish({})
+
+    @property
+    def gpu_count(self) -> int:
+        return sum(len(uuids) for uuids in self.gpu_uuids.values())
+
+    # Same interface as task_nursery
+
+    def spawn(self, command: str, host: str, user: str, name_appendix: Optional[str] = None,
+              barrier: Optional[str] = None) -> int:
+        task = Task.get(int(name_appendix))  # type: ignore
+        gpu_uuids = task.gpu_uuids if task.is_flexible else [self.gpu_uuids[host][task.gpu_id]]
+        now = self.clock.now
+        self._next_pid += 1
+        self.processes[self._next_pid] = SimulatedProcess(self._next_pid, host, user, task.job_id, gpu_uuids,
+                                                          started_at=now, ends_at=now + self.work_left[task.job_id])
+        self.first_start.setdefault(task.job_id, now)
+        return self._next_pid
+
+    def release(self, host: str, user: str, barriers: List[str]) -> int:
+        return 0
+
+    def running(self, host: str, user: str) -> List[int]:
+        return [pid for pid, process in self.processes.items() if process.hostname == host and process.owner == user]
+
+    def terminate(self, pid: int, host: str, user: str, gracefully: Optional[bool] = True) -> int:
+        process = self.processes.get(pid)
+        if process is not None:
+            self._exit(process, self.clock.now, finished=False)
+        return 0
+
+    def signal(self, pid: int, host: str, user: str, signal: str) -> int:
+        process = self.processes.get(pid)
+        if process is not None and process.checkpoint_at is None:
+            process.checkpoint_at = min(process.ends_at, self.clock.now + self.checkpoint_time)
+        return 0
+
+    @contextmanager
+    def patch(self) -> Iterator['SimulatedCluster']:
+        names = ['spawn', 'release', 'running', 'terminate', 'signal']
+        originals = {name: getattr(task_nursery, name) for name in names}
+        for name in names:
+            setattr(task_nursery, name, getattr(self, name))
+        try:
+            yield self
+        finally:
+            for name, original in originals.items():
+                setattr(task_nursery, name, original)
+
+    def _exit(self, process: SimulatedProcess, at: datetime.datetime, finished: bool) -> None:
+        del self.processes[process.pid]
+        self.busy_gpu_seconds += (at - process.started_at).total_seconds() * len(process.gpu_uuids)
+        for gpu_uuid in process.gpu_uuids:
+            db_session.add(GPUProcessSession(hostname=process.hostname, gpu_uuid=gpu_uuid, pid=process.pid,
+                                             owner=process.owner, command='python', first_seen=process.started_at,
+                                             last_seen=at))
+        if process.checkpoint_at is not None and at == process.checkpoint_at:
+            self.work_left[process.job_id] = process.ends_at - at
+        if any(other.job_id == process.job_id for other in self.processes.values()):
+            return
+        if finished:
+            self.completed[process.job_id] = at
+        else:
+            self.preempted_runs += 1
+
+    def step(self, reserved: Dict[str, str]) -> None:
+        '''Ends programs which are done by now, then publishes GPU processes (`reserved`: GPU -> owner)'''
+        now = self.clock.now
+        for process in sorted(self.processes.values(), key=lambda process: process.ends_at):
+            if process.ends_at <= now:
+                self._exit(process, process.ends_at, finished=True)
+            elif process.checkpoint_at is not None and process.checkpoint_at <= now:
+                self._exit(process, process.checkpoint_at, finished=False)
+        db_session.commit()
+        self.publish(reserved)
+
+    def publish(self, reserved: Dict[str, str]) -> None:
+        usage = {}  # type: Dict[str, List[Dict]]
+        for process in self.processes.values():
+            for gpu_uuid in process.gpu_uuids:
+                usage.setdefault(gpu_uuid, []).append({'pid': process.pid, 'owner': process.owner,
+                                                       'command': 'python'})
+        for gpu_uuid, owner in reserved.items():
+            usage.setdefault(gpu_uuid, []).append({'pid': 1, 'owner': owner, 'command': 'python'})
+
+        with self.infrastructure_manager.updating():
+            for hostname, gpu_uuids in self.gpu_uuids.items():
+                host_usage = [usage.get(gpu_uuid, []) for gpu_uuid in gpu_uuids]
+                if self._published.get(hostname) == host_usage:
+                    continue
+                self._published[hostname] = host_usage
+                self.infrastructure_manager.update_node(hostname, 'GPU', {
+                    gpu_uuid: {'name': 'Simulated GPU', 'index': index, 'processes': processes}
+                    for index, (gpu_uuid, processes) in enumerate(zip(gpu_uuids, host_usage))})
+
+
+class Simulation():
+    '''
+    Replays trace against JobSchedulingService with given scheduler, each tick does the same as
+    JobSchedulingService.do_run (without waiting). Periods with nothing to schedule are skipped.
+    Every job of trace is queued (no user-scheduled jobs), queued jobs get preempted by reservations.
+    '''
+
+    def __init__(self, scheduler: Scheduler, cluster: Dict[str, int], trace: Trace,
+                 tick: datetime.timedelta = datetime.timedelta(seconds=30),
+                 start: datetime.datetime = datetime.datetime(2020, 1, 6),
+                 max_duration: datetime.timedelta = datetime.timedelta(days=365),
+                 preemption_signal: Optional[str] = 'USR1', preemption_grace_period: float = 5.0,
+                 checkpoint_time: datetime.timedelta = datetime.timedelta(minutes=1)) -> None:
+        self.scheduler = scheduler
+        self.trace = trace
+        self.tick = tick
+        self.start = start
+        self.max_duration = max_duration
+        self.preemption_signal = preemption_signal
+        self.preemption_grace_period = preemption_grace_period
+        self.clock = SimulatedClock(start)
+        self.cluster = SimulatedCluster(self.clock, cluster, checkpoint_time=checkpoint_time)
+        self.tick_cpu_times = []  # type: List[float]
+        self._trace_jobs = {}  # type: Dict[int, TraceJob]
+        self._reservations = []  # type: List[Reservation]
+
+    def run(self) -> Report:
+        with in_memory_database(), self.clock.patch(TIME_DEPENDENT_MODULES), self.cluster.patch():
+            service = JobSchedulingService(interval=self.tick.total_seconds(), stop_attempts_after=5,
+                                           preemption_signal=self.preemption_signal,
+                                           preemption_grace_period=self.preemption_grace_period)
+            service.inject(self.cluster.infrastructure_manager)
+            service.inject(self.scheduler)
+            users = self._create_users()
+
+            jobs = sorted(self.trace.jobs, key=lambda job: job.submit)
+            reservations = sorted(self.trace.reservations, key=lambda reservation: reservation.created)
+            end = self.start + self.max_duration
+            while self.clock.now < end:
+                now = self.clock.now
+                while jobs and self.start + jobs[0].submit <= now:
+                    self._submit(jobs.pop(0), users)
+                while reservations and self.start + reservations[0].created <= now:
+                    self._reserve(reservations.pop(0), users)
+                self.cluster.step(self._reserved_gpus(now))
+
+                if len(self.cluster.completed) == len(self._trace_jobs) and not service.preemptions:
+                    if not jobs:
+                        break
+                    # Nothing to schedule until the next submission
+                    gap = self.start + jobs[0].submit - now
+                    self.clock.advance(max(self.tick, gap // self.tick * self.tick))
+                    continue
+
+                cpu_time = time.process_time()
+                self._run_service(service)
+                self.tick_cpu_times.append(time.process_time() - cpu_time)
+                self.clock.advance(self.tick)
+            return self.report()
+
+    @staticmethod
+    def _run_service(service: JobSchedulingService) -> None:
+        available_hosts_with_gpu_occupation = service._infrastructure_manager.all_nodes_with_gpu_processes()
+        service.load_reservations()
+        if not service.execute_scheduled(available_hosts_with_gpu_occupation):
+            service.execute_queued(available_hosts_with_gpu_occupation)
+        service.stop_scheduled()
+        service.sync_running_from_queue(available_hosts_with_gpu_occupation)
+
+    def _create_users(self) -> Dict[str, User]:
+        usernames = sorted({job.user for job in self.trace.jobs} | {r.user for r in self.trace.reservations})
+        users = {username: User(username=username, password='simulated', roles=[Role(name='user')])
+                 for username in usernames}
+        restriction = Restriction(name='Simulation', starts_at=self.start - datetime.timedelta(days=1),
+                                  is_global=True)
+        for user in users.values():
+            user.save()
+            restriction.users.append(user)
+        restriction.save()
+        return users
+
+    def _submit(self, trace_job: TraceJob, users: Dict[str, User]) -> None:
+        job = Job(name='simulated', description='', user_id=users[trace_job.user].id, is_queued=True,
+                  _status=JobStatus.pending, priority=trace_job.priority)
+        job.save()
+        placeholder_hostname = next(iter(self.cluster.gpu_uuids))
+        for count in trace_job.gpus:
+            job.add_task(Task(command=trace_job.command, hostname=placeholder_hostname,
+                              placement=TaskPlacement.any, gpu_count=count))
+        self._trace_jobs[job.id] = trace_job
+        self.cluster.work_left[job.id] = trace_job.duration
+
+    def _reserve(self, trace_reservation: TraceReservation, users: Dict[str, User]) -> None:
+        try:
+            reservation = Reservation(user_id=users[trace_reservation.user].id, title='Simulated', description='',
+                                      resource_id=self.cluster.gpu_uuids[trace_reservation.hostname]
+                                      [trace_reservation.gpu_index],
+                                      start=self.start + trace_reservation.start,
+                                      end=self.start + trace_reservation.end)
+            reservation.save()
+        except (AssertionError, KeyError, IndexError) as e:
+            log.warning('Skipping reservation of {} from trace: {}'.format(trace_reservation.user, e))
+            db_session.rollback()
+        else:
+            self._reservations.append(reservation)
+
+    def _reserved_gpus(self, now: datetime.datetime) -> Dict[str, str]:
+        '''GPUs used by owners of reservations in progress'''
+        return {reservation.resource_id: reservation.user.username for reservation in self._reservations
+                if reservation.start <= now < reservation.end}
+
+    def report(self) -> Report:
+        completed = self.cluster.completed
+        first_submit = min((self.start + job.submit for job in self._trace_jobs.values()), default=self.start)
+        makespan = max(completed.values(), default=first_submit) - first_submit
+        waits = [self.cluster.first_start[job_id] - (self.start + self._trace_jobs[job_id].submit)
+                 for job_id in completed]
+
+        slowdowns = {}  # type: Dict[str, List[float]]
+        useful_gpu_seconds = 0.0
+        for job_id, completed_at in completed.items():
+            trace_job = self._trace_jobs[job_id]
+            turnaround = completed_at - (self.start + trace_job.submit)
+            slowdowns.setdefault(trace_job.user, []).append(
+                max(1.0, turnaround / max(trace_job.duration, SLOWDOWN_THRESHOLD)))
+            useful_gpu_seconds += trace_job.duration.total_seconds() * sum(trace_job.gpus)
+        user_slowdowns = [sum(values) / len(values) for values in slowdowns.values()]
+        fairness = sum(user_slowdowns) ** 2 / (len(user_slowdowns) * sum(value ** 2 for value in user_slowdowns)) \
+            if user_slowdowns else 1.0
+
+        available_gpu_seconds = self.cluster.gpu_count * makespan.total_seconds()
+        return Report(
+            scheduler=type(self.scheduler).__name__,
+            jobs=len(self._trace_jobs),
+            completed=len(completed),
+            ticks=len(self.tick_cpu_times),
+            utilisation=self.cluster.busy_gpu_seconds / available_gpu_seconds if available_gpu_seconds else 0.0,
+            average_wait=sum(waits, datetime.timedelta()) / len(waits) if waits else datetime.timedelta(),
+            makespan=makespan,
+            fairness=fairness,
+            preempted_runs=self.cluster.preempted_runs,
+            lost_gpu_hours=max(0.0, self.cluster.busy_gpu_seconds - useful_gpu_seconds) / 3600,
+            tick_cpu_avg=sum(self.tick_cpu_times) / len(self.tick_cpu_times) if self.tick_cpu_times else 0.0,
+            tick_cpu_max=max(self.tick_cpu_times, default=0.0))
@@ -7,8 +7,11 @@ from datetime import datetime
 import logging
 log = logging.getLogger(__name__)
 
+# Seconds a process spawned with barrier waits for release, then it gives up without running the command
+BARRIER_TIMEOUT = 300
+
 __author__ = '@micmarty'
-__all__ = ['ExitCodeError', 'SpawnError', 'spawn', 'terminate', 'running', 'fetch_log']
+__all__ = ['ExitCodeError', 'SpawnError', 'spawn', 'release', 'terminate', 'signal', 'running', 'fetch_log']
 """
 This module provides functionality for spawning commands on host machines via ssh.
 It's divided into 3 parts:
@@ -74,6 +77,9 @@ class ScreenCommandBuilder:
 
         Note: `custom_log_name` argument will be ignored when `capture_output=False`
 
+        Signals sent by `signal` reach the whole process group, so the wrapping shell and `tee` survive them:
+        the shell traps USR1/USR2 with a no-op (its children get default handlers back on exec),
+        `tee` ignores them explicitly, so the log is complete even if the command prints after the signal.
         """
         if capture_output:
             if keep_alive:
@@ -85,10 +91,12 @@ class ScreenCommandBuilder:
             else:
                 create_logfile_command = ScreenCommandBuilder.tmp_log_file()
             # | -> stdout only, |& -> stdout + stderr (Bash 4), 2>&1 (old Bash)
-            capturing_command = '|& tee --ignore-interrupts $({})'.format(create_logfile_command)
+            capturing_command = "|& (trap '' USR1 USR2; exec tee --ignore-interrupts $({}))".format(
+                create_logfile_command)
 
-        return 'screen -Dm -S {sess_name} bash -c "{cmd}{keep_alive} {log}" {to_bg}'.format(
+        return 'screen -Dm -S {sess_name} bash -c "{traps}{cmd}{keep_alive} {log}" {to_bg}'.format(
             sess_name=session_name,  # will help distinguishing between TensorHive and user's sessions
+            traps='trap : USR1 USR2; ',  # see docstring
             cmd=command,
             log=capturing_command if capture_output else '',  # see docstring
             keep_alive='; exec sh' if keep_alive else '',  # see docstring
@@ -128,11 +136,43 @@ class ScreenCommandBuilder:
         echopath_cmd = 'echo {dir}/{name}.log'.format(dir=target_dir, name=filename)
         return mkdir_cmd + ' && ' + echopath_cmd
 
+    @staticmethod
+    def barrier_file(name: str, target_dir: str = '~/TensorHiveLogs') -> str:
+        """Path to a file which releases a command waiting at the barrier `name`"""
+        return '{dir}/.barrier_{name}'.format(dir=target_dir, name=name)
+
+    @staticmethod
+    def wait_at_barrier(command: str, barrier: str, timeout: int) -> str:
+        """Command that waits until barrier file appears and only then runs `command`.
+
+        If the barrier is not released within `timeout` seconds, `command` is not run at all.
+        Note: it is embedded in double quotes (see `spawn`), so it must not contain any.
+        """
+        path = ScreenCommandBuilder.barrier_file(barrier)
+        wait_cmd = "timeout {timeout} sh -c 'until [ -e {path} ]; do sleep 0.2; done'".format(
+            timeout=timeout, path=path)
+        return '{wait} && rm -f {path} && {cmd}'.format(wait=wait_cmd, path=path, cmd=command)
+
+    @staticmethod
+    def release_barriers(barriers: List[str]) -> str:
+        """Command that releases all commands waiting at given barriers"""
+        paths = [ScreenCommandBuilder.barrier_file(barrier) for barrier in barriers]
+        return ScreenCommandBuilder.mkdir('~/TensorHiveLogs') + ' && touch ' + ' '.join(paths)
+
     @staticmethod
     def interrupt(pid: int) -> str:
         """Command that sends SIGINT to screen session. Should be used to gracefully terminate running command."""
         return 'screen -S {} -X stuff "^C"'.format(pid)
 
+    @staticmethod
+    def signal(pid: int, signal: str) -> str:
+        """Command that sends signal (e.g. USR1) to programs run in screen session, screen itself is left alone.
+
+        Each window of screen runs in its own process group, so the whole group gets the signal.
+        """
+        assert signal.isalnum(), 'Invalid signal name'
+        return 'for CHILD in $(pgrep -P {pid}); do kill -s {signal} -- -$CHILD; done'.format(pid=pid, signal=signal)
+
     @staticmethod
     def terminate(pid: int) -> str:
         """Command that terminates screen session using only pid (we don't need the full name: 1234.tensorhive)."""
@@ -164,8 +204,10 @@ class Task:
         # Here you can replace with your own backend/command builder
         self._command_builder = ScreenCommandBuilder
 
-    def spawn(self, client: ParallelSSHClient, name_appendix: Optional[str] = None) -> int:
+    def spawn(self, client: ParallelSSHClient, name_appendix: Optional[str] = None,
+              barrier: Optional[str] = None) -> int:
         """Spawns command via ssh client.
+        If `barrier` is given, command starts only after the barrier is released (see `release`).
         Returns:
             pid of the process
         """
@@ -175,8 +217,11 @@ class Task:
             sess_name += '_' + name_appendix
             log_name = 'task_' + name_appendix
 
+        command = self.command
+        if barrier:
+            command = self._command_builder.wait_at_barrier(command, barrier, timeout=BARRIER_TIMEOUT)
         command = self._command_builder.spawn(
-            self.command, session_name=sess_name, capture_output=True, custom_log_name=log_name, keep_alive=False)
+            command, session_name=sess_name, capture_output=True, custom_log_name=log_name, keep_alive=False)
         output = ssh.run_command(client, command)
         stdout = ssh.get_stdout(host=self.hostname, output=output)
 
@@ -216,6 +261,17 @@ class Task:
         exit_code = output[self.hostname].exit_code
         return exit_code
 
+    def signal(self, client: ParallelSSHClient, signal: str) -> int:
+        """Sends signal to the task's program (e.g. asking it to save a checkpoint)
+
+        Returns exit code of the operation
+        """
+        assert self.pid, 'You must first spawn the task or provide pid manually.'
+        command = self._command_builder.signal(self.pid, signal)
+        output = ssh.run_command(client, command)
+        exit_code = output[self.hostname].exit_code
+        return exit_code
+
     def kill(self, client: ParallelSSHClient) -> int:
         """Kills the task using it's pid.
 
@@ -228,18 +284,21 @@ class Task:
         return exit_code
 
 
-def spawn(command: str, host: Hostname, user: Username, name_appendix: Optional[str] = None) -> int:
+def spawn(command: str, host: Hostname, user: Username, name_appendix: Optional[str] = None,
+          barrier: Optional[str] = None) -> int:
     """Stateless, high-level interface for spawning process on remote host.
 
     name_appendix: string that will be attached to session name and log file name
         Example: appendix='99' will produce session='tensorhive_task_99', log='task_99.log'
+    barrier: unique name, if given, the process waits (at most BARRIER_TIMEOUT seconds) until
+        `release` is called with the same name, before it runs the command
     Returns pid of new process
     """
     config, pconfig = ssh.build_dedicated_config_for(host, user)
     client = ssh.get_client(config, pconfig)
     task = Task(host, command)
     try:
-        pid = task.spawn(client, name_appendix)
+        pid = task.spawn(client, name_appendix, barrier=barrier)
     except ValueError as e:
         raise SpawnError('{} on {}@{} failed: {}'.format(command, user, host, e))
     else:
@@ -247,6 +306,20 @@ def spawn(command: str, host: Hostname, user: Username, name_appendix: Optional[
         return pid
 
 
+def release(host: Hostname, user: Username, barriers: List[str]) -> int:
+    """Stateless, high-level interface for releasing processes spawned with barriers.
+
+    Returns exit code of release operation
+    """
+    config, pconfig = ssh.build_dedicated_config_for(host, user)
+    client = ssh.get_client(config, pconfig)
+    command = ScreenCommandBuilder.release_barriers(barriers)
+    output = ssh.run_command(client, command)
+    if output[host].exception:
+        raise SpawnError('Releasing barriers on {}@{} failed: {}'.format(user, host, output[host].exception))
+    return output[host].exit_code
+
+
 def terminate(pid: int, host: Hostname, user: Username, gracefully: Optional[bool] = True) -> int:
     """Stateless, high-level interface for terminating process on remote host.
 
@@ -269,6 +342,18 @@ def terminate(pid: int, host: Hostname, user: Username, gracefully: Optional[boo
     return exit_code
 
 
+def signal(pid: int, host: Hostname, user: Username, signal: str) -> int:
+    """Stateless, high-level interface for sending a signal to process on remote host.
+
+    signal: name without SIG prefix, e.g. USR1. Unlike `terminate`, the program decides what to do with it.
+    Returns exit code of the operation, not running process
+    """
+    config, pconfig = ssh.build_dedicated_config_for(host, user)
+    client = ssh.get_client(config, pconfig)
+    task = Task(host, pid=pid)
+    return task.signal(client, signal)
+
+
 def running(host: Hostname, user: Username) -> List[int]:
     """Stateless, high-level interface for getting a list of running processes on remote host.
 
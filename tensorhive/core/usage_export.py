@@ -0,0 +1,141 @@
+from tensorhive.core.usage_journal import UsageJournal, UsageRecord, is_missing
+from tensorhive.models.Resource import Resource
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+import csv
+import io
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COLUMNS = ['timestamp', 'hostname', 'uuid', 'reservation_id', 'user_id', 'utilization', 'mem_util', 'mem_used',
+           'power']
+Row = Tuple
+
+
+class _ChunkSink(io.RawIOBase):
+    '''Write-only stream which hands over written bytes on demand, but keeps track of the total position'''
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class UsageExporter():
+    '''
+    Streams raw GPU samples from the usage journal as CSV, Arrow (IPC stream) or Parquet.
+
+    Samples are read and encoded in chunks of `chunk_rows`, so memory usage does not depend on time range.
+    Arrow and Parquet require pyarrow (pip install tensorhive[export]).
+    '''
+    CSV = 'csv'
+    ARROW = 'arrow'
+    PARQUET = 'parquet'
+    MEDIA_TYPES = {
+        CSV: 'text/csv',
+        ARROW: 'application/vnd.apache.arrow.stream',
+        PARQUET: 'application/vnd.apache.parquet',
+    }
+
+    def __init__(self, journal: UsageJournal, chunk_rows: int = 10000) -> None:
+        self.journal = journal
+        self.chunk_rows = chunk_rows
+
+    @classmethod
+    def available_formats(cls) -> List[str]:
+        return [cls.CSV, cls.ARROW, cls.PARQUET] if pyarrow is not None else [cls.CSV]
+
+    @staticmethod
+    def _row(record: UsageRecord, hostnames: Dict[str, str]) -> Row:
+        def value(number: float) -> Optional[float]:
+            return None if is_missing(number) else number
+
+        return (record.timestamp, hostnames.get(record.uuid), record.uuid, record.reservation_id or None,
+                record.user_id or None, value(record.utilization), value(record.mem_util), value(record.mem_used),
+                value(record.power))
+
+    def chunks(self, start: Optional[float] = None, end: Optional[float] = None,
+               hostnames: Optional[List[str]] = None, user_ids: Optional[List[int]] = None) -> Iterator[List[Row]]:
+        '''Yields lists of at most chunk_rows rows (see COLUMNS), oldest first'''
+        hostname_by_uuid = {resource.id: resource.hostname for resource in Resource.all()}
+        uuids = None  # type: Optional[Set[str]]
+        if hostnames is not None:
+            uuids = {uuid for uuid, hostname in hostname_by_uuid.items() if hostname in hostnames}
+
+        chunk = []  # type: List[Row]
+        for record in self.journal.read(start=start, end=end, uuids=uuids,
+                                        user_ids=set(user_ids) if user_ids is not None else None):
+            chunk.append(self._row(record, hostname_by_uuid))
+            if len(chunk) >= self.chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _arrow_schema():
+        return pyarrow.schema([
+            ('timestamp', pyarrow.float64()), ('hostname', pyarrow.string()), ('uuid', pyarrow.string()),
+            ('reservation_id', pyarrow.int32()), ('user_id', pyarrow.int32()), ('utilization', pyarrow.float32()),
+            ('mem_util', pyarrow.float32()), ('mem_used', pyarrow.float32()), ('power', pyarrow.float32())
+        ])
+
+    def stream(self, export_format: str, **filters) -> Iterator[bytes]:
+        '''Yields encoded export piece by piece (one piece per chunk), filters are passed to `chunks`'''
+        assert export_format in self.available_formats(), 'Unsupported export format: {}'.format(export_format)
+
+        if export_format == self.CSV:
+            text = io.StringIO()
+            writer = csv.writer(text)
+            writer.writerow(COLUMNS)
+            for chunk in self.chunks(**filters):
+                writer.writerows(chunk)
+                yield text.getvalue().encode('utf-8')
+                text.seek(0)
+                text.truncate()
+            yield text.getvalue().encode('utf-8')
+            return
+
+        schema = self._arrow_schema()
+        sink = _ChunkSink()
+        if export_format == self.ARROW:
+            writer = pyarrow.ipc.new_stream(sink, schema)
+        else:
+            writer = pyarrow.parquet.ParquetWriter(sink, schema)
+        for chunk in self.chunks(**filters):
+            columns = list(zip(*chunk))
+            batch = pyarrow.record_batch([pyarrow.array(column, type=field.type)
+                                          for column, field in zip(columns, schema)], schema=schema)
+            if export_format == self.ARROW:
+                writer.write_batch(batch)
+            else:
+                writer.write_table(pyarrow.Table.from_batches([batch]))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    def export(self, export_format: str, output: BinaryIO, **filters) -> None:
+        for piece in self.stream(export_format, **filters):
+            output.write(piece)
@@ -0,0 +1,337 @@
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from pathlib import PosixPath
+import datetime
+import math
+import os
+import struct
+import time
+import logging
+log = logging.getLogger(__name__)
+
+
+class UsageRecord(NamedTuple):
+    '''Single GPU sample, missing metric values are NaN'''
+    timestamp: float
+    uuid: str
+    reservation_id: int
+    user_id: int
+    utilization: float
+    mem_util: float
+    mem_used: float
+    power: float
+
+
+class RetentionPolicy(NamedTuple):
+    '''
+    How long raw samples are kept (then they are downsampled into archives of `archive_resolution` seconds),
+    how long archives are kept, and how much disk space (bytes, 0 means unlimited) the whole journal may use.
+    '''
+    compact_after_days: int
+    delete_after_days: int
+    max_bytes: int = 0
+    archive_resolution: float = 300.0
+
+    # Reservation can last up to 8 days (see Reservation), usage aggregates of reservations in progress
+    # are rebuilt from raw samples, so they must not be compacted earlier
+    MIN_COMPACT_AFTER_DAYS = 8
+
+    def validated(self) -> 'RetentionPolicy':
+        '''Returns policy with values which would lose samples still needed raised to their minimum'''
+        if self.compact_after_days >= self.MIN_COMPACT_AFTER_DAYS:
+            return self
+        log.warning('Usage journal compact_after_days must be at least {0} (maximal reservation duration), '
+                    'using {0}'.format(self.MIN_COMPACT_AFTER_DAYS))
+        return self._replace(compact_after_days=self.MIN_COMPACT_AFTER_DAYS,
+                             delete_after_days=max(self.delete_after_days, self.MIN_COMPACT_AFTER_DAYS))
+
+
+class CompactionProgress():
+    '''State of a raw segment compaction spread over many calls, see UsageJournal.compact'''
+
+    def __init__(self, path: PosixPath, resolution: float) -> None:
+        self.path = path
+        self.resolution = resolution
+        # Number of records already read
+        self.records = 0
+        # (uuid, reservation id, bucket index) -> [user id, [sum, count] of utilization, mem_util, power, max mem_used]
+        self.buckets = {}  # type: Dict[Tuple[str, int, int], List]
+
+
+class UsageJournal():
+    '''
+    Append-only binary log of GPU usage samples, split into daily segment files (e.g. usage-2020-01-31.bin).
+
+    Each segment starts with a small header (magic + record size) followed by fixed-width records:
+    timestamp (double), GPU UUID (40 bytes), reservation id, user id (int32, 0 if unknown),
+    utilization, mem_util, mem_used, power (float32, NaN if unavailable).
+
+    Appending costs O(1) regardless of how long reservation lasts, reading is a single streaming pass.
+    A record truncated by a crash is skipped by readers and cut off when the segment is opened for appending,
+    so that new records stay aligned. Reading stops at the first record which can't be decoded.
+
+    Old segments are compacted into archives (archive-2020-01-31.bin, same format, one averaged record
+    per GPU and reservation every few minutes) and eventually deleted, see `maintain`.
+    '''
+    RECORD = struct.Struct('<d40siiffff')
+    MAGIC = b'THUJ'
+    HEADER = struct.Struct('<4sI')
+    SEGMENT_PREFIX = 'usage-'
+    ARCHIVE_PREFIX = 'archive-'
+    SEGMENT_SUFFIX = '.bin'
+    # How many records are read from disk at once
+    read_chunk_records = 4096
+
+    def __init__(self, directory: PosixPath, fsync_interval: float = 10.0) -> None:
+        self.directory = PosixPath(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._file_day = None  # type: Optional[datetime.date]
+        self._last_fsync = time.monotonic()
+        self._compaction = None  # type: Optional[CompactionProgress]
+
+    @classmethod
+    def segment_name(cls, day: datetime.date, prefix: str = SEGMENT_PREFIX) -> str:
+        return '{}{}{}'.format(prefix, day.isoformat(), cls.SEGMENT_SUFFIX)
+
+    @classmethod
+    def segment_day(cls, path: PosixPath) -> Optional[datetime.date]:
+        for prefix in [cls.SEGMENT_PREFIX, cls.ARCHIVE_PREFIX]:
+            if path.name.startswith(prefix):
+                try:
+                    return datetime.datetime.strptime(
+                        path.name[len(prefix):-len(cls.SEGMENT_SUFFIX)], '%Y-%m-%d').date()
+                except ValueError:
+                    return None
+        return None
+
+    @classmethod
+    def is_archive(cls, path: PosixPath) -> bool:
+        return path.name.startswith(cls.ARCHIVE_PREFIX)
+
+    def _all_segments(self) -> List[Tuple[datetime.date, PosixPath]]:
+        '''
+        (day, path) of raw segments and archives, oldest first.
+        If compaction has been interrupted and both exist for the same day, raw segment wins.
+        '''
+        by_day = {}  # type: Dict[datetime.date, PosixPath]
+        for prefix in [self.ARCHIVE_PREFIX, self.SEGMENT_PREFIX]:
+            for path in self.directory.glob('{}*{}'.format(prefix, self.SEGMENT_SUFFIX)):
+                day = self.segment_day(path)
+                if day is not None:
+                    by_day[day] = path
+        return sorted(by_day.items())
+
+    def segments(self, start: Optional[float] = None, end: Optional[float] = None) -> List[PosixPath]:
+        '''Returns segment files (raw or archived) which may contain records from given time range, oldest first'''
+        first_day = datetime.datetime.utcfromtimestamp(start).date() if start is not None else datetime.date.min
+        last_day = datetime.datetime.utcfromtimestamp(end).date() if end is not None else datetime.date.max
+        return [path for day, path in self._all_segments() if first_day <= day <= last_day]
+
+    @classmethod
+    def pack(cls, record: UsageRecord) -> bytes:
+        def number(value):
+            return float('nan') if value is None else float(value)
+
+        return cls.RECORD.pack(record.timestamp, record.uuid.encode('ascii')[:40],
+                               record.reservation_id or 0, record.user_id or 0,
+                               number(record.utilization), number(record.mem_util),
+                               number(record.mem_used), number(record.power))
+
+    @classmethod
+    def unpack(cls, fields) -> UsageRecord:
+        timestamp, uuid, reservation_id, user_id, utilization, mem_util, mem_used, power = fields
+        return UsageRecord(timestamp, uuid.rstrip(b'\x00').decode('ascii'), reservation_id, user_id,
+                           utilization, mem_util, mem_used, power)
+
+    def _segment_file(self, day: datetime.date):
+        if self._file_day != day:
+            self.close()
+            path = self.directory / self.segment_name(day)
+            self._file = path.open(mode='ab')
+            size = self._file.tell()
+            aligned_size = size - (size - self.HEADER.size) % self.RECORD.size if size >= self.HEADER.size else 0
+            if aligned_size != size:
+                log.warning('Cutting off {} bytes of a truncated record at the end of {}'.format(
+                    size - aligned_size, path))
+                self._file.truncate(aligned_size)
+            if aligned_size == 0:
+                self._file.write(self.HEADER.pack(self.MAGIC, self.RECORD.size))
+            self._file_day = day
+        return self._file
+
+    def append(self, records: Iterable[UsageRecord]) -> int:
+        '''
+        Writes records in a single write call (per segment), returns the number of written records.
+        Data is flushed immediately, but fsync happens at most once per fsync_interval.
+        '''
+        by_day = {}  # type: dict
+        for record in records:
+            day = datetime.datetime.utcfromtimestamp(record.timestamp).date()
+            by_day.setdefault(day, []).append(self.pack(record))
+
+        for day in sorted(by_day):
+            file = self._segment_file(day)
+            file.write(b''.join(by_day[day]))
+            file.flush()
+
+        if self._file is not None and time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self.sync()
+        return sum(len(packed) for packed in by_day.values())
+
+    def sync(self) -> None:
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        self._file = None
+        self._file_day = None
+
+    def read_segment(self, path: PosixPath, skip: int = 0) -> Iterator[UsageRecord]:
+        '''Streams records of a single segment, starting after `skip` first records'''
+        with path.open(mode='rb') as file:
+            header = file.read(self.HEADER.size)
+            if len(header) < self.HEADER.size:
+                return
+            magic, record_size = self.HEADER.unpack(header)
+            if magic != self.MAGIC or record_size != self.RECORD.size:
+                log.warning('Skipping {}, it is not a usage journal segment in supported format'.format(path))
+                return
+            if skip:
+                file.seek(skip * record_size, os.SEEK_CUR)
+
+            chunk_size = self.read_chunk_records * record_size
+            while True:
+                chunk = file.read(chunk_size)
+                usable = len(chunk) - len(chunk) % record_size
+                for fields in self.RECORD.iter_unpack(chunk[:usable]):
+                    try:
+                        record = self.unpack(fields)
+                    except ValueError:
+                        # Including UnicodeDecodeError, records after a corrupted one can't be trusted either
+                        log.warning('Corrupted record found in {}, skipping the rest of it'.format(path))
+                        return
+                    yield record
+                if len(chunk) < chunk_size:
+                    if usable != len(chunk):
+                        log.warning('Truncated record found at the end of {}'.format(path))
+                    return
+
+    def read(self, start: Optional[float] = None, end: Optional[float] = None,
+             reservation_ids: Optional[Set[int]] = None,
+             uuids: Optional[Set[str]] = None,
+             user_ids: Optional[Set[int]] = None) -> Iterator[UsageRecord]:
+        '''Streams records matching given criteria, memory usage does not depend on the amount of data'''
+        if self._file is not None:
+            self._file.flush()
+        for path in self.segments(start, end):
+            for record in self.read_segment(path):
+                if start is not None and record.timestamp < start:
+                    continue
+                if end is not None and record.timestamp > end:
+                    continue
+                if reservation_ids is not None and record.reservation_id not in reservation_ids:
+                    continue
+                if uuids is not None and record.uuid not in uuids:
+                    continue
+                if user_ids is not None and record.user_id not in user_ids:
+                    continue
+                yield record
+
+    def compact(self, path: PosixPath, resolution: float, max_bytes: Optional[int] = None) -> Optional[PosixPath]:
+        '''
+        Downsamples raw segment into an archive: one record per (GPU, reservation, `resolution` seconds),
+        with averaged utilization, mem_util and power, and peak mem_used. Raw segment is removed afterwards.
+
+        With `max_bytes`, at most that many bytes of records are read in a single call: progress is kept
+        in memory and None is returned until a subsequent call with the same segment writes the archive.
+        '''
+        progress = self._compaction
+        if progress is None or progress.path != path or progress.resolution != resolution:
+            log.info('Compacting usage journal segment {}'.format(path.name))
+            progress = self._compaction = CompactionProgress(path, resolution)
+        budget = max(max_bytes // self.RECORD.size, 1) if max_bytes is not None else None
+        buckets = progress.buckets
+        read = 0
+        for record in self.read_segment(path, skip=progress.records):
+            if budget is not None and read >= budget:
+                progress.records += read
+                return None
+            read += 1
+            key = (record.uuid, record.reservation_id, int(record.timestamp // resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [record.user_id, [0.0, 0], [0.0, 0], [0.0, 0], None]
+            for position, value in [(1, record.utilization), (2, record.mem_util), (3, record.power)]:
+                if not is_missing(value):
+                    bucket[position][0] += value
+                    bucket[position][1] += 1
+            if not is_missing(record.mem_used):
+                bucket[4] = record.mem_used if bucket[4] is None else max(bucket[4], record.mem_used)
+        self._compaction = None
+
+        def average(total_and_count) -> float:
+            total, count = total_and_count
+            return total / count if count else float('nan')
+
+        archive = path.with_name(self.segment_name(self.segment_day(path), prefix=self.ARCHIVE_PREFIX))
+        temporary = archive.with_name('.' + archive.name)
+        with temporary.open(mode='wb') as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.RECORD.size))
+            file.write(b''.join(
+                self.pack(UsageRecord(bucket_index * resolution, uuid, reservation_id, user_id, average(utilization),
+                                      average(mem_util), mem_used, average(power)))
+                for (uuid, reservation_id, bucket_index), (user_id, utilization, mem_util, power, mem_used)
+                in sorted(buckets.items(), key=lambda item: item[0][2])))
+            file.flush()
+            os.fsync(file.fileno())
+        temporary.rename(archive)
+        path.unlink()
+        return archive
+
+    def maintain(self, policy: RetentionPolicy, today: Optional[datetime.date] = None,
+                 max_operations: int = 1, max_compacted_bytes: Optional[int] = None) -> int:
+        '''
+        Applies retention policy, doing at most `max_operations` compactions or deletions and reading
+        at most `max_compacted_bytes` of raw samples to compact, so that I/O per call stays bounded
+        (remaining work, including a partially compacted segment, is done by subsequent calls).
+        Current segment is never touched. Returns the number of completed operations.
+        '''
+        today = today or datetime.datetime.utcnow().date()
+        segments = [(day, path) for day, path in self._all_segments() if day < today]
+        operations = 0
+
+        for day, path in segments:
+            if operations >= max_operations:
+                return operations
+            age = (today - day).days
+            if age > policy.delete_after_days:
+                log.info('Removing usage journal segment {} (retention: {} days)'.format(
+                    path.name, policy.delete_after_days))
+                path.unlink()
+                operations += 1
+            elif age > policy.compact_after_days and not self.is_archive(path):
+                if self.compact(path, policy.archive_resolution, max_bytes=max_compacted_bytes) is None:
+                    return operations
+                operations += 1
+
+        if policy.max_bytes:
+            segments = self._all_segments()
+            total = sum(path.stat().st_size for _, path in segments)
+            for day, path in segments:
+                if total <= policy.max_bytes or operations >= max_operations or day >= today:
+                    break
+                log.warning('Usage journal exceeds {} bytes, removing {}'.format(policy.max_bytes, path.name))
+                total -= path.stat().st_size
+                path.unlink()
+                operations += 1
+        return operations
+
+
+def is_missing(value: Optional[float]) -> bool:
+    return value is None or math.isnan(value)
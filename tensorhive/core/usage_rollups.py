@@ -0,0 +1,160 @@
+from sqlalchemy.exc import SQLAlchemyError
+from tensorhive.core.usage_journal import UsageRecord, is_missing
+from tensorhive.database import db_session
+from tensorhive.models.Group import User2Group
+from tensorhive.models.UsageRollup import UsageRollup
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import datetime
+import logging
+log = logging.getLogger(__name__)
+
+# (scope, granularity, key, bucket_start)
+RollupKey = Tuple[str, str, str, datetime.datetime]
+
+
+class RollupDelta():
+    '''Increment of a single rollup bucket, gathered in memory'''
+    __slots__ = ['samples', 'utilization_sum', 'utilization_max', 'mem_util_samples', 'mem_util_sum',
+                 'mem_used_max', 'power_samples', 'power_sum']
+
+    def __init__(self) -> None:
+        self.samples = 0
+        self.utilization_sum = 0.0
+        self.utilization_max = None  # type: Optional[float]
+        self.mem_util_samples = 0
+        self.mem_util_sum = 0.0
+        self.mem_used_max = None  # type: Optional[float]
+        self.power_samples = 0
+        self.power_sum = 0.0
+
+    def add(self, record: UsageRecord) -> None:
+        if not is_missing(record.utilization):
+            self.samples += 1
+            self.utilization_sum += record.utilization
+            self.utilization_max = max_of(self.utilization_max, record.utilization)
+        if not is_missing(record.mem_util):
+            self.mem_util_samples += 1
+            self.mem_util_sum += record.mem_util
+        if not is_missing(record.mem_used):
+            self.mem_used_max = max_of(self.mem_used_max, record.mem_used)
+        if not is_missing(record.power):
+            self.power_samples += 1
+            self.power_sum += record.power
+
+    def apply_to(self, rollup: UsageRollup) -> None:
+        rollup.samples = (rollup.samples or 0) + self.samples
+        rollup.utilization_sum = (rollup.utilization_sum or 0.0) + self.utilization_sum
+        rollup.utilization_max = max_of(rollup.utilization_max, self.utilization_max)
+        rollup.mem_util_samples = (rollup.mem_util_samples or 0) + self.mem_util_samples
+        rollup.mem_util_sum = (rollup.mem_util_sum or 0.0) + self.mem_util_sum
+        rollup.mem_used_max = max_of(rollup.mem_used_max, self.mem_used_max)
+        rollup.power_samples = (rollup.power_samples or 0) + self.power_samples
+        rollup.power_sum = (rollup.power_sum or 0.0) + self.power_sum
+
+
+def max_of(current: Optional[float], value: Optional[float]) -> Optional[float]:
+    if value is None:
+        return current
+    return value if current is None else max(current, value)
+
+
+class UsageRollupWriter():
+    '''
+    Incrementally maintains UsageRollup buckets (hourly and daily; per GPU, host, user and group).
+
+    Samples are folded into in-memory deltas by `add`, `flush` writes all of them
+    in a single transaction, reading existing buckets with one query per (granularity, bucket).
+    Buckets past their retention are removed by `remove_expired`.
+    '''
+
+    def __init__(self, granularities: Optional[List[str]] = None) -> None:
+        self.granularities = granularities or list(UsageRollup.GRANULARITIES)
+        self.pending = {}  # type: Dict[RollupKey, RollupDelta]
+
+    @staticmethod
+    def group_ids_by_user(user_ids: Set[int]) -> Dict[int, List[int]]:
+        result = {}  # type: Dict[int, List[int]]
+        if user_ids:
+            memberships = db_session.query(User2Group.user_id, User2Group.group_id) \
+                .filter(User2Group.user_id.in_(user_ids)).all()
+            for user_id, group_id in memberships:
+                result.setdefault(user_id, []).append(group_id)
+        return result
+
+    def add(self, records: Iterable[Tuple[UsageRecord, Optional[str]]]) -> None:
+        '''
+        Accepts (record, hostname of record's GPU) pairs. Records without user (samples of GPUs
+        which are not reserved) count only in GPU and host rollups.
+        '''
+        records = list(records)
+        groups = self.group_ids_by_user({record.user_id for record, _ in records if record.user_id})
+        for record, hostname in records:
+            keys = [('gpu', record.uuid)]
+            if hostname:
+                keys.append(('host', hostname))
+            if record.user_id:
+                keys.append(('user', str(record.user_id)))
+                keys.extend(('group', str(group_id)) for group_id in groups.get(record.user_id, []))
+
+            for granularity in self.granularities:
+                bucket_start = UsageRollup.bucket_of(granularity, record.timestamp)
+                for scope, key in keys:
+                    rollup_key = (scope, granularity, key, bucket_start)
+                    delta = self.pending.get(rollup_key)
+                    if delta is None:
+                        delta = self.pending[rollup_key] = RollupDelta()
+                    delta.add(record)
+
+    def flush(self) -> int:
+        '''Writes pending deltas, returns number of affected buckets. Deltas are kept if writing fails.'''
+        if not self.pending:
+            return 0
+        by_bucket = {}  # type: Dict[Tuple[str, datetime.datetime], Dict[Tuple[str, str], RollupDelta]]
+        for (scope, granularity, key, bucket_start), delta in self.pending.items():
+            by_bucket.setdefault((granularity, bucket_start), {})[(scope, key)] = delta
+
+        try:
+            for (granularity, bucket_start), deltas in by_bucket.items():
+                existing = UsageRollup.query.filter(UsageRollup.granularity == granularity,
+                                                    UsageRollup.bucket_start == bucket_start).all()
+                rollups = {(rollup.scope, rollup.key): rollup for rollup in existing}
+                for (scope, key), delta in deltas.items():
+                    rollup = rollups.get((scope, key))
+                    if rollup is None:
+                        rollup = UsageRollup(scope=scope, granularity=granularity, key=key,
+                                             bucket_start=bucket_start)
+                        db_session.add(rollup)
+                    delta.apply_to(rollup)
+            db_session.commit()
+        except SQLAlchemyError as e:
+            db_session.rollback()
+            log.error('Unable to write usage rollups: {}'.format(e))
+            return 0
+
+        written = len(self.pending)
+        self.pending = {}
+        return written
+
+    @staticmethod
+    def remove_expired(retention_days: Dict[str, float], now: Optional[datetime.datetime] = None) -> int:
+        '''
+        Removes buckets which ended more than given number of days (by granularity, 0 means forever) ago.
+        Returns number of removed buckets.
+        '''
+        now = now or datetime.datetime.utcnow()
+        removed = 0
+        try:
+            for granularity, days in retention_days.items():
+                if not days:
+                    continue
+                length = datetime.timedelta(seconds=UsageRollup.GRANULARITIES[granularity])
+                threshold = now - datetime.timedelta(days=days) - length
+                removed += UsageRollup.query.filter(UsageRollup.granularity == granularity,
+                                                    UsageRollup.bucket_start < threshold) \
+                    .delete(synchronize_session=False)
+            db_session.commit()
+        except SQLAlchemyError as e:
+            db_session.rollback()
+            log.error('Unable to remove expired usage rollups: {}'.format(e))
+            return 0
+        return removed
@@ -0,0 +1,87 @@
+from array import array
+from typing import Optional
+from tensorhive.core.usage_journal import UsageRecord, is_missing
+import math
+
+
+class StreamingStats():
+    '''
+    Running aggregates of a metric: count, sum, min, max and (for percentage metrics, 0-100)
+    a histogram with 1% wide bins.
+
+    nvidia-smi reports utilization as integers, so percentiles read from the histogram are exact,
+    while memory usage is constant (~400 bytes) no matter how many samples have been added.
+    '''
+    __slots__ = ['count', 'total', 'minimum', 'maximum', 'histogram']
+    BINS = 101
+
+    def __init__(self, with_histogram: bool = True) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None  # type: Optional[float]
+        self.maximum = None  # type: Optional[float]
+        self.histogram = array('I', [0]) * self.BINS if with_histogram else None
+
+    def add(self, value: Optional[float]) -> None:
+        if is_missing(value):
+            return
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        if self.histogram is not None:
+            self.histogram[min(max(int(round(value)), 0), self.BINS - 1)] += 1
+
+    @property
+    def average(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def percentile(self, q: float) -> Optional[float]:
+        '''Nearest-rank percentile, q in range [0, 100]'''
+        if not self.count or self.histogram is None:
+            return None
+        rank = max(int(math.ceil(q / 100 * self.count)), 1)
+        seen = 0
+        for value, occurrences in enumerate(self.histogram):
+            seen += occurrences
+            if seen >= rank:
+                return float(value)
+        return self.maximum
+
+    def fraction_below(self, threshold: float) -> Optional[float]:
+        '''Fraction of samples with value lower than threshold'''
+        if not self.count or self.histogram is None:
+            return None
+        below = sum(self.histogram[:min(max(int(math.ceil(threshold)), 0), self.BINS)])
+        return below / self.count
+
+
+class ReservationUsage():
+    '''Aggregates of all samples gathered for a single reservation, updated as samples arrive'''
+    __slots__ = ['reservation_id', 'utilization', 'mem_util', 'mem_used', 'power', 'energy', 'last_timestamp']
+    # Longer gaps between samples (e.g. TensorHive was down) are not taken into account in energy estimate
+    max_sample_gap = 5 * 60
+
+    def __init__(self, reservation_id: int) -> None:
+        self.reservation_id = reservation_id
+        self.utilization = StreamingStats()
+        self.mem_util = StreamingStats()
+        self.mem_used = StreamingStats(with_histogram=False)
+        self.power = StreamingStats(with_histogram=False)
+        # Joules, power integrated over time
+        self.energy = 0.0
+        self.last_timestamp = None  # type: Optional[float]
+
+    def add(self, record: UsageRecord) -> None:
+        self.utilization.add(record.utilization)
+        self.mem_util.add(record.mem_util)
+        self.mem_used.add(record.mem_used)
+        if not is_missing(record.power):
+            self.power.add(record.power)
+            if self.last_timestamp is not None and 0 < record.timestamp - self.last_timestamp <= self.max_sample_gap:
+                self.energy += record.power * (record.timestamp - self.last_timestamp)
+            self.last_timestamp = record.timestamp
+
+    @property
+    def energy_wh(self) -> float:
+        return self.energy / 3600
@@ -0,0 +1,183 @@
+from typing import Dict, List, Optional, Tuple, Any
+import gzip
+import json
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MetricsSerializer():
+    '''
+    Converts metric data kept by InfrastructureManager into the compact (columnar) representation
+    and encodes it according to what the API client accepts.
+
+    Verbose representation (default), repeated for every GPU and every metric:
+    {
+        '<GPU0_UUID>': {'name': 'GeForce GTX 1060', 'index': 0, 'metrics': {'fan_speed': {'value': 31, 'unit': '%'}}},
+        '<GPU1_UUID>': {'name': 'GeForce GTX 1060', 'index': 1, 'metrics': {'fan_speed': {'value': 32, 'unit': '%'}}}
+    }
+
+    Compact representation, units are sent once and values are parallel arrays ordered by GPU index:
+    {
+        'units': {'fan_speed': '%'},
+        'uuid': ['<GPU0_UUID>', '<GPU1_UUID>'],
+        'name': ['GeForce GTX 1060', 'GeForce GTX 1060'],
+        'index': [0, 1],
+        'metrics': {'fan_speed': [31, 32]}
+    }
+    '''
+    JSON = 'application/json'
+    COMPACT_JSON = 'application/vnd.tensorhive.compact+json'
+    MSGPACK = 'application/x-msgpack'
+    MSGPACK_ALIASES = [MSGPACK, 'application/msgpack', 'application/vnd.msgpack']
+    GZIP = 'gzip'
+    # Every negotiated response depends on these request headers, whichever representation was chosen
+    VARY = 'Accept, Accept-Encoding'
+
+    # Payloads smaller than this are not worth compressing
+    min_gzip_size = 512
+
+    @staticmethod
+    def _sorted_by_index(resources: Dict[str, Dict]) -> List[Tuple[str, Dict]]:
+        def index_of(item):
+            index = item[1].get('index')
+            return index if isinstance(index, int) else len(resources)
+        return sorted(resources.items(), key=index_of)
+
+    @classmethod
+    def compact_resources(cls, resources: Optional[Dict[str, Dict]], metric_type: str = None) -> Optional[Dict]:
+        '''
+        Transforms {uuid: {'index': ..., 'metrics': {...}, ...}} (single host, single resource type)
+        into parallel arrays. When metric_type is given, only that metric is included.
+        '''
+        if resources is None:
+            return None
+
+        ordered = cls._sorted_by_index(resources)
+        result = {
+            'units': {},
+            'uuid': [uuid for uuid, _ in ordered],
+            'index': [data.get('index') for _, data in ordered],
+            'metrics': {}
+        }  # type: Dict[str, Any]
+        if any('name' in data for _, data in ordered):
+            result['name'] = [data.get('name') for _, data in ordered]
+        if any('processes' in data for _, data in ordered):
+            result['processes'] = [data.get('processes') for _, data in ordered]
+
+        for position, (_, data) in enumerate(ordered):
+            metrics = data.get('metrics') or {}
+            for metric_name, metric in metrics.items():
+                if metric_type is not None and metric_name != metric_type:
+                    continue
+                if metric_name not in result['metrics']:
+                    # Metric might be missing on the preceding resources, fill the gaps with null
+                    result['metrics'][metric_name] = [None] * len(ordered)
+                if isinstance(metric, dict):
+                    result['metrics'][metric_name][position] = metric.get('value')
+                    if metric.get('unit') is not None:
+                        result['units'].setdefault(metric_name, metric['unit'])
+                else:
+                    result['metrics'][metric_name][position] = metric
+        return result
+
+    @classmethod
+    def compact_infrastructure(cls, infrastructure: Dict[str, Dict]) -> Dict:
+        '''
+        Example result:
+        {
+            'units': {'GPU': {'fan_speed': '%', ...}, 'CPU': {'utilization': '%', ...}},
+            'nodes': {
+                'example_host_0': {
+                    'GPU': {'uuid': [...], 'name': [...], 'index': [...], 'metrics': {'fan_speed': [...], ...}},
+                    'CPU': {'uuid': [...], 'index': [...], 'metrics': {'utilization': [...], ...}}
+                },
+                ...
+            }
+        }
+        '''
+        units = {}  # type: Dict[str, Dict[str, str]]
+        nodes = {}  # type: Dict[str, Dict]
+        for hostname, node_data in infrastructure.items():
+            nodes[hostname] = {}
+            for resource_type, resources in node_data.items():
+                compacted = cls.compact_resources(resources)
+                if compacted is not None:
+                    resource_units = units.setdefault(resource_type, {})
+                    for metric_name, unit in compacted.pop('units').items():
+                        resource_units.setdefault(metric_name, unit)
+                nodes[hostname][resource_type] = compacted
+        return {'units': units, 'nodes': nodes}
+
+    # Media ranges which let the server pick verbose JSON
+    JSON_RANGES = [JSON, 'application/*', '*/*']
+
+    @staticmethod
+    def _preferences(header: Optional[str]) -> Dict[str, float]:
+        '''Parses Accept-like header into {value: quality}, e.g. 'gzip;q=0.5, br' -> {'gzip': 0.5, 'br': 1.0}'''
+        result = {}  # type: Dict[str, float]
+        for item in (header or '').split(','):
+            value, *parameters = [part.strip() for part in item.split(';')]
+            if not value:
+                continue
+            quality = 1.0
+            for parameter in parameters:
+                name, _, raw_quality = parameter.partition('=')
+                if name.strip().lower() == 'q':
+                    try:
+                        quality = float(raw_quality)
+                    except ValueError:
+                        quality = 0.0
+            result[value.lower()] = quality
+        return result
+
+    @classmethod
+    def _accepted(cls, header: Optional[str]) -> List[List[str]]:
+        '''Values accepted by the client (quality above 0), grouped by quality, from the most preferred'''
+        groups = {}  # type: Dict[float, List[str]]
+        for value, quality in cls._preferences(header).items():
+            if quality > 0:
+                groups.setdefault(quality, []).append(value)
+        return [groups[quality] for quality in sorted(groups, reverse=True)]
+
+    @classmethod
+    def negotiate(cls, accept: Optional[str]) -> str:
+        '''
+        Returns the response media type preferred by the client.
+        When preferred equally, compact representations win over verbose JSON.
+        '''
+        for media_types in cls._accepted(accept):
+            if any(media_type in cls.MSGPACK_ALIASES for media_type in media_types):
+                if msgpack is not None:
+                    return cls.MSGPACK
+                log.warning('MessagePack requested, but msgpack is not installed, falling back to JSON')
+                return cls.COMPACT_JSON
+            if cls.COMPACT_JSON in media_types:
+                return cls.COMPACT_JSON
+            if any(media_type in cls.JSON_RANGES for media_type in media_types):
+                return cls.JSON
+        return cls.JSON
+
+    @classmethod
+    def gzip_accepted(cls, accept_encoding: Optional[str]) -> bool:
+        preferences = cls._preferences(accept_encoding)
+        quality = preferences.get(cls.GZIP, preferences.get('*', 0.0))
+        return quality > 0
+
+    @classmethod
+    def encode(cls, content: Any, media_type: str, accept_encoding: Optional[str] = None) -> Tuple[bytes, Dict]:
+        '''Serializes content into bytes, returns them along with the appropriate HTTP headers'''
+        if media_type == cls.MSGPACK:
+            body = msgpack.packb(content, use_bin_type=True)
+        else:
+            body = json.dumps(content, separators=(',', ':')).encode('utf-8')
+
+        headers = {'Content-Type': media_type, 'Vary': cls.VARY}
+        if cls.gzip_accepted(accept_encoding) and len(body) >= cls.min_gzip_size:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = cls.GZIP
+        return body, headers
@@ -182,10 +182,13 @@ class NvidiaSmiParser():
 
         def minified_process_dict(original: Dict) -> Dict:
             # Returns a dict which contains only the essential keys
+            # fb - frame buffer memory used by process (MiB), present only with `pmon --select m`
+            mem_used = original.get('fb')
             return {
                 'uuid': original['uuid'],
                 'pid': original['pid'],
-                'command': original['command']
+                'command': original['command'],
+                'mem_used': mem_used if isinstance(mem_used, int) else None
             }
 
         # Parse whole stdout and split it into chunks.
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 import time
 
 
@@ -7,3 +7,8 @@ def utc2local(utc: datetime) -> datetime:
     epoch = time.mktime(utc.timetuple())
     offset = datetime.fromtimestamp(epoch) - datetime.utcfromtimestamp(epoch)
     return utc + offset
+
+
+def utc_timestamp(utc: datetime) -> float:
+    """Converts naive UTC datetime (as stored in database) to UNIX timestamp."""
+    return utc.replace(tzinfo=timezone.utc).timestamp()
@@ -7,6 +7,7 @@ from alembic import command
 from alembic.config import Config
 from alembic.migration import MigrationContext
 from alembic.script import ScriptDirectory
+from typing import Any, Callable
 import logging
 import os
 log = logging.getLogger(__name__)
@@ -23,6 +24,41 @@ Base = declarative_base()
 Base.query = db_session.query_property()
 
 
+def follow_committed_changes(name: str, table, collect: Callable[[Any, Any], None], empty: Callable[[], Any],
+                             apply: Callable[[Any], None], invalidate: Callable[[], None]) -> None:
+    '''
+    Keeps an in-memory copy of some rows (e.g. reservation index, job queue) in line with db_session:
+    after every flush `collect(session, changes)` adds what has changed to `changes` (created with `empty`),
+    these are passed to `apply` once committed and dropped on rollback.
+
+    Changes the ORM doesn't see, i.e. rows removed by the database (ON DELETE CASCADE) when a user is deleted
+    and `table` being created or dropped, call `invalidate` instead.
+    '''
+    changes_key, invalidated_key = name + '_changes', name + '_invalidated'
+
+    @event.listens_for(db_session, 'after_flush')
+    def _collect_changes(session, flush_context):
+        collect(session, session.info.setdefault(changes_key, empty()))
+        if any(getattr(instance, '__tablename__', None) == 'users' for instance in session.deleted):
+            session.info[invalidated_key] = True
+
+    @event.listens_for(db_session, 'after_commit')
+    def _apply_changes(session):
+        if session.info.pop(invalidated_key, False):
+            invalidate()
+        apply(session.info.pop(changes_key, empty()))
+
+    @event.listens_for(db_session, 'after_rollback')
+    def _discard_changes(session):
+        session.info.pop(changes_key, None)
+        session.info.pop(invalidated_key, None)
+
+    @event.listens_for(table, 'after_create')
+    @event.listens_for(table, 'after_drop')
+    def _reload(target, connection, **kwargs):
+        invalidate()
+
+
 def check_if_db_exists() -> bool:
     return database_exists(DB.SQLALCHEMY_DATABASE_URI)
 
@@ -41,6 +77,10 @@ def _import_models() -> None:
     from tensorhive.models.Task import Task
     from tensorhive.models.Job import Job
     from tensorhive.models.CommandSegment import CommandSegment, CommandSegment2Task
+    from tensorhive.models.ReservationUsageSummary import ReservationUsageSummary
+    from tensorhive.models.UsageRollup import UsageRollup
+    from tensorhive.models.GPUProcessSession import GPUProcessSession
+    from tensorhive.models.JobRun import JobRun
 
 
 def initialize_db(alembic_config) -> None:
@@ -19,6 +19,10 @@ from tensorhive.models.Role import Role
 from tensorhive.models.Task import Task
 from tensorhive.models.Job import Job
 from tensorhive.models.CommandSegment import CommandSegment, CommandSegment2Task
+from tensorhive.models.ReservationUsageSummary import ReservationUsageSummary
+from tensorhive.models.UsageRollup import UsageRollup
+from tensorhive.models.GPUProcessSession import GPUProcessSession
+from tensorhive.models.JobRun import JobRun
 target_metadata = Base.metadata
 
 # Configuration
@@ -0,0 +1,55 @@
+"""create reservation_usage_summaries table
+
+Revision ID: 3c9f1e2ab7d4
+Revises: 0a7b011e7b39
+Create Date: 2026-10-19 10:12:31.427115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9f1e2ab7d4'
+down_revision = '0a7b011e7b39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'reservation_usage_summaries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('reservation_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('resource_id', sa.String(length=60), nullable=False),
+        sa.Column('start', sa.DateTime(), nullable=False),
+        sa.Column('end', sa.DateTime(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('gpu_util_avg', sa.Float(), nullable=True),
+        sa.Column('gpu_util_p50', sa.Float(), nullable=True),
+        sa.Column('gpu_util_p95', sa.Float(), nullable=True),
+        sa.Column('mem_util_avg', sa.Float(), nullable=True),
+        sa.Column('idle_fraction', sa.Float(), nullable=True),
+        sa.Column('idle_hours', sa.Float(), nullable=True),
+        sa.Column('mem_used_peak', sa.Float(), nullable=True),
+        sa.Column('power_avg', sa.Float(), nullable=True),
+        sa.Column('energy_wh', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['reservation_id'], ['reservations.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('reservation_id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_usage_summaries_start_user', 'reservation_usage_summaries',
+                    ['start', 'user_id', 'idle_hours'])
+    op.create_index('ix_usage_summaries_user_start', 'reservation_usage_summaries', ['user_id', 'start'])
+    op.create_index('ix_usage_summaries_resource_start', 'reservation_usage_summaries', ['resource_id', 'start'])
+
+
+def downgrade():
+    op.drop_index('ix_usage_summaries_resource_start', table_name='reservation_usage_summaries')
+    op.drop_index('ix_usage_summaries_user_start', table_name='reservation_usage_summaries')
+    op.drop_index('ix_usage_summaries_start_user', table_name='reservation_usage_summaries')
+    op.drop_table('reservation_usage_summaries')
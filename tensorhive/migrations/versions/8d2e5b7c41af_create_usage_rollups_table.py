@@ -0,0 +1,46 @@
+"""create usage_rollups table
+
+Revision ID: 8d2e5b7c41af
+Revises: 3c9f1e2ab7d4
+Create Date: 2026-10-19 13:40:05.118342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e5b7c41af'
+down_revision = '3c9f1e2ab7d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'usage_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=8), nullable=False),
+        sa.Column('granularity', sa.String(length=8), nullable=False),
+        sa.Column('key', sa.String(length=60), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('utilization_sum', sa.Float(), nullable=False),
+        sa.Column('utilization_max', sa.Float(), nullable=True),
+        sa.Column('mem_util_samples', sa.Integer(), nullable=False),
+        sa.Column('mem_util_sum', sa.Float(), nullable=False),
+        sa.Column('mem_used_max', sa.Float(), nullable=True),
+        sa.Column('power_samples', sa.Integer(), nullable=False),
+        sa.Column('power_sum', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_usage_rollups_bucket', 'usage_rollups', ['scope', 'granularity', 'key', 'bucket_start'],
+                    unique=True)
+    op.create_index('ix_usage_rollups_range', 'usage_rollups', ['scope', 'granularity', 'bucket_start'])
+
+
+def downgrade():
+    op.drop_index('ix_usage_rollups_range', table_name='usage_rollups')
+    op.drop_index('ix_usage_rollups_bucket', table_name='usage_rollups')
+    op.drop_table('usage_rollups')
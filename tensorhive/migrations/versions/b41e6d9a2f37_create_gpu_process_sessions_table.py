@@ -0,0 +1,45 @@
+"""create gpu_process_sessions table
+
+Revision ID: b41e6d9a2f37
+Revises: 8d2e5b7c41af
+Create Date: 2026-10-19 15:12:47.520931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41e6d9a2f37'
+down_revision = '8d2e5b7c41af'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'gpu_process_sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hostname', sa.String(length=64), nullable=False),
+        sa.Column('gpu_uuid', sa.String(length=64), nullable=False),
+        sa.Column('pid', sa.Integer(), nullable=False),
+        sa.Column('owner', sa.String(length=40), nullable=True),
+        sa.Column('command', sa.String(length=100), nullable=True),
+        sa.Column('first_seen', sa.DateTime(), nullable=False),
+        sa.Column('last_seen', sa.DateTime(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('mem_used_avg', sa.Float(), nullable=True),
+        sa.Column('mem_used_max', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_gpu_process_sessions_time', 'gpu_process_sessions', ['first_seen', 'last_seen'])
+    op.create_index('ix_gpu_process_sessions_owner', 'gpu_process_sessions', ['owner', 'first_seen'])
+    op.create_index('ix_gpu_process_sessions_gpu', 'gpu_process_sessions', ['gpu_uuid', 'first_seen'])
+
+
+def downgrade():
+    op.drop_index('ix_gpu_process_sessions_gpu', table_name='gpu_process_sessions')
+    op.drop_index('ix_gpu_process_sessions_owner', table_name='gpu_process_sessions')
+    op.drop_index('ix_gpu_process_sessions_time', table_name='gpu_process_sessions')
+    op.drop_table('gpu_process_sessions')
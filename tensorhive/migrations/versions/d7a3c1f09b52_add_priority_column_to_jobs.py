@@ -0,0 +1,26 @@
+"""add priority column to jobs
+
+Revision ID: d7a3c1f09b52
+Revises: b41e6d9a2f37
+Create Date: 2026-10-19 16:04:11.284517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3c1f09b52'
+down_revision = 'b41e6d9a2f37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.add_column(sa.Column('priority', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.drop_column('priority')
@@ -0,0 +1,31 @@
+"""add placement columns to tasks
+
+Revision ID: e2f84a6c0d19
+Revises: d7a3c1f09b52
+Create Date: 2026-10-19 16:51:36.904127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f84a6c0d19'
+down_revision = 'd7a3c1f09b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.add_column(sa.Column('placement', sa.Enum('pinned', 'host', 'any', name='taskplacement'),
+                                      server_default='pinned', nullable=False))
+        batch_op.add_column(sa.Column('gpu_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('gpu_uuids', sa.String(length=400), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('gpu_uuids')
+        batch_op.drop_column('gpu_count')
+        batch_op.drop_column('placement')
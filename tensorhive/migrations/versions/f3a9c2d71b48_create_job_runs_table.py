@@ -0,0 +1,42 @@
+"""create job_runs table
+
+Revision ID: f3a9c2d71b48
+Revises: e2f84a6c0d19
+Create Date: 2026-10-19 18:02:14.631870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c2d71b48'
+down_revision = 'e2f84a6c0d19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('command_key', sa.String(length=40), nullable=False),
+        sa.Column('gpu_count', sa.Integer(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('interrupted', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['jobs.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_job_runs_command_key', 'job_runs', ['command_key', 'finished_at'])
+    op.create_index('ix_job_runs_job', 'job_runs', ['job_id', 'finished_at'])
+
+
+def downgrade():
+    op.drop_index('ix_job_runs_job', table_name='job_runs')
+    op.drop_index('ix_job_runs_command_key', table_name='job_runs')
+    op.drop_table('job_runs')
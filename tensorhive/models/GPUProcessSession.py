@@ -0,0 +1,60 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, Index
+from tensorhive.database import db_session, Base
+from tensorhive.models.CRUDModel import CRUDModel
+from typing import Dict
+import datetime
+import logging
+log = logging.getLogger(__name__)
+
+
+class GPUProcessSession(CRUDModel, Base):  # type: ignore
+    '''
+    Lifetime of a single process on a single GPU, as observed in consecutive infrastructure snapshots
+    (see ProcessAccountant). One row per process, not per sample.
+    '''
+    __tablename__ = 'gpu_process_sessions'
+    __table_args__ = (
+        Index('ix_gpu_process_sessions_time', 'first_seen', 'last_seen'),
+        Index('ix_gpu_process_sessions_owner', 'owner', 'first_seen'),
+        Index('ix_gpu_process_sessions_gpu', 'gpu_uuid', 'first_seen'),
+        {'sqlite_autoincrement': True}
+    )
+    __public__ = ['id', 'hostname', 'gpu_uuid', 'pid', 'owner', 'command', 'first_seen', 'last_seen', 'samples',
+                  'mem_used_avg', 'mem_used_max']
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hostname = Column(String(64), nullable=False)
+    gpu_uuid = Column(String(64), nullable=False)
+    pid = Column(Integer, nullable=False)
+    # UNIX username
+    owner = Column(String(40), nullable=True)
+    command = Column(String(100), nullable=True)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+    samples = Column(Integer, nullable=False, default=1)
+    # MiB
+    mem_used_avg = Column(Float, nullable=True)
+    mem_used_max = Column(Float, nullable=True)
+
+    def check_assertions(self):
+        assert self.hostname and self.gpu_uuid, 'Process must be assigned to a GPU!'
+        assert self.first_seen <= self.last_seen, 'Process session time range is invalid!'
+
+    def __repr__(self):
+        return '<GPUProcessSession id={id}, pid={pid}, owner={owner}, gpu_uuid={gpu_uuid}>'.format(
+            id=self.id, pid=self.pid, owner=self.owner, gpu_uuid=self.gpu_uuid)
+
+    @classmethod
+    def gpu_hours_by_owner(cls, start: datetime.datetime, end: datetime.datetime) -> Dict[str, float]:
+        '''
+        Sums up time of all processes (clipped to <start, end>) per owner.
+        Each GPU a process has been using is counted separately.
+        '''
+        rows = db_session.query(cls.owner, cls.first_seen, cls.last_seen) \
+            .filter(cls.first_seen < end, cls.last_seen > start) \
+            .all()
+        result = {}  # type: Dict[str, float]
+        for owner, first_seen, last_seen in rows:
+            seconds = (min(last_seen, end) - max(first_seen, start)).total_seconds()
+            result[owner] = result.get(owner, 0.0) + seconds / 3600
+        return result
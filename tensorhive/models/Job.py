@@ -1,13 +1,15 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Text, Boolean
 from datetime import datetime, timedelta
-from tensorhive.database import Base
-from sqlalchemy.orm import relationship, backref
+from tensorhive.database import Base, follow_committed_changes
+from sqlalchemy.orm import relationship, backref, joinedload
 from sqlalchemy.ext.hybrid import hybrid_property
 from tensorhive.models.CRUDModel import CRUDModel
 from tensorhive.models.Task import Task, TaskStatus
+from tensorhive.models.JobRun import JobRun
+from tensorhive.core.job_queue import JobQueue
 from tensorhive.utils.DateUtils import DateUtils
 from tensorhive.exceptions.InvalidRequestException import InvalidRequestException
-from typing import Optional, Union, List
+from typing import Optional, Union, List, Set
 import enum
 import logging
 log = logging.getLogger(__name__)
@@ -21,10 +23,17 @@ class JobStatus(enum.Enum):
     pending = 5
 
 
+class JobPriority(enum.IntEnum):
+    '''Priority class of a queued job, respected by BackfillingScheduler'''
+    low = 0
+    normal = 1
+    high = 2
+
+
 class Job(CRUDModel, Base):  # type: ignore
     __tablename__ = 'jobs'
     __table_args__ = {'sqlite_autoincrement': True}
-    __public__ = ['id', 'name', 'description', 'user_id', 'start_at', 'stop_at']
+    __public__ = ['id', 'name', 'description', 'user_id', 'start_at', 'stop_at', 'priority']
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(40), nullable=False)
@@ -35,6 +44,8 @@ class Job(CRUDModel, Base):  # type: ignore
     _start_at = Column(DateTime)
     _stop_at = Column(DateTime)
     is_queued = Column(Boolean)
+    priority = Column(Integer, default=JobPriority.normal, server_default=str(int(JobPriority.normal)),
+                      nullable=False)
 
     _tasks = relationship(
         'Task', cascade='all, delete', back_populates="job", lazy='subquery')
@@ -50,6 +61,8 @@ class Job(CRUDModel, Base):  # type: ignore
     def check_assertions(self):
         if self.stop_at is not None and self.start_at is not None:
             assert self.stop_at >= self.start_at, 'Time of the end must happen after the start!'
+        if self.priority is not None:
+            assert self.priority in set(JobPriority), 'Unsupported job priority!'
 
     @hybrid_property
     def tasks(self):
@@ -95,6 +108,8 @@ class Job(CRUDModel, Base):  # type: ignore
 
         if status_pre is JobStatus.running and self._status is JobStatus.not_running:
             self.is_queued = False
+        if status_pre is JobStatus.running and self._status is not JobStatus.running:
+            JobRun.finish(self.id, commit=False)
 
         self.save()
 
@@ -155,3 +170,28 @@ class Job(CRUDModel, Base):  # type: ignore
     @staticmethod
     def get_jobs_running_from_queue() -> List['Job']:
         return Job.query.filter(Job.is_queued).filter(Job.status == JobStatus.running).all()
+
+    @staticmethod
+    def load_queue(session, job_ids: Optional[Set[int]] = None) -> List['Job']:
+        '''Same as get_job_queue (limited to given jobs), with tasks and owners loaded up front for JobQueue'''
+        query = session.query(Job).options(joinedload(Job.user)) \
+            .filter(Job.is_queued).filter(Job.status != JobStatus.running)
+        if job_ids is not None:
+            query = query.filter(Job.id.in_(job_ids))
+        return query.all()
+
+
+# Queued jobs kept in memory for the scheduler, see `JobSchedulingService.execute_queued`
+Job.queue = JobQueue(loader=Job.load_queue)
+
+
+def _collect_job_changes(session, changed):
+    for instance in session.new | session.dirty | session.deleted:
+        if isinstance(instance, Job):
+            changed.add(instance.id)
+        elif isinstance(instance, Task) and instance.job_id is not None:
+            changed.add(instance.job_id)
+
+
+follow_committed_changes('job_queue', Job.__table__, collect=_collect_job_changes, empty=set,
+                         apply=Job.queue.mark_changed, invalidate=Job.queue.invalidate)
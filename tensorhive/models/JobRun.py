@@ -0,0 +1,85 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, update
+from tensorhive.database import db_session, Base
+from tensorhive.models.CRUDModel import CRUDModel
+from typing import Iterable, List, Optional
+import datetime
+import hashlib
+import logging
+log = logging.getLogger(__name__)
+
+
+class JobRun(CRUDModel, Base):  # type: ignore
+    '''
+    One execution of a job: from successful spawn of its tasks until job is no longer running.
+    Kept after the job is deleted, so that runtime estimates (see RuntimeEstimator) can learn from it.
+    '''
+    __tablename__ = 'job_runs'
+    __table_args__ = (
+        Index('ix_job_runs_command_key', 'command_key', 'finished_at'),
+        Index('ix_job_runs_job', 'job_id', 'finished_at'),
+        {'sqlite_autoincrement': True}
+    )
+    __public__ = ['id', 'job_id', 'user_id', 'command_key', 'gpu_count', 'started_at', 'finished_at', 'interrupted']
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(Integer, ForeignKey('jobs.id', ondelete='SET NULL'), nullable=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    # Hash of job's commands without parameters and env variables, see `command_key_of`
+    command_key = Column(String(40), nullable=False)
+    gpu_count = Column(Integer, nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    # Stopped by user or scheduler, so the duration is only a lower bound
+    interrupted = Column(Boolean, nullable=False, default=False)
+
+    def check_assertions(self):
+        assert self.command_key, 'Job run must have a command key!'
+        assert self.finished_at is None or self.started_at <= self.finished_at, 'Job run time range is invalid!'
+
+    def __repr__(self):
+        return '<JobRun id={id}, job_id={job_id}, started_at={started_at}, finished_at={finished_at}>'.format(
+            id=self.id, job_id=self.job_id, started_at=self.started_at, finished_at=self.finished_at)
+
+    @property
+    def duration(self) -> Optional[datetime.timedelta]:
+        return self.finished_at - self.started_at if self.finished_at else None
+
+    @staticmethod
+    def command_key_of(commands: Iterable[str]) -> str:
+        '''Same set of commands (parameters may differ) gives the same key'''
+        return hashlib.sha1('\n'.join(sorted(command.strip() for command in commands)).encode()).hexdigest()
+
+    @classmethod
+    def start(cls, job, at: Optional[datetime.datetime] = None) -> 'JobRun':
+        '''Opens a run of just executed job, previous open run (if any, e.g. lost sync) is closed'''
+        cls.finish(job.id, at=at, commit=False)
+        run = cls(job_id=job.id, user_id=job.user_id,
+                  command_key=cls.command_key_of(task.command for task in job.tasks),
+                  gpu_count=sum(task.gpu_count or 1 for task in job.tasks),
+                  started_at=at or datetime.datetime.utcnow())
+        return run.save()
+
+    @classmethod
+    def finish(cls, job_id: int, at: Optional[datetime.datetime] = None, commit: bool = True) -> None:
+        db_session.execute(update(cls).where(cls.job_id == job_id, cls.finished_at.is_(None))
+                           .values(finished_at=at or datetime.datetime.utcnow()))
+        if commit:
+            db_session.commit()
+
+    @classmethod
+    def mark_interrupted(cls, job_id: int) -> None:
+        db_session.execute(update(cls).where(cls.job_id == job_id, cls.finished_at.is_(None))
+                           .values(interrupted=True))
+        db_session.commit()
+
+    @classmethod
+    def open_run(cls, job_id: int) -> Optional['JobRun']:
+        return cls.query.filter(cls.job_id == job_id, cls.finished_at.is_(None)) \
+            .order_by(cls.started_at.desc()).first()
+
+    @classmethod
+    def finished_runs(cls, command_keys: Iterable[str]) -> List['JobRun']:
+        '''Complete (not interrupted) runs of given command keys, the most recent first'''
+        return cls.query.filter(cls.command_key.in_(list(command_keys)), cls.finished_at.isnot(None),
+                                cls.interrupted.is_(False)) \
+            .order_by(cls.finished_at.desc()).all()
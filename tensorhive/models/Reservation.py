@@ -1,10 +1,11 @@
 from sqlalchemy import Column, Boolean, Integer, String, DateTime, ForeignKey, and_, not_, or_, event
-from tensorhive.database import db_session, Base
+from tensorhive.database import db_session, Base, follow_committed_changes
 from tensorhive.models.CRUDModel import CRUDModel
+from tensorhive.core.reservation_index import Candidate, LiveReservationIndex, ReservedInterval
 from tensorhive.utils.DateUtils import DateUtils
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship, backref
-from typing import List
+from typing import List, Optional, Tuple
 import datetime
 from datetime import timedelta
 import logging
@@ -38,6 +39,8 @@ class Reservation(CRUDModel, Base):  # type: ignore
 
     __min_reservation_time = datetime.timedelta(minutes=30)
     __max_reservation_time = datetime.timedelta(days=8)
+    # Read-only alias, for services which shorten reservations on their own
+    min_duration = __min_reservation_time
 
     def check_assertions(self):
         assert self.user_id, 'Reservation owner must be given!'
@@ -118,16 +121,38 @@ class Reservation(CRUDModel, Base):  # type: ignore
         return [e for e in events if not e.is_cancelled]
 
     def would_interfere(self):
-        conflicting_reservations = Reservation.query.filter(
-            # Two events overlap in time domain
-            and_(
-                self.start < Reservation.end,
-                self.end > Reservation.start
-            ),
-            # Case concerns the same resource
-        ).filter(Reservation.id != self.id)\
-         .filter(Reservation.resource_id == self.resource_id).all()
-        return any(not r.is_cancelled for r in conflicting_reservations)
+        return self.find_conflicts([(self.resource_id, self.start, self.end)], exclude_id=self.id)[0]
+
+    @classmethod
+    def find_conflicts(cls, candidates: List[Candidate], exclude_id: Optional[int] = None) -> List[bool]:
+        '''
+        Tells for each (resource_id, start, end) whether it overlaps with some active reservation.
+        Answered from the in-memory index, meant also for checking many intervals at once.
+        '''
+        ret = []
+        for resource_id, start, end in candidates:
+            if cls.index.covers(start):
+                ret.append(bool(cls.index.overlapping(resource_id, start, end, exclude_id=exclude_id)))
+                continue
+            # Index does not go that far into the past
+            conflicting_reservation = cls.query.filter(
+                # Two events overlap in time domain
+                and_(
+                    start < cls.end,
+                    end > cls.start
+                ),
+                # Case concerns the same resource
+            ).filter(cls.id != exclude_id)\
+             .filter(cls.resource_id == resource_id)\
+             .filter(or_(cls._is_cancelled.is_(None), not_(cls._is_cancelled))).first()
+            ret.append(conflicting_reservation is not None)
+        return ret
+
+    def interval(self) -> Optional[ReservedInterval]:
+        '''Entry of this reservation in the index, None if it should not be there'''
+        if self.is_cancelled or self.id is None:
+            return None
+        return ReservedInterval(self.id, self.resource_id, self.user_id, self.start, self.end)
 
     @classmethod
     def filter_by_uuids_and_time_range(cls, uuids: List[str], start: datetime.datetime, end: datetime.datetime):
@@ -147,6 +172,21 @@ class Reservation(CRUDModel, Base):  # type: ignore
         matching_conditions = and_(uuid_filter, after_start_filter, before_end_filter)
         return cls.query.filter(matching_conditions).all()
 
+    @classmethod
+    def intervals(cls, uuids: Optional[List[str]], start: datetime.datetime, end: datetime.datetime) \
+            -> List[Tuple[int, str, int, datetime.datetime, datetime.datetime]]:
+        '''
+        Lightweight variant of filter_by_uuids_and_time_range: only (id, resource_id, user_id, start, end)
+        of reservations which are not cancelled, ordered by resource and start, without loading whole objects.
+        All resources are taken into account if uuids is None.
+        '''
+        query = db_session.query(cls.id, cls.resource_id, cls.user_id, cls._start, cls._end) \
+            .filter(cls._start < end, cls._end > start) \
+            .filter(or_(cls._is_cancelled.is_(None), not_(cls._is_cancelled)))
+        if uuids is not None:
+            query = query.filter(cls.resource_id.in_(uuids))
+        return query.order_by(cls.resource_id, cls._start).all()
+
     def __repr__(self):
         return '''
 <ReservationEvent id={0}, user_id={1}
@@ -166,3 +206,21 @@ class Reservation(CRUDModel, Base):  # type: ignore
         ret = super(Reservation, self).as_dict(include_private=include_private)
         ret['userName'] = self.user.username
         return ret
+
+
+# Active reservations of all resources, see `would_interfere` and `find_conflicts`
+Reservation.index = LiveReservationIndex(
+    loader=lambda since: Reservation.intervals(None, since, datetime.datetime.max))
+
+
+def _collect_reservation_changes(session, changes):
+    for instance in session.new | session.dirty:
+        if isinstance(instance, Reservation):
+            changes[instance.id] = instance.interval()
+    for instance in session.deleted:
+        if isinstance(instance, Reservation):
+            changes[instance.id] = None
+
+
+follow_committed_changes('reservation', Reservation.__table__, collect=_collect_reservation_changes, empty=dict,
+                         apply=Reservation.index.apply, invalidate=Reservation.index.invalidate)
@@ -0,0 +1,86 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index, func, desc
+from sqlalchemy.orm import relationship, backref
+from tensorhive.database import db_session, Base
+from tensorhive.models.CRUDModel import CRUDModel
+from typing import Dict, List
+import datetime
+import logging
+log = logging.getLogger(__name__)
+
+
+class ReservationUsageSummary(CRUDModel, Base):  # type: ignore
+    '''
+    Usage statistics of a finished reservation, computed by UsageLoggingService.
+
+    Reservation's owner, resource and time range are copied (denormalized) on purpose,
+    so that aggregate queries (e.g. top idle users within a month) are answered by index range scans
+    without joining reservations table.
+    '''
+    __tablename__ = 'reservation_usage_summaries'
+    __table_args__ = (
+        Index('ix_usage_summaries_start_user', 'start', 'user_id', 'idle_hours'),
+        Index('ix_usage_summaries_user_start', 'user_id', 'start'),
+        Index('ix_usage_summaries_resource_start', 'resource_id', 'start'),
+        {'sqlite_autoincrement': True}
+    )
+    __public__ = ['id', 'reservation_id', 'user_id', 'resource_id', 'start', 'end', 'samples', 'gpu_util_avg',
+                  'gpu_util_p50', 'gpu_util_p95', 'mem_util_avg', 'idle_fraction', 'idle_hours', 'mem_used_peak',
+                  'power_avg', 'energy_wh']
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    reservation_id = Column(Integer, ForeignKey('reservations.id', ondelete='CASCADE'), unique=True, nullable=False)
+    reservation = relationship(
+        'Reservation',
+        backref=backref('usage_summary', uselist=False, passive_deletes=True, cascade='all, delete, delete-orphan'))
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    resource_id = Column(String(60), nullable=False)
+    start = Column(DateTime, nullable=False)
+    end = Column(DateTime, nullable=False)
+
+    samples = Column(Integer, nullable=False, default=0)
+    gpu_util_avg = Column(Float, nullable=True)
+    gpu_util_p50 = Column(Float, nullable=True)
+    gpu_util_p95 = Column(Float, nullable=True)
+    mem_util_avg = Column(Float, nullable=True)
+    # Fraction of samples with GPU utilization below idle threshold
+    idle_fraction = Column(Float, nullable=True)
+    # Reserved time multiplied by idle fraction
+    idle_hours = Column(Float, nullable=True)
+    # MiB
+    mem_used_peak = Column(Float, nullable=True)
+    # Watts
+    power_avg = Column(Float, nullable=True)
+    energy_wh = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    def check_assertions(self):
+        assert self.reservation_id, 'Summary must be related with a reservation!'
+        assert self.user_id, 'Reservation owner must be given!'
+        assert self.start and self.end, 'Reservation time range is invalid!'
+        assert self.idle_fraction is None or 0 <= self.idle_fraction <= 1, 'Idle fraction must be within [0, 1]!'
+
+    def __repr__(self):
+        return '<ReservationUsageSummary id={id}, reservation_id={reservation_id}, gpu_util_avg={gpu_util_avg}, ' \
+               'idle_fraction={idle_fraction}>'.format(id=self.id, reservation_id=self.reservation_id,
+                                                       gpu_util_avg=self.gpu_util_avg,
+                                                       idle_fraction=self.idle_fraction)
+
+    @classmethod
+    def get_by_reservation_id(cls, reservation_id: int) -> 'ReservationUsageSummary':
+        return cls.query.filter(cls.reservation_id == reservation_id).one_or_none()
+
+    @classmethod
+    def top_idle_users(cls, start: datetime.datetime, end: datetime.datetime, limit: int = 10) -> List[Dict]:
+        '''
+        Users who left their reservations (started within given time range) idle for the longest time.
+        Uses (start, user_id, idle_hours) index only.
+        '''
+        idle_hours = func.sum(cls.idle_hours).label('idle_hours')
+        rows = db_session.query(cls.user_id, idle_hours, func.count(cls.id).label('reservations')) \
+            .filter(cls.start >= start, cls.start < end) \
+            .group_by(cls.user_id) \
+            .order_by(desc(idle_hours)) \
+            .limit(limit) \
+            .all()
+        return [{'userId': row.user_id, 'idleHours': row.idle_hours, 'reservations': row.reservations}
+                for row in rows]
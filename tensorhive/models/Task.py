@@ -1,4 +1,5 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime
+from typing import List
 from tensorhive.database import Base
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship, backref
@@ -16,10 +17,20 @@ class TaskStatus(enum.Enum):
     unsynchronized = 4
 
 
+class TaskPlacement(enum.Enum):
+    """Which GPUs a task may run on"""
+    # GPU index taken from CUDA_VISIBLE_DEVICES in command (gpu_id)
+    pinned = 1
+    # Any gpu_count GPUs on task's host
+    host = 2
+    # Any gpu_count GPUs on a single host, hostname is chosen on launch
+    any = 3
+
+
 class Task(CRUDModel, Base):  # type: ignore
     __tablename__ = 'tasks'
     __table_args__ = {'sqlite_autoincrement': True}
-    __public__ = ['id', 'job_id', 'hostname', 'pid', 'command']
+    __public__ = ['id', 'job_id', 'hostname', 'pid', 'command', 'gpu_count']
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     job_id = Column(Integer, ForeignKey('jobs.id', ondelete='CASCADE'))
@@ -30,6 +41,11 @@ class Task(CRUDModel, Base):  # type: ignore
     command = Column(String(400), nullable=False)
     _cmd_segments = relationship('CommandSegment', secondary='cmd_segment2task', back_populates='_tasks')
     gpu_id = Column(Integer, nullable=True)  # TODO: link with hardware DB model when it's ready
+    _placement = Column('placement', Enum(TaskPlacement), default=TaskPlacement.pinned,
+                        server_default=TaskPlacement.pinned.name, nullable=False)
+    gpu_count = Column(Integer, nullable=True)
+    # Comma-separated UUIDs of GPUs chosen on last launch of a flexible (not pinned) task
+    _gpu_uuids = Column('gpu_uuids', String(400), nullable=True)
 
     def __repr__(self):
         return '<Task id={id}, jobId={job_id}, name={hostname}, command={command}\n' \
@@ -42,7 +58,28 @@ class Task(CRUDModel, Base):  # type: ignore
                 status=self._status.name)
 
     def check_assertions(self):
-        pass
+        if self.is_flexible:
+            assert self.gpu_count and self.gpu_count > 0, 'Number of GPUs must be given for flexible placement!'
+
+    @hybrid_property
+    def placement(self):
+        return self._placement
+
+    @placement.setter  # type: ignore
+    def placement(self, value):
+        self._placement = TaskPlacement[value] if isinstance(value, str) else value
+
+    @property
+    def is_flexible(self) -> bool:
+        return self._placement not in (None, TaskPlacement.pinned)
+
+    @property
+    def gpu_uuids(self) -> List[str]:
+        return self._gpu_uuids.split(',') if self._gpu_uuids else []
+
+    @gpu_uuids.setter
+    def gpu_uuids(self, value: List[str]):
+        self._gpu_uuids = ','.join(value) if value else None
 
     @hybrid_property
     def status(self):
@@ -140,6 +177,8 @@ class Task(CRUDModel, Base):  # type: ignore
     def as_dict(self, include_private=None):
         ret = super(Task, self).as_dict(include_private=include_private)
         ret['status'] = self._status.name
+        ret['placement'] = self.placement.name if self.placement is not None else TaskPlacement.pinned.name
+        ret['gpuUuids'] = self.gpu_uuids
         try:
             envs_array = []
             params_array = []
@@ -0,0 +1,88 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, Index
+from tensorhive.database import Base
+from tensorhive.models.CRUDModel import CRUDModel
+from typing import List, Optional
+import datetime
+import logging
+log = logging.getLogger(__name__)
+
+
+class UsageRollup(CRUDModel, Base):  # type: ignore
+    '''
+    Pre-aggregated GPU usage within an hour or a day, for a single GPU, host, user or group.
+    GPU and host buckets include samples of every GPU, user and group ones only samples of reserved GPUs.
+
+    Only sums, counts and maxima are stored, so buckets can be incremented on every
+    UsageLoggingService tick and merged into coarser periods by simple addition.
+    Range queries use (scope, granularity, bucket_start) index.
+    '''
+    __tablename__ = 'usage_rollups'
+    __table_args__ = (
+        Index('ix_usage_rollups_bucket', 'scope', 'granularity', 'key', 'bucket_start', unique=True),
+        Index('ix_usage_rollups_range', 'scope', 'granularity', 'bucket_start'),
+        {'sqlite_autoincrement': True}
+    )
+    __public__ = ['scope', 'granularity', 'key', 'bucket_start', 'samples', 'utilization_avg', 'utilization_max',
+                  'mem_util_avg', 'mem_used_max', 'power_avg']
+
+    # Bucket length in seconds
+    GRANULARITIES = {'hour': 60 * 60, 'day': 24 * 60 * 60}
+    SCOPES = ['gpu', 'host', 'user', 'group']
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    scope = Column(String(8), nullable=False)
+    granularity = Column(String(8), nullable=False)
+    # GPU UUID, hostname, user id or group id
+    key = Column(String(60), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+
+    # Number of samples with utilization value
+    samples = Column(Integer, nullable=False, default=0)
+    utilization_sum = Column(Float, nullable=False, default=0.0)
+    utilization_max = Column(Float, nullable=True)
+    mem_util_samples = Column(Integer, nullable=False, default=0)
+    mem_util_sum = Column(Float, nullable=False, default=0.0)
+    mem_used_max = Column(Float, nullable=True)
+    power_samples = Column(Integer, nullable=False, default=0)
+    power_sum = Column(Float, nullable=False, default=0.0)
+
+    def check_assertions(self):
+        assert self.scope in self.SCOPES, 'Unsupported rollup scope!'
+        assert self.granularity in self.GRANULARITIES, 'Unsupported rollup granularity!'
+        assert self.key, 'Rollup key must be given!'
+
+    def __repr__(self):
+        return '<UsageRollup {scope}={key}, {granularity} from {bucket_start}, samples={samples}>'.format(
+            scope=self.scope, key=self.key, granularity=self.granularity, bucket_start=self.bucket_start,
+            samples=self.samples)
+
+    @staticmethod
+    def average(total: float, count: int) -> Optional[float]:
+        return round(total / count, 2) if count else None
+
+    @property
+    def utilization_avg(self) -> Optional[float]:
+        return self.average(self.utilization_sum, self.samples)
+
+    @property
+    def mem_util_avg(self) -> Optional[float]:
+        return self.average(self.mem_util_sum, self.mem_util_samples)
+
+    @property
+    def power_avg(self) -> Optional[float]:
+        return self.average(self.power_sum, self.power_samples)
+
+    @classmethod
+    def bucket_of(cls, granularity: str, timestamp: float) -> datetime.datetime:
+        length = cls.GRANULARITIES[granularity]
+        return datetime.datetime.utcfromtimestamp(timestamp // length * length)
+
+    @classmethod
+    def find(cls, scope: str, granularity: str, start: datetime.datetime, end: datetime.datetime,
+             keys: Optional[List[str]] = None) -> List['UsageRollup']:
+        '''Returns buckets starting within <start, end), ordered by key and time'''
+        query = cls.query.filter(cls.scope == scope, cls.granularity == granularity,
+                                 cls.bucket_start >= start, cls.bucket_start < end)
+        if keys:
+            query = query.filter(cls.key.in_(keys))
+        return query.order_by(cls.key, cls.bucket_start).all()
@@ -1,6 +1,10 @@
 from tensorhive.models.CRUDModel import CRUDModel
 from tensorhive.models.Group import Group, User2Group
 from tensorhive.models.Reservation import Reservation
+from tensorhive.models.ReservationUsageSummary import ReservationUsageSummary
+from tensorhive.models.UsageRollup import UsageRollup
+from tensorhive.models.GPUProcessSession import GPUProcessSession
+from tensorhive.models.JobRun import JobRun
 from tensorhive.models.Resource import Resource
 from tensorhive.models.Restriction import Restriction, Restriction2Assignee, Restriction2Resource
 from tensorhive.models.RestrictionAssignee import RestrictionAssignee
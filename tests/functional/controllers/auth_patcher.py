@@ -9,8 +9,10 @@ import tensorhive.controllers.schedule as schedule
 import tensorhive.controllers.user as user
 import tensorhive.controllers.job as job
 import tensorhive.controllers.task as task
+import tensorhive.controllers.analytics as analytics
+import tensorhive.controllers.nodes as nodes
 
-CONTROLLER_MODULES = [group, reservation, restriction, schedule, user, job, task]
+CONTROLLER_MODULES = [group, reservation, restriction, schedule, user, job, task, analytics, nodes]
 
 G = API.RESPONSES['general']
 
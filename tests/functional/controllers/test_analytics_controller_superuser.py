@@ -0,0 +1,97 @@
+from fixtures.controllers import API_URI as BASE_URI, HEADERS
+from http import HTTPStatus
+from tensorhive.config import API, USAGE_LOGGING_SERVICE
+from tensorhive.core.usage_journal import UsageJournal, UsageRecord
+from tensorhive.core.usage_rollups import UsageRollupWriter
+from tensorhive.models.GPUProcessSession import GPUProcessSession
+import auth_patcher
+from importlib import reload
+
+import datetime
+import json
+
+ENDPOINT = BASE_URI + '/analytics'
+
+
+def setup_module(_):
+    auth_patches = auth_patcher.get_patches(superuser=True)
+    for auth_patch in auth_patches:
+        auth_patch.start()
+    for module in auth_patcher.CONTROLLER_MODULES:
+        reload(module)
+    for auth_patch in auth_patches:
+        auth_patch.stop()
+
+
+# GET /analytics/usage
+def test_get_daily_usage_per_host(tables, client):
+    now = datetime.datetime.utcnow().timestamp()
+    writer = UsageRollupWriter()
+    writer.add([(UsageRecord(now, 'GPU-0', 1, 1, 30.0, 10.0, 100.0, 50.0), 'host_0'),
+                (UsageRecord(now, 'GPU-1', 2, 1, 50.0, 20.0, 100.0, float('nan')), 'host_0')])
+    writer.flush()
+
+    resp = client.get(ENDPOINT + '/usage?scope=host&granularity=day', headers=HEADERS)
+    resp_json = json.loads(resp.data.decode('utf-8'))
+
+    assert resp.status_code == HTTPStatus.OK
+    series = resp_json['series']['host_0']
+    assert series['samples'] == [2]
+    assert series['utilizationAvg'] == [40.0]
+    assert series['total']['powerAvg'] == 50.0
+
+
+# GET /analytics/usage - invalid time range
+def test_get_usage_with_invalid_range(tables, client):
+    resp = client.get(ENDPOINT + '/usage?scope=gpu&start=2020-01-02T00:00:00.0Z&end=2020-01-01T00:00:00.0Z',
+                      headers=HEADERS)
+
+    assert resp.status_code == HTTPStatus.BAD_REQUEST
+
+
+# GET /analytics/idle_users
+def test_get_idle_users(tables, client):
+    resp = client.get(ENDPOINT + '/idle_users', headers=HEADERS)
+
+    assert resp.status_code == HTTPStatus.OK
+    assert json.loads(resp.data.decode('utf-8')) == []
+
+
+# GET /analytics/usage/export
+def test_export_usage_as_csv(tables, client, tmp_path, monkeypatch, resource1):
+    monkeypatch.setattr(USAGE_LOGGING_SERVICE, 'LOG_DIR', str(tmp_path))
+    now = datetime.datetime.utcnow().timestamp()
+    UsageJournal(tmp_path).append([UsageRecord(now, resource1.id, 1, 1, 30.0, 10.0, 100.0, 50.0)])
+
+    resp = client.get(ENDPOINT + '/usage/export?format=csv', headers=HEADERS)
+
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.mimetype == 'text/csv'
+    lines = resp.data.decode('utf-8').splitlines()
+    assert len(lines) == 2
+    assert resource1.id in lines[1]
+
+
+# GET /analytics/usage/export - unreadable journal
+def test_export_usage_with_broken_journal_directory(tables, client, tmp_path, monkeypatch):
+    not_a_directory = tmp_path / 'usage'
+    not_a_directory.write_text('')
+    monkeypatch.setattr(USAGE_LOGGING_SERVICE, 'LOG_DIR', str(not_a_directory))
+
+    resp = client.get(ENDPOINT + '/usage/export?format=csv', headers=HEADERS)
+
+    assert resp.status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert json.loads(resp.data.decode('utf-8'))['msg'] == API.RESPONSES['general']['internal_error']
+
+
+# GET /analytics/gpu_hours
+def test_get_gpu_hours(tables, client):
+    now = datetime.datetime.utcnow()
+    GPUProcessSession(hostname='host_0', gpu_uuid='GPU-0', pid=1, owner='alice', command='python',
+                      first_seen=now - datetime.timedelta(hours=3), last_seen=now - datetime.timedelta(hours=1),
+                      samples=10).save()
+
+    resp = client.get(ENDPOINT + '/gpu_hours', headers=HEADERS)
+
+    assert resp.status_code == HTTPStatus.OK
+    assert json.loads(resp.data.decode('utf-8')) == [{'owner': 'alice', 'gpuHours': 2.0}]
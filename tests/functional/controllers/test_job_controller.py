@@ -1,6 +1,6 @@
 from fixtures.controllers import API_URI as BASE_URI, HEADERS
 from tensorhive.models.Job import Job
-from tensorhive.models.Task import Task
+from tensorhive.models.Task import Task, TaskPlacement, TaskStatus
 from tensorhive.models.CommandSegment import CommandSegment2Task, CommandSegment
 from http import HTTPStatus
 from importlib import reload
@@ -8,9 +8,11 @@ import auth_patcher
 import datetime
 from datetime import timedelta
 from tensorhive.utils.DateUtils import DateUtils
+from types import SimpleNamespace
 from tensorhive.models.Job import JobStatus
 
 import json
+import pytest
 
 ENDPOINT = BASE_URI + '/jobs'
 
@@ -34,6 +36,26 @@ def test_get_all_jobs(tables, client, new_job, new_admin_job):
     assert len(resp_json['jobs']) == 1
 
 
+# GET /jobs/queue
+def test_get_queue_shows_own_jobs_in_predicted_order(tables, client, new_job, new_admin_job, monkeypatch):
+    now = datetime.datetime.utcnow()
+    for job in [new_job, new_admin_job]:
+        job.is_queued = True
+        job._status = JobStatus.pending
+        job.save()
+    predictions = {new_admin_job.id: now, new_job.id: now + timedelta(hours=1)}
+    monkeypatch.setattr('tensorhive.controllers.job.queue_predictions', lambda: (predictions, now))
+
+    resp = client.get(ENDPOINT + '/queue', headers=HEADERS)
+    resp_json = json.loads(resp.data.decode('utf-8'))
+
+    assert resp.status_code == HTTPStatus.OK
+    assert [entry['job']['id'] for entry in resp_json['queue']] == [new_job.id]
+    assert resp_json['queue'][0]['position'] == 2
+    assert resp_json['queue'][0]['predictedStart'] == DateUtils.stringify_datetime(now + timedelta(hours=1))
+    assert resp_json['queue'][0]['estimatedDuration'] is None
+
+
 # POST /jobs
 def test_create_job(tables, client, new_user):
     new_user.save()
@@ -211,3 +233,90 @@ def test_add_task_to_job(tables, client, new_job, new_task):
     assert resp.status_code == HTTPStatus.OK
     assert new_job == new_task.job
     assert new_task in new_job.tasks
+
+
+def test_execute_gang_rolls_back_on_partial_failure(tables, new_job_with_task, new_task_2, monkeypatch):
+    from tensorhive.controllers.job import business_execute
+    from tensorhive.core import task_nursery
+    new_job_with_task.add_task(new_task_2)
+    new_job_with_task.enqueue()
+    spawned, killed = {}, []
+
+    def spawn(command, host, user, name_appendix=None, barrier=None):
+        if host == 'remotehost':
+            raise task_nursery.SpawnError('host unreachable')
+        assert barrier, 'tasks of a gang must wait at barrier'
+        spawned[1234] = host
+        return 1234
+
+    def terminate(pid, host, user, gracefully=True):
+        killed.append((pid, gracefully))
+        return 0
+
+    monkeypatch.setattr(task_nursery, 'spawn', spawn)
+    monkeypatch.setattr(task_nursery, 'terminate', terminate)
+    monkeypatch.setattr(task_nursery, 'running',
+                        lambda host, user: [pid for pid in spawned if (pid, False) not in killed])
+    monkeypatch.setattr(task_nursery, 'release', lambda *args: pytest.fail('incomplete gang must not be released'))
+
+    content, status = business_execute(new_job_with_task.id)
+
+    assert status == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert content['not_spawned_list'] == [new_task_2.id]
+    assert killed == [(1234, False)]
+    assert all(task.status is TaskStatus.not_running for task in new_job_with_task.tasks)
+    assert new_job_with_task.status is JobStatus.pending and new_job_with_task.is_queued
+
+
+def test_execute_gang_releases_all_tasks_together(tables, new_job_with_task, new_task_2, monkeypatch):
+    from tensorhive.controllers.job import business_execute
+    from tensorhive.core import task_nursery
+    new_job_with_task.add_task(new_task_2)
+    barriers, released = {}, {}
+
+    def spawn(command, host, user, name_appendix=None, barrier=None):
+        assert not released, 'gang must be released after all tasks have spawned'
+        barriers[host] = barrier
+        return 1000 + len(barriers)
+
+    def release(host, user, host_barriers):
+        released[host] = host_barriers
+        return 0
+
+    monkeypatch.setattr(task_nursery, 'spawn', spawn)
+    monkeypatch.setattr(task_nursery, 'release', release)
+    monkeypatch.setattr(task_nursery, 'running', lambda host, user: [])
+
+    content, status = business_execute(new_job_with_task.id)
+
+    assert status == HTTPStatus.OK
+    assert released == {host: [barrier] for host, barrier in barriers.items()}
+    assert len(set(barriers.values())) == 2
+    assert new_job_with_task.status is JobStatus.running
+
+
+def test_execute_places_flexible_tasks_of_job_on_distinct_gpus(tables, new_job, permissive_restriction, monkeypatch):
+    from tensorhive.controllers.job import business_execute
+    from tensorhive.core import task_nursery
+    from tensorhive.core.managers import TensorHiveManager as manager_module
+    from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
+    infrastructure_manager = InfrastructureManager({'localhost': {}})
+    with infrastructure_manager.updating() as infrastructure:
+        infrastructure['localhost'] = {'GPU': {
+            'GPU-{}'.format(index): {'index': index, 'processes': []} for index in range(3)}}
+    monkeypatch.setattr(manager_module, 'TensorHiveManager',
+                        lambda: SimpleNamespace(infrastructure_manager=infrastructure_manager))
+    new_job.add_task(Task(command='python serve.py', hostname='localhost', gpu_id=0))
+    for _ in range(2):
+        new_job.add_task(Task(command='python train.py', hostname='localhost', placement=TaskPlacement.host,
+                              gpu_count=1))
+    pids = iter(range(1000, 1003))
+    monkeypatch.setattr(task_nursery, 'spawn', lambda command, host, user, name_appendix, barrier: next(pids))
+    monkeypatch.setattr(task_nursery, 'release', lambda host, user, host_barriers: 0)
+    monkeypatch.setattr(task_nursery, 'running', lambda host, user: [])
+
+    content, status = business_execute(new_job.id)
+
+    assert status == HTTPStatus.OK
+    # Neither the GPU of the pinned task nor the one chosen for another task
+    assert sorted(task.gpu_uuids for task in new_job.tasks if task.is_flexible) == [['GPU-1'], ['GPU-2']]
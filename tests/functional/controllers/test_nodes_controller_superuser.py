@@ -0,0 +1,111 @@
+from fixtures.controllers import API_URI as BASE_URI, HEADERS
+from http import HTTPStatus
+from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
+from tensorhive.core.metrics_history import MetricsHistory
+from tensorhive.core.utils.MetricsSerializer import MetricsSerializer
+from tensorhive.utils.DateUtils import DateUtils
+import auth_patcher
+from importlib import reload
+
+import datetime
+import gzip
+import json
+import pytest
+import time
+
+ENDPOINT = BASE_URI + '/nodes'
+
+
+def setup_module(_):
+    auth_patches = auth_patcher.get_patches(superuser=True)
+    for auth_patch in auth_patches:
+        auth_patch.start()
+    for module in auth_patcher.CONTROLLER_MODULES:
+        reload(module)
+    for auth_patch in auth_patches:
+        auth_patch.stop()
+
+
+def gpu_infrastructure(utilization):
+    return {
+        'host_0': {
+            'GPU': {
+                'GPU-0': {
+                    'name': 'GeForce GTX 1080',
+                    'index': 0,
+                    'metrics': {'utilization': {'value': utilization, 'unit': '%'}},
+                    'processes': []
+                }
+            },
+            'CPU': None
+        }
+    }
+
+
+class FakeManager():
+    def __init__(self):
+        self.infrastructure_manager = InfrastructureManager({'host_0': {}})
+        with self.infrastructure_manager.updating() as infrastructure:
+            infrastructure.update(gpu_infrastructure(40))
+        self.metrics_history = MetricsHistory()
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    fake_manager = FakeManager()
+    monkeypatch.setattr('tensorhive.controllers.nodes.TensorHiveManager', lambda: fake_manager)
+    return fake_manager
+
+
+# GET /nodes/history
+def test_get_history_with_end_in_future(tables, client, manager):
+    now = time.time()
+    manager.metrics_history.record(gpu_infrastructure(10), timestamp=now - 4)
+    manager.metrics_history.record(gpu_infrastructure(30), timestamp=now - 1)
+    utcnow = datetime.datetime.utcnow()
+    query = {
+        'start': DateUtils.stringify_datetime_to_api_format(utcnow - datetime.timedelta(minutes=10)),
+        'end': DateUtils.stringify_datetime_to_api_format(utcnow + datetime.timedelta(days=2))
+    }
+
+    resp = client.get(ENDPOINT + '/history', query_string=query, headers=HEADERS)
+    resp_json = json.loads(resp.data.decode('utf-8'))
+
+    assert resp.status_code == HTTPStatus.OK
+    assert resp_json['resolution'] == 2
+    assert resp_json['nodes']['host_0']['GPU-0']['metrics']['utilization']['avg'] == [10.0, 30.0]
+
+
+# GET /nodes/metrics
+@pytest.mark.parametrize('accept,expected_type', [
+    (None, 'application/json'),
+    ('application/json', 'application/json'),
+    ('application/vnd.tensorhive.compact+json', 'application/vnd.tensorhive.compact+json'),
+    ('application/json;q=0.5, application/vnd.tensorhive.compact+json', 'application/vnd.tensorhive.compact+json'),
+    ('application/json, application/vnd.tensorhive.compact+json;q=0.5', 'application/json'),
+    ('application/vnd.tensorhive.compact+json;q=0, */*;q=0.1', 'application/json'),
+])
+def test_get_all_metrics_negotiates_representation(tables, client, manager, accept, expected_type):
+    headers = dict(HEADERS, Accept=accept) if accept else HEADERS
+    resp = client.get(ENDPOINT + '/metrics', headers=headers)
+    resp_json = json.loads(resp.data.decode('utf-8'))
+
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.headers['Content-Type'] == expected_type
+    # Caches must not serve one representation to clients asking for the other
+    assert resp.headers['Vary'] == 'Accept, Accept-Encoding'
+    if expected_type == 'application/json':
+        assert resp_json['host_0']['GPU']['GPU-0']['metrics']['utilization']['value'] == 40
+    else:
+        assert resp_json['nodes']['host_0']['GPU']['metrics']['utilization'] == [40]
+
+
+def test_get_all_metrics_compressed(tables, client, manager, monkeypatch):
+    monkeypatch.setattr(MetricsSerializer, 'min_gzip_size', 0)
+    headers = dict(HEADERS, Accept='application/vnd.tensorhive.compact+json', **{'Accept-Encoding': 'gzip'})
+    resp = client.get(ENDPOINT + '/metrics', headers=headers)
+
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert resp.headers['Vary'] == 'Accept, Accept-Encoding'
+    assert json.loads(gzip.decompress(resp.data))['nodes']['host_0']['GPU']['uuid'] == ['GPU-0']
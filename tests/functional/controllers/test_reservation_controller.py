@@ -283,3 +283,33 @@ def test_delete_active_reservation_forbidden(tables, client, active_reservation,
     resp = client.delete(ENDPOINT + '/' + str(active_reservation.id), headers=HEADERS)
 
     assert resp.status_code == HTTPStatus.FORBIDDEN
+
+
+# GET /reservations/free_slots
+def test_get_free_slots(tables, client, active_reservation, resource2, permissive_restriction):
+    active_reservation.save()
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+
+    resp = client.get(ENDPOINT + '/free_slots?count=2&duration=60&limit=1&start={}'.format(
+        DateUtils.stringify_datetime_to_api_format(now)), headers=HEADERS)
+    resp_json = json.loads(resp.data.decode('utf-8'))
+
+    assert resp.status_code == HTTPStatus.OK
+    assert len(resp_json) == 1
+    assert resp_json[0]['start'] == DateUtils.stringify_datetime(active_reservation.end)
+    assert sorted(resp_json[0]['resourcesIds']) == sorted([active_reservation.resource_id, resource2.id])
+
+
+# GET /reservations/occupancy
+def test_get_occupancy(tables, client, active_reservation):
+    active_reservation.save()
+    start = active_reservation.start - timedelta(hours=1)
+
+    resp = client.get(ENDPOINT + '/occupancy?resources_ids={}&start={}&end={}&bucket=120'.format(
+        active_reservation.resource_id, DateUtils.stringify_datetime_to_api_format(start),
+        DateUtils.stringify_datetime_to_api_format(start + timedelta(hours=12))), headers=HEADERS)
+    resp_json = json.loads(resp.data.decode('utf-8'))
+
+    assert resp.status_code == HTTPStatus.OK
+    assert resp_json['occupancy'] == [[0.5, 1.0, 1.0, 1.0, 1.0, 0.5]]
+    assert resp_json['userIds'] == [[active_reservation.user_id] * 6]
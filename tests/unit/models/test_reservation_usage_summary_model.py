@@ -0,0 +1,37 @@
+import datetime
+from tensorhive.models.ReservationUsageSummary import ReservationUsageSummary
+
+
+def summary(reservation, idle_hours):
+    return ReservationUsageSummary(reservation_id=reservation.id, user_id=reservation.user_id,
+                                   resource_id=reservation.resource_id, start=reservation.start,
+                                   end=reservation.end, samples=10, idle_fraction=idle_hours,
+                                   idle_hours=idle_hours)
+
+
+def test_top_idle_users(tables, past_reservation, new_reservation, new_user_2):
+    past_reservation.save()
+    new_user_2.save()
+    new_reservation.user_id = new_user_2.id
+    new_reservation.save()
+    summary(past_reservation, 0.25).save()
+    summary(new_reservation, 0.75).save()
+
+    now = datetime.datetime.utcnow()
+    result = ReservationUsageSummary.top_idle_users(now - datetime.timedelta(days=1), now + datetime.timedelta(days=1))
+
+    assert [row['userId'] for row in result] == [new_user_2.id, past_reservation.user_id]
+    assert result[0]['idleHours'] == 0.75
+    # Only past reservation has started within that range
+    earlier = ReservationUsageSummary.top_idle_users(now - datetime.timedelta(days=1),
+                                                     now - datetime.timedelta(hours=1))
+    assert [row['userId'] for row in earlier] == [past_reservation.user_id]
+
+
+def test_summary_is_removed_with_reservation(tables, past_reservation):
+    past_reservation.save()
+    summary(past_reservation, 0.5).save()
+
+    past_reservation.destroy()
+
+    assert ReservationUsageSummary.get_by_reservation_id(past_reservation.id) is None
@@ -0,0 +1,34 @@
+import datetime
+from tensorhive.core.free_slots import earliest_windows, schedule_windows
+from tensorhive.models.RestrictionSchedule import RestrictionSchedule
+
+MONDAY = datetime.datetime(2020, 1, 6)
+
+
+def hours(value: float) -> datetime.datetime:
+    return MONDAY + datetime.timedelta(hours=value)
+
+
+def test_schedule_windows_cross_midnight():
+    schedule = RestrictionSchedule(schedule_days='1', hour_start=datetime.time(22), hour_end=datetime.time(6))
+
+    assert schedule_windows(schedule, hours(-12), hours(48)) == [(hours(22), hours(30))]
+
+
+def test_earliest_windows_need_all_gpus_free_for_whole_duration():
+    free = {
+        'A': [(hours(0), hours(2)), (hours(5), hours(20))],
+        'B': [(hours(1), hours(6))],
+        'C': [(hours(4), hours(8))],
+    }
+    hostnames = {'A': 'host_0', 'B': 'host_0', 'C': 'host_1'}
+    duration = datetime.timedelta(hours=1)
+
+    windows = earliest_windows(free, hostnames, count=2, duration=duration, limit=2)
+    same_host = earliest_windows(free, hostnames, count=2, duration=duration, same_host=True, limit=1)
+
+    assert [(window.start, window.resources_ids) for window in windows] == \
+        [(hours(1), ['A', 'B']), (hours(4), ['B', 'C'])]
+    assert same_host[0].start == hours(1) and same_host[0].hostname == 'host_0'
+    assert earliest_windows(free, hostnames, count=3, duration=duration)[0].start == hours(5)
+    assert earliest_windows(free, hostnames, count=3, duration=duration * 2) == []
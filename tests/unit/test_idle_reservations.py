@@ -0,0 +1,40 @@
+import datetime
+from tensorhive.core.idle_reservations import IdleReservationAction, IdleReservationDetector, \
+    release_idle_reservation
+from tensorhive.core.usage_journal import UsageRecord
+from tensorhive.models.Reservation import Reservation
+
+
+def sample(timestamp, utilization, reservation_id=1):
+    return UsageRecord(timestamp=timestamp, uuid='GPU-0', reservation_id=reservation_id, user_id=1,
+                       utilization=utilization, mem_util=0, mem_used=0, power=None)
+
+
+def test_detector_reports_reservation_idle_for_whole_window_once():
+    detector = IdleReservationDetector(threshold=5, window=600)
+    detector.observe([sample(0, 0), sample(300, 50), sample(400, 1), sample(700, float('nan'))])
+
+    assert detector.due(now=900) == []
+    assert detector.due(now=1000) == [1]
+    assert detector.due(now=1100) == []
+
+    # Becomes busy, so it may be reported again later
+    detector.observe([sample(1200, 80), sample(1300, 0)])
+    assert detector.due(now=1900) == [1]
+
+
+def test_idle_reservation_is_shortened_but_not_below_minimal_duration(tables, new_reservation):
+    new_reservation.save()
+    start = new_reservation.start
+
+    assert release_idle_reservation(new_reservation, IdleReservationAction.SHORTEN, now=start)
+    assert Reservation.get(new_reservation.id).end == start + Reservation.min_duration
+    assert not release_idle_reservation(new_reservation, IdleReservationAction.SHORTEN, now=start)
+
+
+def test_idle_reservation_is_cancelled(tables, new_reservation):
+    new_reservation.save()
+
+    assert release_idle_reservation(new_reservation, IdleReservationAction.CANCEL)
+    assert Reservation.get(new_reservation.id).is_cancelled
+    assert not release_idle_reservation(new_reservation, IdleReservationAction.NOTIFY)
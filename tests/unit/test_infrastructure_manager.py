@@ -0,0 +1,116 @@
+import pytest
+import threading
+from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
+
+
+def gpus(*uuids):
+    return {uuid: {'name': 'GeForce GTX 1060', 'index': index, 'metrics': {}} for index, uuid in enumerate(uuids)}
+
+
+def test_gpu_lookup_indexes_are_built_on_update():
+    manager = InfrastructureManager({'host_a': {}, 'host_b': {}})
+    manager.update_node('host_a', 'GPU', gpus('GPU-a0', 'GPU-a1'))
+    manager.update_node('host_b', 'GPU', gpus('GPU-b0'))
+
+    assert manager.find_gpu('GPU-a1') == ('host_a', 1)
+    assert manager.find_hostname('GPU-b0') == 'host_b'
+    assert manager.get_gpu_uid('host_a', 0) == 'GPU-a0'
+    assert manager.host_gpu_uuids('host_a') == ['GPU-a0', 'GPU-a1']
+    assert manager.gpu_data('GPU-b0')['index'] == 0
+    assert manager.infrastructure['host_a']['GPU']['GPU-a1']['index'] == 1
+
+
+def test_gpu_lookup_indexes_are_cleared_when_node_data_is_gone():
+    manager = InfrastructureManager({'host_a': {}})
+    manager.update_node('host_a', 'GPU', gpus('GPU-a0', 'GPU-a1'))
+    manager.update_node('host_a', 'GPU', None)
+
+    assert manager.find_gpu('GPU-a0') is None
+    assert manager.get_gpu_uid('host_a', 1) is None
+    assert manager.host_gpu_uuids('host_a') == []
+    assert manager.gpu_data('GPU-a0') is None
+
+
+def test_cpu_update_does_not_affect_gpu_indexes():
+    manager = InfrastructureManager({'host_a': {}})
+    manager.update_node('host_a', 'GPU', gpus('GPU-a0'))
+    manager.update_node('host_a', 'CPU', {'CPU_host_a': {'index': 0, 'metrics': {}}})
+
+    assert manager.get_gpu_uid('host_a', 0) == 'GPU-a0'
+    assert manager.get_gpu_uid('host_a', None) is None
+
+
+def test_changes_are_published_at_once_as_new_snapshot():
+    manager = InfrastructureManager({'host_a': {}})
+    before = manager.snapshot
+
+    with manager.updating():
+        manager.update_node('host_a', 'GPU', gpus('GPU-a0'))
+        manager.update_node('host_a', 'CPU', {})
+        # Readers still see the previous, complete snapshot
+        assert manager.snapshot is before
+        assert manager.get_gpu_uid('host_a', 0) is None
+
+    assert manager.version == before.version + 1
+    assert manager.get_gpu_uid('host_a', 0) == 'GPU-a0'
+    assert before.infrastructure == {'host_a': {}}
+
+
+def test_update_from_another_thread_waits_for_current_writer():
+    manager = InfrastructureManager({'host_a': {}})
+    other_writer = threading.Thread(target=manager.update_node, args=('host_a', 'CPU', {}))
+
+    with manager.updating():
+        manager.update_node('host_a', 'GPU', gpus('GPU-a0'))
+        other_writer.start()
+        other_writer.join(timeout=0.05)
+        # Blocked, not written into this thread's staging copy
+        assert other_writer.is_alive()
+        with pytest.raises(RuntimeError):
+            with manager.updating():
+                pass
+
+    other_writer.join(timeout=5)
+    assert manager.version == 2
+    assert manager.infrastructure['host_a'] == {'GPU': gpus('GPU-a0'), 'CPU': {}}
+
+
+def test_filtering_copied_structure_leaves_snapshot_intact():
+    manager = InfrastructureManager({'host_a': {}})
+    manager.update_node('host_a', 'GPU', gpus('GPU-a0', 'GPU-a1'))
+
+    copied = InfrastructureManager.copy_structure(manager.infrastructure)
+    del copied['host_a']['GPU']['GPU-a0']
+
+    assert manager.host_gpu_uuids('host_a') == ['GPU-a0', 'GPU-a1']
+    assert list(manager.infrastructure['host_a']['GPU']) == ['GPU-a0', 'GPU-a1']
+
+
+def test_wait_for_snapshot():
+    manager = InfrastructureManager({'host_a': {}})
+    version = manager.version
+
+    publisher = threading.Timer(0.05, manager.update_node, args=('host_a', 'GPU', gpus('GPU-a0')))
+    publisher.start()
+    snapshot = manager.wait_for_snapshot(after_version=version, timeout=5)
+    publisher.join()
+
+    assert snapshot.version == version + 1
+    assert snapshot.gpu_locations == {'GPU-a0': ('host_a', 0)}
+    assert manager.wait_for_snapshot(after_version=snapshot.version, timeout=0.01).version == snapshot.version
+
+
+def test_subscribers_are_notified_about_published_snapshots_and_events():
+    manager = InfrastructureManager({'host_a': {}})
+    snapshots, events = [], []
+    manager.subscribe(snapshots.append)
+    manager.subscribe(events.append, topic='reservations')
+    manager.subscribe(lambda payload: 1 / 0, topic='reservations')
+
+    manager.update_node('host_a', 'GPU', gpus('GPU-a0'))
+    manager.publish_event('reservations', {'id': 1})
+    manager.unsubscribe(snapshots.append)
+    manager.update_node('host_a', 'GPU', None)
+
+    assert [snapshot.version for snapshot in snapshots] == [1]
+    assert events == [{'id': 1}]
@@ -0,0 +1,57 @@
+from tensorhive.database import db_session
+from tensorhive.models.Job import Job, JobStatus
+from tensorhive.models.Task import Task, TaskStatus
+
+
+def queued_job(user, name):
+    job = Job(name=name, description='', user_id=user.id)
+    job.save()
+    job.add_task(Task(command='python train.py', hostname='node', gpu_id=0))
+    job.enqueue()
+    return job
+
+
+def test_queue_follows_committed_changes_and_reloads_only_changed_jobs(tables, new_user, monkeypatch):
+    new_user.save()
+    first, second = queued_job(new_user, 'first'), queued_job(new_user, 'second')
+    loaded = []
+    load_queue = Job.queue.loader
+
+    def spy(session, job_ids):
+        loaded.append(job_ids)
+        return load_queue(session, job_ids)
+
+    monkeypatch.setattr(Job.queue, 'loader', spy)
+
+    assert [job.id for job in Job.queue.jobs()] == [first.id, second.id]
+    assert loaded == [None]
+    # Snapshots are usable after commits expire objects of db_session
+    db_session.commit()
+    assert [task.command for job in Job.queue.jobs() for task in job.tasks] == ['python train.py'] * 2
+    assert Job.queue.jobs()[0].user.username == new_user.username
+    assert loaded == [None]
+
+    third = queued_job(new_user, 'third')
+    first.dequeue()
+    second.tasks[0].status = TaskStatus.running
+    assert second.status is JobStatus.running
+    assert [job.id for job in Job.queue.jobs()] == [third.id]
+    assert loaded == [None, {first.id, second.id, third.id}]
+
+
+def test_queue_is_reconciled_with_database(tables, new_user, monkeypatch):
+    new_user.save()
+    job = queued_job(new_user, 'job')
+    assert [queued.id for queued in Job.queue.jobs()] == [job.id]
+
+    # Changed outside of the ORM, seen after reconciliation only
+    db_session.execute(Job.__table__.update().values(is_queued=False))
+    db_session.commit()
+    assert [queued.id for queued in Job.queue.jobs()] == [job.id]
+    monkeypatch.setattr(Job.queue, 'reconcile_every', 0)
+    assert Job.queue.jobs() == []
+
+    monkeypatch.setattr(Job.queue, 'reconcile_every', 600)
+    queued_job(new_user, 'other')
+    new_user.destroy()
+    assert Job.queue.jobs() == []
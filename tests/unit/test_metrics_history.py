@@ -0,0 +1,64 @@
+import time
+from tensorhive.core.metrics_history import MetricsHistory, RingBuffer, Tier
+
+
+def infrastructure(utilization, power=None):
+    return {
+        'host_a': {
+            'GPU': {
+                'GPU-a0': {
+                    'index': 0,
+                    'metrics': {
+                        'utilization': {'value': utilization, 'unit': '%'},
+                        'power': {'value': power, 'unit': 'W'}
+                    }
+                }
+            },
+            'CPU': None
+        }
+    }
+
+
+def test_ring_buffer_aggregates_samples_within_bucket():
+    buffer = RingBuffer(resolution=10, capacity=6)
+    for timestamp, value in [(100, 10.0), (105, 30.0), (110, 5.0)]:
+        buffer.add(timestamp, value)
+
+    assert list(buffer.query(100, 119)) == [(100, 20.0, 10.0, 30.0), (110, 5.0, 5.0, 5.0)]
+
+
+def test_ring_buffer_overwrites_oldest_buckets():
+    buffer = RingBuffer(resolution=1, capacity=3)
+    for timestamp in range(10):
+        buffer.add(timestamp, float(timestamp))
+
+    assert [point[0] for point in buffer.query(0, 9)] == [7, 8, 9]
+
+
+def test_history_records_and_queries_tiers():
+    history = MetricsHistory(tiers=[Tier(60, 3600), Tier(1, 60)])
+    now = time.time()
+    history.record(infrastructure(10), timestamp=now - 2)
+    history.record(infrastructure(20, power=50), timestamp=now - 1)
+
+    fine = history.query(now - 10, now)
+    assert fine['resolution'] == 1
+    series = fine['nodes']['host_a']['GPU-a0']['metrics']['utilization']
+    assert series['avg'] == [10.0, 20.0]
+    # Missing values are skipped
+    assert fine['nodes']['host_a']['GPU-a0']['metrics']['power']['avg'] == [50.0]
+    assert fine['nodes']['host_a']['GPU-a0']['type'] == 'GPU'
+
+    coarse = history.query(now - 600, now, metric_names=['utilization'])
+    assert coarse['resolution'] == 60
+    assert list(coarse['nodes']['host_a']['GPU-a0']['metrics']) == ['utilization']
+
+
+def test_history_filters():
+    history = MetricsHistory()
+    history.record(infrastructure(10))
+    now = time.time()
+
+    assert history.query(now - 10, now + 1, hostnames=['host_b'])['nodes'] == {}
+    assert history.query(now - 10, now + 1, uuids=['GPU-b0'])['nodes'] == {}
+    assert history.query(now - 10, now + 1, resolution=60)['resolution'] == 60
@@ -0,0 +1,100 @@
+import gzip
+import json
+import pytest
+from tensorhive.core.utils.MetricsSerializer import MetricsSerializer
+
+
+@pytest.fixture
+def gpus():
+    # Keys intentionally not ordered by index
+    return {
+        'GPU-1': {
+            'name': 'GeForce GTX 1060',
+            'index': 1,
+            'metrics': {
+                'fan_speed': {'value': 32, 'unit': '%'},
+                'power': {'value': None, 'unit': 'W'},
+            },
+            'processes': []
+        },
+        'GPU-0': {
+            'name': 'GeForce GTX 1060',
+            'index': 0,
+            'metrics': {
+                'fan_speed': {'value': 31, 'unit': '%'},
+                'power': {'value': 90, 'unit': 'W'},
+            },
+            'processes': [{'pid': 1979, 'command': 'python', 'owner': 'foo'}]
+        }
+    }
+
+
+def test_compact_resources_uses_parallel_arrays_ordered_by_index(gpus):
+    result = MetricsSerializer.compact_resources(gpus)
+
+    assert result['uuid'] == ['GPU-0', 'GPU-1']
+    assert result['index'] == [0, 1]
+    assert result['units'] == {'fan_speed': '%', 'power': 'W'}
+    assert result['metrics'] == {'fan_speed': [31, 32], 'power': [90, None]}
+    assert result['processes'][0][0]['pid'] == 1979
+
+
+def test_compact_resources_with_metric_type(gpus):
+    result = MetricsSerializer.compact_resources(gpus, metric_type='power')
+
+    assert result['metrics'] == {'power': [90, None]}
+    assert result['units'] == {'power': 'W'}
+
+
+def test_compact_infrastructure_sends_units_once(gpus):
+    infrastructure = {'host_a': {'GPU': gpus, 'CPU': None}, 'host_b': {'GPU': gpus}}
+    result = MetricsSerializer.compact_infrastructure(infrastructure)
+
+    assert result['units'] == {'GPU': {'fan_speed': '%', 'power': 'W'}}
+    assert result['nodes']['host_a']['CPU'] is None
+    assert 'units' not in result['nodes']['host_b']['GPU']
+    assert result['nodes']['host_b']['GPU']['metrics']['fan_speed'] == [31, 32]
+
+
+@pytest.mark.parametrize('accept,expected', [
+    (None, MetricsSerializer.JSON),
+    ('application/json', MetricsSerializer.JSON),
+    ('text/html, application/vnd.tensorhive.compact+json;q=0.9', MetricsSerializer.COMPACT_JSON),
+    ('application/json, application/vnd.tensorhive.compact+json;q=0.5', MetricsSerializer.JSON),
+    ('application/vnd.tensorhive.compact+json;q=0, */*;q=0.1', MetricsSerializer.JSON),
+])
+def test_negotiate(accept, expected):
+    assert MetricsSerializer.negotiate(accept) == expected
+
+
+def test_encode_gzip_compressed_json(gpus):
+    content = MetricsSerializer.compact_infrastructure({'host_{}'.format(i): {'GPU': gpus} for i in range(20)})
+    body, headers = MetricsSerializer.encode(content, MetricsSerializer.COMPACT_JSON, accept_encoding='gzip, br')
+
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Content-Type'] == MetricsSerializer.COMPACT_JSON
+    assert json.loads(gzip.decompress(body).decode('utf-8')) == content
+
+
+@pytest.mark.parametrize('accept_encoding,compressed', [
+    (None, False),
+    ('gzip;q=0', False),
+    ('br, *;q=0.1', True),
+    ('*, gzip;q=0', False),
+])
+def test_encode_respects_gzip_quality(gpus, accept_encoding, compressed):
+    content = MetricsSerializer.compact_infrastructure({'host_{}'.format(i): {'GPU': gpus} for i in range(20)})
+    _, headers = MetricsSerializer.encode(content, MetricsSerializer.COMPACT_JSON, accept_encoding=accept_encoding)
+
+    assert ('Content-Encoding' in headers) == compressed
+
+
+def test_encode_msgpack(gpus):
+    msgpack = pytest.importorskip('msgpack')
+    content = MetricsSerializer.compact_resources(gpus)
+    assert MetricsSerializer.negotiate('application/x-msgpack') == MetricsSerializer.MSGPACK
+
+    body, headers = MetricsSerializer.encode(content, MetricsSerializer.MSGPACK)
+
+    assert 'Content-Encoding' not in headers
+    assert msgpack.unpackb(body, raw=False) == content
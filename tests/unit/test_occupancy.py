@@ -0,0 +1,41 @@
+import datetime
+import pytest
+from tensorhive.core.occupancy import OccupancyMatrix, occupied_per_bucket
+from tensorhive.core.usage_journal import UsageRecord
+from tensorhive.core.usage_rollups import UsageRollupWriter
+from tensorhive.core.utils.time import utc_timestamp
+from tensorhive.models.Reservation import Reservation
+
+DAY = datetime.datetime(2020, 1, 1)
+
+
+def test_occupied_per_bucket_counts_overlapping_intervals_once():
+    intervals = [(-30, 30), (90, 150), (100, 120), (280, 400)]
+
+    assert occupied_per_bucket(intervals, num_buckets=3, bucket_size=100) == [0.4, 0.5, 0.2]
+
+
+def test_matrix_of_reservations_and_utilization(tables, new_user, resource1, resource2):
+    new_user.save()
+    for start, end, cancelled in [(1, 3, False), (5, 6, True)]:
+        Reservation(user_id=new_user.id, title='TEST', description='', resource_id=resource1.id,
+                    start=DAY + datetime.timedelta(hours=start), end=DAY + datetime.timedelta(hours=end),
+                    is_cancelled=cancelled).save()
+    writer = UsageRollupWriter()
+    writer.add([(UsageRecord(utc_timestamp(DAY) + 3600, resource1.id, 1, new_user.id, 80.0, 0.0, 0.0, 0.0),
+                 'host_0')])
+    writer.flush()
+
+    matrix = OccupancyMatrix([resource1.id, resource2.id], DAY, DAY + datetime.timedelta(hours=7),
+                             bucket_size=datetime.timedelta(hours=2))
+    occupancy, owners = matrix.occupancy()
+
+    assert matrix.end == DAY + datetime.timedelta(hours=8)
+    assert occupancy == [[0.5, 0.5, 0.0, 0.0], [0.0] * 4]
+    assert owners == [[new_user.id, new_user.id, None, None], [None] * 4]
+    assert matrix.utilization() == [[80.0, None, None, None], [None] * 4]
+
+
+def test_matrix_size_is_limited():
+    with pytest.raises(AssertionError):
+        OccupancyMatrix(['GPU-0'], DAY, DAY + datetime.timedelta(days=365), bucket_size=datetime.timedelta(minutes=1))
@@ -0,0 +1,25 @@
+from tensorhive.core.placement import Placement, choose_gpus, with_visible_devices
+
+
+def index_of(hostname, gpu_uid):
+    return int(gpu_uid.split('-')[1])
+
+
+def test_smallest_sufficient_host_is_chosen():
+    free_gpus = {'big': ['GPU-0', 'GPU-1', 'GPU-2', 'GPU-3'], 'small': ['GPU-4', 'GPU-5'], 'tiny': ['GPU-6']}
+
+    assert choose_gpus(2, free_gpus, index_of) == Placement('small', ['GPU-4', 'GPU-5'])
+    assert choose_gpus(5, free_gpus, index_of) is None
+
+
+def test_neighbouring_gpus_are_preferred():
+    free_gpus = {'node': ['GPU-6', 'GPU-0', 'GPU-4', 'GPU-5']}
+
+    assert choose_gpus(3, free_gpus, index_of) == Placement('node', ['GPU-4', 'GPU-5', 'GPU-6'])
+
+
+def test_visible_devices_are_replaced():
+    command = 'CUDA_VISIBLE_DEVICES=0 LIB=x python train.py'
+
+    assert with_visible_devices(command, ['GPU-a', 'GPU-b']) == \
+        'CUDA_VISIBLE_DEVICES=GPU-a,GPU-b LIB=x python train.py'
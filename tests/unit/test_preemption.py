@@ -0,0 +1,97 @@
+import datetime
+from datetime import timedelta
+from types import SimpleNamespace
+from tensorhive.core.services import JobSchedulingService as service_module
+from tensorhive.core.services.JobSchedulingService import JobSchedulingService
+from tensorhive.models.Job import Job, JobStatus
+from tensorhive.models.JobRun import JobRun
+from tensorhive.models.Task import Task, TaskStatus
+
+
+def running_queued_job(user):
+    job = Job(name='job', description='', user_id=user.id, is_queued=True, _status=JobStatus.running)
+    job.save()
+    job.add_task(Task(command='python train.py', hostname='node', gpu_id=0, pid=1234, _status=TaskStatus.running))
+    JobRun.start(job)
+    return job
+
+
+def test_preempted_job_is_signalled_then_interrupted_then_killed_and_requeued(tables, new_user, monkeypatch):
+    new_user.save()
+    job = running_queued_job(new_user)
+    signals, stops = [], []
+    monkeypatch.setattr(service_module.task_nursery, 'signal',
+                        lambda pid, host, user, signal: signals.append((pid, signal)) or 0)
+    monkeypatch.setattr(service_module, 'business_stop', lambda id, gracefully: stops.append(gracefully))
+    service = JobSchedulingService(interval=1, stop_attempts_after=1, preemption_signal='USR1',
+                                   preemption_grace_period=5)
+    reservation_start = datetime.datetime.utcnow() + timedelta(minutes=20)
+
+    service.preempt(job, reservation_start)
+    assert signals == [(1234, 'USR1')] and stops == []
+    assert service.preemptions[job.id].deadline < reservation_start
+    assert JobRun.open_run(job.id).interrupted
+
+    # Grace period is over
+    service.preemptions[job.id] = service.preemptions[job.id]._replace(deadline=datetime.datetime.utcnow())
+    service.preempt(job, reservation_start)
+    service.preempt(job, reservation_start)
+    assert stops == [True, False]
+    assert len(signals) == 1
+
+    job.tasks[0].status = TaskStatus.not_running
+    assert job.status is JobStatus.not_running and not job.is_queued
+    service.requeue_preempted()
+    assert job.status is JobStatus.pending and job.is_queued
+    assert service.preemptions == {}
+
+
+def test_job_is_stopped_right_away_without_preemption_signal(tables, new_user, monkeypatch):
+    new_user.save()
+    job = running_queued_job(new_user)
+    stops = []
+    monkeypatch.setattr(service_module, 'business_stop', lambda id, gracefully: stops.append(gracefully))
+    service = JobSchedulingService(interval=1, stop_attempts_after=1)
+
+    service.preempt(job, datetime.datetime.utcnow() + timedelta(minutes=20))
+    assert stops == [True]
+
+
+def test_signalled_job_is_requeued_even_if_preemption_is_no_longer_needed(tables, new_user, monkeypatch):
+    new_user.save()
+    job = running_queued_job(new_user)
+    signals, stops, running_pids = [], [], [1234]
+    reservation_start = [datetime.datetime.utcnow() + timedelta(minutes=20)]
+    monkeypatch.setattr(service_module.task_nursery, 'signal',
+                        lambda pid, host, user, signal: signals.append((pid, signal)) or 0)
+    monkeypatch.setattr(service_module.task_nursery, 'running', lambda host, user: running_pids)
+    monkeypatch.setattr(service_module, 'business_stop', lambda id, gracefully: stops.append(gracefully))
+    service = JobSchedulingService(interval=1, stop_attempts_after=1, preemption_signal='USR1',
+                                   preemption_grace_period=5)
+    scheduler = SimpleNamespace(get_assigned_gpu_uids=lambda task, occupation: ['GPU-0'])
+    monkeypatch.setattr(service, '_scheduler', scheduler)
+    monkeypatch.setattr(service, 'earliest_reservation_start', lambda job, occupation, period: reservation_start[0])
+    occupation = {'node': {'GPU-0': []}}
+
+    service.sync_running_from_queue(occupation)
+    assert signals == [(1234, 'USR1')]
+
+    # Reservation is cancelled, but the job may be exiting after the signal already
+    reservation_start[0] = None
+    service.sync_running_from_queue(occupation)
+    assert service.preemptions[job.id].deadline is None
+    assert stops == [] and job.status is JobStatus.running
+
+    # Needed again: new grace period, without another signal
+    reservation_start[0] = datetime.datetime.utcnow() + timedelta(minutes=20)
+    service.sync_running_from_queue(occupation)
+    assert service.preemptions[job.id].deadline < reservation_start[0]
+    assert len(signals) == 1 and stops == []
+
+    reservation_start[0] = None
+    service.sync_running_from_queue(occupation)
+    # Job exits after saving its checkpoint
+    running_pids.clear()
+    service.sync_running_from_queue(occupation)
+    assert job.status is JobStatus.pending and job.is_queued
+    assert service.preemptions == {}
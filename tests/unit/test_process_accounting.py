@@ -0,0 +1,71 @@
+import datetime
+from tensorhive.core.process_accounting import ProcessAccountant
+from tensorhive.models.GPUProcessSession import GPUProcessSession
+
+DAY = datetime.datetime(2020, 1, 1)
+START = DAY.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def infrastructure(*processes, reachable=True):
+    gpu_data = {'processes': list(processes)} if reachable else {}
+    return {'host_0': {'GPU': {'GPU-0': gpu_data}}}
+
+
+def process(pid, owner='alice', mem_used=100):
+    return {'pid': pid, 'owner': owner, 'command': 'python', 'mem_used': mem_used}
+
+
+def test_session_lasts_from_first_to_last_sample(tables):
+    accountant = ProcessAccountant(checkpoint_interval=3600)
+    accountant.update(infrastructure(process(1)), START)
+    accountant.update(infrastructure(process(1, mem_used=300), process(2, owner='bob')), START + 60)
+    # Running processes are not written before checkpoint
+    assert GPUProcessSession.get(1).last_seen == DAY
+
+    accountant.update(infrastructure(process(2, owner='bob')), START + 120)
+
+    finished = GPUProcessSession.get(1)
+    assert (finished.owner, finished.last_seen, finished.samples) == ('alice', DAY + datetime.timedelta(minutes=1), 2)
+    assert (finished.mem_used_avg, finished.mem_used_max) == (200, 300)
+    assert len(accountant.open) == 1
+
+
+def test_unknown_processes_keep_sessions_open(tables):
+    accountant = ProcessAccountant(checkpoint_interval=3600)
+    accountant.update(infrastructure(process(1)), START)
+    accountant.update(infrastructure(reachable=False), START + 60)
+
+    assert len(accountant.open) == 1
+
+
+def test_sessions_of_gpu_missing_for_long_are_finished(tables):
+    accountant = ProcessAccountant(checkpoint_interval=60, missing_checkpoints=3)
+    accountant.update(infrastructure(process(1)), START)
+    accountant.update(infrastructure(process(1)), START + 30)
+    # Host removed from infrastructure
+    accountant.update({}, START + 200)
+    assert len(accountant.open) == 1
+
+    accountant.update({}, START + 240)
+
+    assert accountant.open == {}
+    assert GPUProcessSession.get(1).last_seen == DAY + datetime.timedelta(seconds=30)
+
+
+def test_open_sessions_are_checkpointed(tables):
+    accountant = ProcessAccountant(checkpoint_interval=60)
+    accountant._last_checkpoint = START
+    accountant.update(infrastructure(process(1)), START)
+    accountant.update(infrastructure(process(1)), START + 90)
+
+    assert GPUProcessSession.get(1).last_seen == DAY + datetime.timedelta(seconds=90)
+
+
+def test_gpu_hours_by_owner(tables):
+    accountant = ProcessAccountant()
+    accountant.update(infrastructure(process(1), process(2, owner='bob')), START)
+    accountant.update(infrastructure(process(2, owner='bob')), START + 2 * 3600)
+    accountant.update(infrastructure(), START + 3 * 3600)
+
+    hours = GPUProcessSession.gpu_hours_by_owner(DAY + datetime.timedelta(hours=1), DAY + datetime.timedelta(days=1))
+    assert hours == {'bob': 1.0}
@@ -0,0 +1,61 @@
+import datetime
+from tensorhive.core.reservation_index import ReservationIndex
+from tensorhive.models.Reservation import Reservation
+
+NOW = datetime.datetime(2020, 1, 1, 12)
+GPU = 'GPU-d38d4de3-85ee-e837-3d87-e8e2faeb6a63'
+
+
+def hours(value: float) -> datetime.datetime:
+    return NOW + datetime.timedelta(hours=value)
+
+
+def test_upcoming_returns_ongoing_and_near_reservations_in_order():
+    index = ReservationIndex([(3, GPU, 1, hours(5), hours(6)), (1, GPU, 1, hours(-2), hours(-1)),
+                              (2, GPU, 2, hours(-1), hours(1)), (4, GPU, 1, hours(2), hours(3))])
+
+    upcoming = index.upcoming(GPU, NOW, period_after=datetime.timedelta(hours=2))
+
+    assert [interval.id for interval in upcoming] == [2, 4]
+    assert index.upcoming('GPU-other', NOW, datetime.timedelta(hours=2)) == []
+
+
+def test_overlapping_skips_touching_reservations():
+    index = ReservationIndex([(1, GPU, 1, hours(0), hours(1)), (2, GPU, 1, hours(1), hours(2)),
+                              (3, GPU, 1, hours(2), hours(3))])
+
+    assert [interval.id for interval in index.overlapping(GPU, hours(1), hours(2))] == [2]
+    assert [interval.id for interval in index.overlapping(GPU, hours(0.5), hours(2.5))] == [1, 2, 3]
+    assert index.conflicts([(GPU, hours(3), hours(4)), (GPU, hours(2.5), hours(4))]) == [False, True]
+    assert index.next_after(GPU, hours(0.5)).id == 2
+
+
+def test_load_skips_cancelled_and_distant_reservations(tables, new_user, resource1, resource2):
+    new_user.save()
+    for resource, start, end, cancelled in [(resource1, 0, 1, False), (resource1, 1, 2, True),
+                                            (resource2, 1, 2, False), (resource2, 30, 31, False)]:
+        Reservation(user_id=new_user.id, title='TEST', description='', resource_id=resource.id,
+                    start=hours(start), end=hours(end), is_cancelled=cancelled).save()
+
+    index = ReservationIndex.load(NOW, hours(24))
+
+    assert len(index) == 2
+    assert [interval.start for interval in index.upcoming(resource2.id, NOW, datetime.timedelta(hours=1))] \
+        == [hours(1)]
+
+
+def test_shared_index_follows_committed_changes(tables, new_reservation, new_user):
+    new_reservation.save()
+    start, end = new_reservation.start, new_reservation.end
+    candidates = [(new_reservation.resource_id, start - datetime.timedelta(hours=1), start),
+                  (new_reservation.resource_id, start, end)]
+    assert Reservation.find_conflicts(candidates) == [False, True]
+
+    new_reservation.is_cancelled = True
+    new_reservation.save()
+    assert Reservation.find_conflicts(candidates) == [False, False]
+
+    new_reservation.is_cancelled = False
+    new_reservation.save()
+    new_user.destroy()
+    assert Reservation.find_conflicts(candidates) == [False, False]
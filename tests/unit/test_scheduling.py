@@ -0,0 +1,116 @@
+import datetime
+from datetime import timedelta
+from tensorhive.core.placement import Placement
+from tensorhive.core.runtime_estimation import RuntimeEstimator
+from tensorhive.core.scheduling import BackfillingScheduler, GreedyScheduler
+from tensorhive.models.Job import Job, JobPriority, JobStatus
+from tensorhive.models.JobRun import JobRun
+from tensorhive.models.Task import Task, TaskPlacement, TaskStatus
+
+GPUS = ['GPU-0', 'GPU-1']
+
+
+def queued_job(user, gpu_ids, priority=JobPriority.normal, duration=None, gpu_count=None):
+    job = Job(name='job', description='', user_id=user.id, priority=priority, is_queued=True,
+              _status=JobStatus.pending)
+    if duration is not None:
+        job._stop_at = datetime.datetime.utcnow() + duration
+    job.save()
+    for gpu_id in gpu_ids:
+        job.add_task(Task(command='python train.py', hostname='node', gpu_id=gpu_id,
+                          _status=TaskStatus.not_running))
+    if gpu_count is not None:
+        job.add_task(Task(command='python train.py', hostname='node', placement=TaskPlacement.host,
+                          gpu_count=gpu_count, _status=TaskStatus.not_running))
+    return job
+
+
+def schedule(jobs, slots, scheduler=None):
+    scheduler = scheduler or BackfillingScheduler()
+    return scheduler.schedule_jobs({job: {'node': GPUS} for job in jobs}, {'node': slots})
+
+
+def test_higher_priority_goes_first(tables, new_user):
+    new_user.save()
+    normal = queued_job(new_user, [0])
+    high = queued_job(new_user, [0], priority=JobPriority.high)
+
+    assert schedule([normal, high], {'GPU-0': None, 'GPU-1': None}) == [high]
+
+
+def test_short_job_is_backfilled_before_blocked_head(tables, new_user):
+    new_user.save()
+    running = queued_job(new_user, [1], duration=timedelta(hours=2))
+    running._status = JobStatus.running
+    running.save()
+    head = queued_job(new_user, [0, 1])
+    long_job = queued_job(new_user, [0], duration=timedelta(hours=3))
+    short_job = queued_job(new_user, [0], duration=timedelta(hours=1))
+
+    assert schedule([head, long_job, short_job], {'GPU-0': None, 'GPU-1': 0}) == [short_job]
+
+
+def test_gap_before_reservation_is_filled_by_short_job(tables, new_user):
+    new_user.save()
+    long_job = queued_job(new_user, [0], duration=timedelta(hours=2))
+    short_job = queued_job(new_user, [0], duration=timedelta(hours=1))
+
+    assert schedule([long_job, short_job], {'GPU-0': 90, 'GPU-1': None}) == [short_job]
+
+
+def test_fair_share_prefers_user_with_less_usage(tables, new_user, new_admin, monkeypatch):
+    new_user.save()
+    new_admin.save()
+    heavy_user_job = queued_job(new_user, [0])
+    light_user_job = queued_job(new_admin, [0])
+    monkeypatch.setattr(BackfillingScheduler, 'usage_by_user', lambda self, now: {new_user.username: 10.0})
+
+    assert schedule([heavy_user_job, light_user_job], {'GPU-0': None, 'GPU-1': None}) == [light_user_job]
+
+
+def test_flexible_task_takes_any_free_gpu(tables, new_user):
+    new_user.save()
+    pinned = queued_job(new_user, [0])
+    flexible = queued_job(new_user, [], gpu_count=1)
+    too_big = queued_job(new_user, [], gpu_count=2)
+
+    for scheduler in [GreedyScheduler(), BackfillingScheduler()]:
+        assert schedule([pinned, flexible, too_big], {'GPU-0': None, 'GPU-1': None}, scheduler) == [pinned, flexible]
+        assert scheduler.placements == {flexible.tasks[0].id: Placement('node', ['GPU-1'])}
+
+
+def past_runs(user, hours, interrupted=False):
+    finished_at = datetime.datetime.utcnow()
+    for duration in hours:
+        JobRun(user_id=user.id, command_key=JobRun.command_key_of(['python train.py']),
+               started_at=finished_at - timedelta(hours=duration), finished_at=finished_at,
+               interrupted=interrupted).save()
+
+
+def test_runtime_estimate_prefers_own_history(tables, new_user, new_admin):
+    new_user.save()
+    new_admin.save()
+    past_runs(new_user, [1, 2, 3])
+    past_runs(new_user, [10], interrupted=True)
+    past_runs(new_admin, [10])
+    user_job, admin_job = queued_job(new_user, [0]), queued_job(new_admin, [0])
+
+    estimates = RuntimeEstimator().estimate_many([user_job, admin_job])
+
+    assert estimates[user_job.id] == timedelta(hours=2)
+    assert estimates[admin_job.id] == timedelta(hours=2.5)
+
+
+def test_held_job_start_is_predicted_from_estimated_end_of_running_job(tables, new_user):
+    new_user.save()
+    past_runs(new_user, [2, 2, 2])
+    running = queued_job(new_user, [1])
+    running._status = JobStatus.running
+    running.save()
+    JobRun.start(running, at=datetime.datetime.utcnow() - timedelta(hours=1))
+    head = queued_job(new_user, [0, 1])
+    scheduler = BackfillingScheduler(runtime_estimator=RuntimeEstimator())
+
+    assert schedule([head], {'GPU-0': None, 'GPU-1': 0}, scheduler) == []
+    expected_start = scheduler.predicted_at + timedelta(hours=1)
+    assert abs(scheduler.predicted_starts[head.id] - expected_start) < timedelta(minutes=1)
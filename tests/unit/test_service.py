@@ -0,0 +1,45 @@
+import time
+from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
+from tensorhive.core.services.Service import Service
+
+
+class DummyService(Service):
+    def inject(self, injected_object):
+        pass
+
+    def do_run(self):
+        pass
+
+
+def test_service_is_woken_up_by_subscribed_topic():
+    manager = InfrastructureManager({'host_a': {}})
+    service = DummyService(trigger_topics=[InfrastructureManager.SNAPSHOT_TOPIC])
+    service.subscribe_triggers(manager)
+
+    assert service.wait_for_trigger(timeout=0.01) is False
+    manager.update_node('host_a', 'GPU', None)
+    assert service.wait_for_trigger(timeout=5) is True
+    # Event has been consumed
+    assert service.wait_for_trigger(timeout=0.01) is False
+
+
+def test_service_without_topics_ignores_published_snapshots():
+    manager = InfrastructureManager({'host_a': {}})
+    service = DummyService()
+    service.subscribe_triggers(manager)
+
+    manager.update_node('host_a', 'GPU', None)
+    assert service.wait_for_trigger(timeout=0.01) is False
+
+
+def test_debounce_coalesces_burst_of_events():
+    service = DummyService(debounce=0.2)
+    service.trigger()
+    assert service.wait_for_trigger(timeout=0) is True
+
+    start = time.monotonic()
+    for _ in range(3):
+        service.trigger()
+    assert service.wait_for_trigger(timeout=5) is True
+    assert time.monotonic() - start >= 0.15
+    assert service.wait_for_trigger(timeout=0.01) is False
@@ -0,0 +1,33 @@
+from datetime import timedelta
+from tensorhive.core.scheduling import GreedyScheduler
+from tensorhive.core.simulation import Simulation, Trace, TraceJob, TraceReservation, load_trace, synthetic_cluster, \
+    synthetic_trace
+
+
+def test_job_preempted_by_reservation_resumes_from_checkpoint():
+    trace = Trace(jobs=[TraceJob(submit=timedelta(0), user='alice', duration=timedelta(hours=3), gpus=[2])],
+                  reservations=[TraceReservation(user='bob', hostname='node-000', gpu_index=0,
+                                                 start=timedelta(hours=1), end=timedelta(hours=2))])
+
+    report = Simulation(GreedyScheduler(), synthetic_cluster(hosts=1, gpus_per_host=2), trace,
+                        tick=timedelta(minutes=1)).run()
+
+    assert report.completed == 1
+    assert report.preempted_runs == 1
+    assert report.lost_gpu_hours == 0
+    # Ran for 30 minutes (until reservation was near), resumed after it with the work saved by the checkpoint
+    assert timedelta(hours=4, minutes=25) <= report.makespan <= timedelta(hours=4, minutes=35)
+    assert report.average_wait == timedelta(0)
+
+
+def test_trace_is_loaded_from_json_lines():
+    trace = load_trace([
+        '{"type": "job", "submit": 5, "user": "alice", "duration": 90, "gpus": [8, 8], "priority": "high"}',
+        '',
+        '{"type": "reservation", "user": "bob", "host": "node-000", "gpu": 3, "start": 60, "end": 180}',
+    ])
+
+    assert trace.jobs[0].gpus == [8, 8] and trace.jobs[0].submit == timedelta(minutes=5)
+    assert trace.reservations[0].end == timedelta(hours=3)
+    assert synthetic_trace(synthetic_cluster(2, 4), jobs=20, reservations=3, seed=7) == \
+        synthetic_trace(synthetic_cluster(2, 4), jobs=20, reservations=3, seed=7)
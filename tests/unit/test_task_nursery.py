@@ -0,0 +1,53 @@
+from tensorhive.core.task_nursery import ScreenCommandBuilder
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+
+TRAIN_SCRIPT = '''
+import signal, sys, time
+signal.signal(signal.SIGUSR1, lambda *args: print('checkpoint', flush=True) or sys.exit(0))
+print('ready', flush=True)
+time.sleep(10)
+'''
+
+
+def screen_window_command(spawn_command, session_name):
+    '''Command run by screen in its window (screen itself is not needed here)'''
+    prefix, suffix = 'screen -Dm -S {} '.format(session_name), ' & echo $!'
+    assert spawn_command.startswith(prefix) and spawn_command.endswith(suffix)
+    return shlex.split(spawn_command[len(prefix):-len(suffix)])
+
+
+def test_spawned_command_protects_wrapper_and_tee_from_user_signals():
+    command = ScreenCommandBuilder.spawn('python train.py', 'tensorhive_task', custom_log_name='task_1')
+
+    assert screen_window_command(command, 'tensorhive_task') == [
+        'bash', '-c',
+        "trap : USR1 USR2; python train.py |& (trap '' USR1 USR2; exec tee --ignore-interrupts "
+        "$(mkdir --parents ~/TensorHiveLogs && echo ~/TensorHiveLogs/task_1.log))"]
+
+
+def test_output_after_signal_reaches_log(tmp_path):
+    script = tmp_path / 'train.py'
+    script.write_text(TRAIN_SCRIPT)
+    train_command = '{} {}'.format(sys.executable, script)
+    command = ScreenCommandBuilder.spawn(train_command, 'tensorhive_task', custom_log_name='task_1')
+    log_file = tmp_path / 'TensorHiveLogs' / 'task_1.log'
+    window = subprocess.Popen(screen_window_command(command, 'tensorhive_task'), start_new_session=True,
+                              env=dict(os.environ, HOME=str(tmp_path)), stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 10
+        while not (log_file.exists() and 'ready' in log_file.read_text()):
+            assert time.monotonic() < deadline, 'Command did not start'
+            time.sleep(0.05)
+
+        # Same as ScreenCommandBuilder.signal: the whole process group of screen's window gets it
+        os.killpg(window.pid, signal.SIGUSR1)
+        assert window.wait(timeout=10) == 0
+    finally:
+        if window.poll() is None:
+            os.killpg(window.pid, signal.SIGKILL)
+    assert log_file.read_text().split() == ['ready', 'checkpoint']
@@ -0,0 +1,58 @@
+import csv
+import io
+import pytest
+from tensorhive.core.usage_export import UsageExporter, COLUMNS
+from tensorhive.core.usage_journal import UsageJournal, UsageRecord
+
+
+@pytest.fixture
+def exporter(tmp_path, resource1, resource2):
+    resource1.hostname = 'host_0'
+    resource1.save()
+    resource2.hostname = 'host_1'
+    resource2.save()
+    journal = UsageJournal(tmp_path)
+    journal.append([
+        UsageRecord(1577836800.0 + offset, uuid, 1, user_id, offset, float('nan'), 100.0, 50.0)
+        for offset in range(5)
+        for uuid, user_id in [(resource1.id, 1), (resource2.id, 2)]
+    ])
+    return UsageExporter(journal, chunk_rows=2)
+
+
+def test_csv_export_is_streamed_in_chunks(tables, exporter):
+    pieces = list(exporter.stream(UsageExporter.CSV, hostnames=['host_0']))
+    rows = list(csv.reader(io.StringIO(b''.join(pieces).decode('utf-8'))))
+
+    assert rows[0] == COLUMNS
+    assert len(rows) == 1 + 5
+    assert {row[1] for row in rows[1:]} == {'host_0'}
+    # Missing values are left empty
+    assert rows[1][COLUMNS.index('mem_util')] == ''
+    # 3 chunks (2 + 2 + 1 rows) and the remainder
+    assert len(pieces) == 4
+
+
+def test_export_filtered_by_users(tables, exporter):
+    output = io.BytesIO()
+    exporter.export(UsageExporter.CSV, output, user_ids=[2], start=1577836801.0)
+    rows = list(csv.reader(io.StringIO(output.getvalue().decode('utf-8'))))[1:]
+
+    assert [(row[1], row[4]) for row in rows] == [('host_1', '2')] * 4
+
+
+@pytest.mark.parametrize('export_format', [UsageExporter.ARROW, UsageExporter.PARQUET])
+def test_columnar_export(tables, exporter, export_format):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    data = b''.join(exporter.stream(export_format))
+    if export_format == UsageExporter.ARROW:
+        table = pyarrow.ipc.open_stream(data).read_all()
+    else:
+        table = pyarrow.parquet.read_table(pyarrow.BufferReader(data))
+
+    assert table.num_rows == 10
+    assert table.column_names == COLUMNS
+    assert table.column('mem_util').null_count == 10
@@ -0,0 +1,133 @@
+import datetime
+import math
+from tensorhive.core.usage_journal import RetentionPolicy, UsageJournal, UsageRecord
+
+UUID = 'GPU-c6d01ed6-8240-2e11-efe9-aa32794b8273'
+DAY = datetime.datetime(2020, 1, 31, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def record(timestamp, reservation_id=1, utilization=50.0):
+    return UsageRecord(timestamp=timestamp, uuid=UUID, reservation_id=reservation_id, user_id=7,
+                       utilization=utilization, mem_util=10.0, mem_used=1024.0, power=None)
+
+
+def test_appended_records_are_read_back_in_order(tmp_path):
+    journal = UsageJournal(tmp_path)
+    journal.append([record(DAY + 1), record(DAY + 2, reservation_id=2)])
+    journal.append([record(DAY + 3, utilization=None)])
+
+    records = list(journal.read())
+    assert [r.timestamp for r in records] == [DAY + 1, DAY + 2, DAY + 3]
+    assert records[0].uuid == UUID
+    assert records[0].user_id == 7
+    assert math.isnan(records[0].power)
+    assert math.isnan(records[2].utilization)
+
+
+def test_records_are_split_into_daily_segments_and_filtered(tmp_path):
+    journal = UsageJournal(tmp_path)
+    journal.append([record(DAY - 10), record(DAY + 10), record(DAY + 20, reservation_id=2)])
+    journal.close()
+
+    assert [path.name for path in journal.segments()] == ['usage-2020-01-30.bin', 'usage-2020-01-31.bin']
+    assert [path.name for path in journal.segments(start=DAY)] == ['usage-2020-01-31.bin']
+    assert [r.timestamp for r in journal.read(start=DAY)] == [DAY + 10, DAY + 20]
+    assert [r.timestamp for r in journal.read(reservation_ids={2})] == [DAY + 20]
+
+
+def test_truncated_record_is_skipped(tmp_path):
+    journal = UsageJournal(tmp_path)
+    journal.read_chunk_records = 1
+    journal.append([record(DAY + 1), record(DAY + 2)])
+    journal.close()
+
+    segment = journal.segments()[0]
+    with segment.open('ab') as file:
+        file.write(b'\x00' * 10)
+
+    assert len(list(journal.read())) == 2
+
+
+def test_records_appended_after_torn_tail_stay_aligned(tmp_path):
+    journal = UsageJournal(tmp_path)
+    journal.append([record(DAY + 1)])
+    journal.close()
+    segment = journal.segments()[0]
+    with segment.open('ab') as file:
+        file.write(b'\xff' * 10)
+
+    reopened = UsageJournal(tmp_path)
+    reopened.append([record(DAY + 2), record(DAY + 3)])
+    reopened.close()
+
+    assert [r.timestamp for r in reopened.read()] == [DAY + 1, DAY + 2, DAY + 3]
+    assert segment.stat().st_size == UsageJournal.HEADER.size + 3 * UsageJournal.RECORD.size
+
+
+def test_reading_stops_at_corrupted_record(tmp_path):
+    journal = UsageJournal(tmp_path)
+    journal.append([record(DAY + 1), record(DAY + 2)])
+    journal.close()
+    segment = journal.segments()[0]
+    data = bytearray(segment.read_bytes())
+    # UUID of the second record is not ASCII anymore
+    data[UsageJournal.HEADER.size + UsageJournal.RECORD.size + 8] = 0xff
+    segment.write_bytes(bytes(data))
+
+    assert [r.timestamp for r in journal.read()] == [DAY + 1]
+
+
+def test_old_segments_are_compacted_then_removed(tmp_path):
+    journal = UsageJournal(tmp_path)
+    # 0-299s averaged into one archived record, 300s into another
+    journal.append([record(DAY, utilization=10.0), record(DAY + 60, utilization=30.0),
+                    record(DAY + 300, utilization=90.0), record(DAY + 86400 * 3)])
+    journal.close()
+    first_day = datetime.datetime.utcfromtimestamp(DAY).date()
+    policy = RetentionPolicy(compact_after_days=1, delete_after_days=5, archive_resolution=300)
+
+    # Bounded work: only the oldest segment is compacted in a single call
+    assert journal.maintain(policy, today=first_day + datetime.timedelta(days=4)) == 1
+    assert [path.name for path in journal.segments()] == ['archive-2020-01-31.bin', 'usage-2020-02-03.bin']
+    archived = list(journal.read(end=DAY + 86400 - 1))
+    assert [(r.timestamp, r.utilization) for r in archived] == [(DAY, 20.0), (DAY + 300, 90.0)]
+
+    assert journal.maintain(policy, today=first_day + datetime.timedelta(days=6), max_operations=5) == 2
+    assert [path.name for path in journal.segments()] == ['archive-2020-02-03.bin']
+
+
+def test_oldest_segments_are_removed_over_size_limit(tmp_path):
+    journal = UsageJournal(tmp_path)
+    journal.append([record(DAY + 86400 * day) for day in range(3)])
+    journal.close()
+    segment_size = journal.segments()[0].stat().st_size
+    policy = RetentionPolicy(compact_after_days=30, delete_after_days=60, max_bytes=2 * segment_size)
+    today = datetime.datetime.utcfromtimestamp(DAY).date() + datetime.timedelta(days=2)
+
+    assert journal.maintain(policy, today=today, max_operations=5) == 1
+    assert [path.name for path in journal.segments()] == ['usage-2020-02-01.bin', 'usage-2020-02-02.bin']
+
+
+def test_big_segment_is_compacted_over_many_calls(tmp_path):
+    journal = UsageJournal(tmp_path)
+    journal.append([record(DAY + second, utilization=float(second // 10 % 2) * 100) for second in range(0, 600, 10)])
+    journal.close()
+    first_day = datetime.datetime.utcfromtimestamp(DAY).date()
+    policy = RetentionPolicy(compact_after_days=1, delete_after_days=5, archive_resolution=300)
+    budget = 25 * UsageJournal.RECORD.size
+
+    today = first_day + datetime.timedelta(days=2)
+    assert journal.maintain(policy, today=today, max_compacted_bytes=budget) == 0
+    assert journal.maintain(policy, today=today, max_compacted_bytes=budget) == 0
+    assert journal.maintain(policy, today=today, max_compacted_bytes=budget) == 1
+
+    assert [path.name for path in journal.segments()] == ['archive-2020-01-31.bin']
+    assert [(r.timestamp, r.utilization) for r in journal.read()] == [(DAY, 50.0), (DAY + 300, 50.0)]
+
+
+def test_policy_keeps_raw_samples_of_longest_reservation():
+    policy = RetentionPolicy(compact_after_days=2, delete_after_days=5).validated()
+
+    assert policy.compact_after_days == RetentionPolicy.MIN_COMPACT_AFTER_DAYS
+    assert policy.delete_after_days == RetentionPolicy.MIN_COMPACT_AFTER_DAYS
+    assert RetentionPolicy(compact_after_days=14, delete_after_days=365).validated().compact_after_days == 14
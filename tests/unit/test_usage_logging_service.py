@@ -0,0 +1,182 @@
+import datetime
+import pytest
+import time
+from tensorhive.core.idle_reservations import IdleReservationAction
+from tensorhive.core.managers.InfrastructureManager import InfrastructureManager
+from tensorhive.core.services.UsageLoggingService import UsageLoggingService
+from tensorhive.core.usage_journal import UsageRecord
+from tensorhive.models.Reservation import Reservation
+from tensorhive.models.ReservationUsageSummary import ReservationUsageSummary
+from tensorhive.models.UsageRollup import UsageRollup
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(UsageLoggingService, 'log_dir', tmp_path)
+    return UsageLoggingService()
+
+
+def record(reservation, utilization):
+    return UsageRecord(timestamp=time.time(), uuid=reservation.resource_id, reservation_id=reservation.id,
+                       user_id=reservation.user_id, utilization=utilization, mem_util=utilization / 2,
+                       mem_used=None, power=None)
+
+
+def test_summary_of_expired_reservation_is_saved(tables, service, past_reservation, new_reservation):
+    past_reservation.save()
+    new_reservation.save()
+    samples = [record(past_reservation, 33), record(past_reservation, 34), record(new_reservation, 50)]
+    service.accumulate(samples)
+    service.journal.append(samples)
+
+    service.handle_expired_logs()
+
+    summarized = Reservation.get(past_reservation.id)
+    # True average (33.5), not truncated one
+    assert summarized.gpu_util_avg == 34
+    assert summarized.mem_util_avg == 17
+    assert Reservation.get(new_reservation.id).gpu_util_avg is None
+    assert list(service.usage.keys()) == [new_reservation.id]
+
+    summary = ReservationUsageSummary.get_by_reservation_id(past_reservation.id)
+    assert summary.samples == 2
+    assert summary.gpu_util_avg == 33.5
+    assert summary.idle_fraction == 0.0
+    assert ReservationUsageSummary.get_by_reservation_id(new_reservation.id) is None
+
+
+def test_summary_is_saved_for_reservation_with_averages_only(tables, service, past_reservation):
+    # Averages were saved by a version which didn't write summaries yet or just before a crash
+    past_reservation.gpu_util_avg = 10
+    past_reservation.save()
+    service.accumulate([record(past_reservation, 40)])
+
+    service.handle_expired_logs()
+
+    assert ReservationUsageSummary.get_by_reservation_id(past_reservation.id).gpu_util_avg == 40.0
+    assert Reservation.get(past_reservation.id).gpu_util_avg == 40
+    assert service.usage == {}
+
+
+def test_aggregates_are_rebuilt_from_journal(tables, service, past_reservation):
+    past_reservation.save()
+    service.journal.append([record(past_reservation, 10), record(past_reservation, 20)])
+    service.journal.close()
+
+    service.usage = None
+    service.accumulate([])
+
+    assert service.usage[past_reservation.id].utilization.average == 15.0
+
+
+def test_usage_of_deleted_reservation_is_dropped(tables, service, past_reservation):
+    past_reservation.save()
+    service.accumulate([record(past_reservation, 10)])
+    past_reservation.destroy()
+
+    service.handle_expired_logs()
+
+    assert service.usage == {}
+
+
+def test_released_idle_reservation_is_announced(tables, service, new_reservation):
+    new_reservation.save()
+    service.infrastructure_manager = InfrastructureManager({})
+    announced = []
+    service.infrastructure_manager.subscribe(announced.append, topic=InfrastructureManager.RESERVATIONS_TOPIC)
+    service.idle_reservation_action = IdleReservationAction.CANCEL
+    service.idle_detector.observe([record(new_reservation, 0)])
+
+    service.handle_idle_reservations(now=time.time() + service.idle_detector.window)
+
+    assert announced == [[new_reservation.id]]
+    assert Reservation.get(new_reservation.id).is_cancelled
+
+
+def test_idle_reservation_which_ended_before_window_is_left_alone(tables, service, past_reservation):
+    past_reservation.save()
+    service.infrastructure_manager = InfrastructureManager({})
+    announced = []
+    service.infrastructure_manager.subscribe(announced.append, topic=InfrastructureManager.RESERVATIONS_TOPIC)
+    service.idle_reservation_action = IdleReservationAction.CANCEL
+    samples = [record(past_reservation, 0)]
+    service.accumulate(samples)
+    service.idle_detector.observe(samples)
+
+    service.handle_idle_reservations(now=time.time() + service.idle_detector.window)
+    service.handle_expired_logs()
+
+    assert announced == []
+    assert not Reservation.get(past_reservation.id).is_cancelled
+    assert service.idle_detector.idle_since == {} and service.idle_detector.reported == set()
+
+
+def test_current_usage_is_sampled_in_one_pass(tables, service, new_reservation, resource2, new_user_2):
+    new_reservation.save()
+    new_user_2.save()
+    # Reservation of a GPU which is not present in the infrastructure
+    other_reservation = Reservation(user_id=new_user_2.id, title='Other', description='', resource_id=resource2.id,
+                                    start=new_reservation.start, end=new_reservation.end)
+    other_reservation.save()
+    service.infrastructure_manager = InfrastructureManager({'host_0': {}})
+    service.infrastructure_manager.update_node('host_0', 'GPU', {
+        new_reservation.resource_id: {'index': 0, 'metrics': {'utilization': {'value': 40}, 'power': {'value': 90}}}
+    })
+
+    service.log_current_usage()
+
+    records = list(service.journal.read())
+    assert [(record.reservation_id, record.utilization) for record in records] == [(new_reservation.id, 40)]
+    assert service.usage[new_reservation.id].power.average == 90
+    assert service.rollups.pending == {}
+
+
+def test_gpus_which_are_not_reserved_go_to_gpu_and_host_rollups(tables, service, new_reservation):
+    new_reservation.save()
+    service.infrastructure_manager = InfrastructureManager({'host_0': {}})
+    service.infrastructure_manager.update_node('host_0', 'GPU', {
+        new_reservation.resource_id: {'index': 0, 'metrics': {'utilization': {'value': 40}}},
+        'GPU-free': {'index': 1, 'metrics': {'utilization': {'value': 0}}}
+    })
+
+    service.log_current_usage()
+
+    start, end = datetime.datetime.utcnow() - datetime.timedelta(days=1), datetime.datetime.utcnow()
+    assert {rollup.key: rollup.utilization_avg for rollup in UsageRollup.find('gpu', 'day', start, end)} \
+        == {new_reservation.resource_id: 40.0, 'GPU-free': 0.0}
+    assert [rollup.utilization_avg for rollup in UsageRollup.find('host', 'day', start, end)] == [20.0]
+    assert [rollup.samples for rollup in UsageRollup.find('user', 'day', start, end)] == [1]
+    assert [record.uuid for record in service.journal.read()] == [new_reservation.resource_id]
+
+
+def test_expired_rollups_are_removed_once_per_interval(tables, service, monkeypatch):
+    calls = []
+    monkeypatch.setattr(service.rollups, 'remove_expired', lambda retention_days: calls.append(retention_days) or 0)
+
+    service.remove_expired_rollups(now=1000)
+    service.remove_expired_rollups(now=1000 + service.rollup_removal_interval - 1)
+    service.remove_expired_rollups(now=1000 + service.rollup_removal_interval)
+    assert calls == [service.rollup_retention_days] * 2
+
+
+def test_failed_journal_write_does_not_stop_logging(tables, service, new_reservation, monkeypatch):
+    new_reservation.save()
+    service.infrastructure_manager = InfrastructureManager({'host_0': {}})
+    service.infrastructure_manager.update_node('host_0', 'GPU', {
+        new_reservation.resource_id: {'index': 0, 'metrics': {'utilization': {'value': 40}}}
+    })
+
+    append = service.journal.append
+    failures = [OSError(28, 'No space left on device')]
+
+    def append_or_fail(records):
+        if failures:
+            raise failures.pop()
+        append(records)
+
+    monkeypatch.setattr(service.journal, 'append', append_or_fail)
+    service.log_current_usage()
+    assert service.usage == {}
+    service.log_current_usage()
+
+    assert [record.utilization for record in service.journal.read()] == [40]
@@ -0,0 +1,55 @@
+import datetime
+from tensorhive.core.usage_journal import UsageRecord
+from tensorhive.core.usage_rollups import UsageRollupWriter
+from tensorhive.models.UsageRollup import UsageRollup
+
+DAY = datetime.datetime(2020, 1, 1)
+START = DAY.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def sample(offset, utilization, uuid='GPU-0', user_id=1):
+    return UsageRecord(timestamp=START + offset, uuid=uuid, reservation_id=1, user_id=user_id,
+                       utilization=utilization, mem_util=float('nan'), mem_used=100.0, power=None)
+
+
+def test_rollups_are_incremented_across_flushes(tables):
+    writer = UsageRollupWriter()
+    writer.add([(sample(0, 10), 'host_0'), (sample(60, 20, uuid='GPU-1'), 'host_0')])
+    writer.flush()
+    writer.add([(sample(2 * 3600, 60), 'host_0')])
+    writer.flush()
+
+    hourly = UsageRollup.find('host', 'hour', DAY, DAY + datetime.timedelta(days=1))
+    assert [(rollup.bucket_start.hour, rollup.samples, rollup.utilization_avg) for rollup in hourly] \
+        == [(0, 2, 15.0), (2, 1, 60.0)]
+
+    daily = UsageRollup.find('gpu', 'day', DAY, DAY + datetime.timedelta(days=1), keys=['GPU-0'])
+    assert len(daily) == 1
+    assert (daily[0].samples, daily[0].utilization_max, daily[0].mem_util_avg) == (2, 60, None)
+    assert UsageRollup.find('user', 'day', DAY, DAY + datetime.timedelta(days=1))[0].samples == 3
+
+
+def test_rollups_of_groups(tables, new_group_with_member):
+    new_group_with_member.save()
+    user = new_group_with_member.users[0]
+    writer = UsageRollupWriter()
+    writer.add([(sample(0, 40, user_id=user.id), 'host_0')])
+    writer.flush()
+
+    rollups = UsageRollup.find('group', 'day', DAY, DAY + datetime.timedelta(days=1))
+    assert [(rollup.key, rollup.utilization_avg) for rollup in rollups] == [(str(new_group_with_member.id), 40.0)]
+
+
+def test_expired_rollups_are_removed(tables):
+    writer = UsageRollupWriter()
+    writer.add([(sample(0, 10), 'host_0'), (sample(3 * 24 * 3600, 20), 'host_0')])
+    writer.flush()
+    now = DAY + datetime.timedelta(days=4)
+
+    # Buckets (of GPU, host and user) which ended more than 2 days ago, daily ones are kept forever
+    assert writer.remove_expired({'hour': 2, 'day': 0}, now=now) == 3
+    assert [rollup.bucket_start.day for rollup in UsageRollup.find('gpu', 'hour', DAY, now)] == [4]
+    assert [rollup.bucket_start.day for rollup in UsageRollup.find('gpu', 'day', DAY, now)] == [1, 4]
+
+    assert writer.remove_expired({'hour': 2, 'day': 2}, now=now) == 3
+    assert [rollup.bucket_start.day for rollup in UsageRollup.find('gpu', 'day', DAY, now)] == [4]
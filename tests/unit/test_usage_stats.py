@@ -0,0 +1,36 @@
+import pytest
+from tensorhive.core.usage_journal import UsageRecord
+from tensorhive.core.usage_stats import ReservationUsage, StreamingStats
+
+
+def test_streaming_stats_aggregates():
+    stats = StreamingStats()
+    for value in [10, 20, 30, 40, None, float('nan')]:
+        stats.add(value)
+
+    assert stats.count == 4
+    assert stats.average == 25.0
+    assert (stats.minimum, stats.maximum) == (10, 40)
+
+
+def test_streaming_stats_percentiles():
+    stats = StreamingStats()
+    for value in range(1, 101):
+        stats.add(value)
+
+    assert stats.percentile(50) == 50.0
+    assert stats.percentile(95) == 95.0
+    assert stats.percentile(100) == 100.0
+    assert StreamingStats().percentile(50) is None
+
+
+def test_idle_fraction_and_energy():
+    usage = ReservationUsage(reservation_id=1)
+    for offset, utilization in enumerate([0, 2, 50, 100]):
+        usage.add(UsageRecord(timestamp=1000.0 + offset * 60, uuid='GPU-0', reservation_id=1, user_id=1,
+                              utilization=utilization, mem_util=10, mem_used=100 * offset, power=120.0))
+
+    assert usage.utilization.fraction_below(5) == 0.5
+    assert usage.mem_used.maximum == 300
+    # 3 minutes at 120 W
+    assert usage.energy_wh == pytest.approx(6.0)